@@ -0,0 +1,120 @@
+"""تست بار ارسال همگانی با API جعلی
+
+مشترکین در یک فایل SQLite موقت ساخته می‌شوند؛ درصدی از آن‌ها ربات را بلاک
+کرده‌اند (403) و API یک بار 429 با retry_after برمی‌گرداند. ارسال وسط کار قطع و
+با یک Broadcaster دیگر ادامه داده می‌شود (شبیه کرش). هم‌زمان آپدیت‌های عادی
+به اپلیکیشن داده می‌شود تا زمان پاسخ کاربران در حین ارسال دیده شود.
+
+اجرا از ریشه مخزن:
+    python -m benchmarks.bench_broadcast --subscribers 20000 --rate 2000
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from telegram import Update
+from telegram.ext import TypeHandler
+
+import main
+from benchmarks.bench_concurrency import percentile
+from benchmarks.canned_updates import message_update
+from benchmarks.fake_api import FakeBotAPI
+from broadcast import Broadcaster, SubscriberRegistry
+
+
+async def run(args):
+    path = os.path.join(tempfile.mkdtemp(), 'subscribers.db')
+    registry = SubscriberRegistry(path)
+    for chat_id in range(1, args.subscribers + 1):
+        registry.add(100000 + chat_id)
+    blocked = {100000 + chat_id for chat_id in range(1, args.subscribers + 1, int(1 / args.blocked))}
+    throttled = []
+
+    def fail(api_method, params):
+        if api_method != 'sendMessage' or params.get('chat_id', 0) < 100000:
+            return None
+        if params['chat_id'] in blocked:
+            return 403, 'Forbidden: bot was blocked by the user', None
+        if not throttled and params['chat_id'] > 100000 + args.subscribers // 3:
+            throttled.append(time.perf_counter())
+            return 429, 'Too Many Requests: retry after 1', {'retry_after': 1}
+        return None
+
+    api = FakeBotAPI(latency=args.latency, jitter=args.latency, fail=fail)
+    application = main.build_application(request=api, concurrency=16, outbound_limits=False)
+    finished = {}
+
+    async def record(update, context):
+        finished[update.update_id] = time.perf_counter()
+
+    application.add_handler(TypeHandler(Update, record), group=99)
+    await application.initialize()
+    await application.start()
+
+    # کاربران عادی در حین ارسال همگانی
+    enqueued = {}
+
+    async def interactive():
+        for i in range(args.interactive):
+            update = Update.de_json(message_update(i + 1, 1 + i % 50, '/start'), application.bot)
+            enqueued[update.update_id] = time.perf_counter()
+            await application.update_queue.put(update)
+            await asyncio.sleep(1 / 20)
+
+    started = time.perf_counter()
+    first = Broadcaster(application.bot, registry, rate=args.rate, workers=args.workers, page_size=args.page_size)
+    job = await first.start('📣 پیام آزمایشی')
+    users = asyncio.create_task(interactive())
+    while job['sent'] + job['removed'] < args.subscribers // 2:
+        await asyncio.sleep(0.01)
+    await first.stop()
+    crashed_at = job['sent'] + job['removed'] + job['failed']
+
+    second = Broadcaster(application.bot, registry, rate=args.rate, workers=args.workers,
+                         page_size=args.page_size, lease=0)
+    resumer = asyncio.create_task(second.resume_forever(interval=0.05))
+    while not second.active:
+        await asyncio.sleep(0.01)
+    resumed = next(iter(second.active.values()))[0]
+    resumed_from = resumed['cursor']
+    while second.active:
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - started
+    resumer.cancel()
+    await users
+    while len(finished) < len(enqueued):
+        await asyncio.sleep(0.01)
+    await application.stop()
+    await application.shutdown()
+
+    delivered = [call[1]['chat_id'] for call in api.calls if call[0] == 'sendMessage' and call[1]['chat_id'] >= 100000]
+    duplicates = len(delivered) - len(set(delivered))
+    expected = args.subscribers - len(blocked)
+    latencies = [finished[uid] - enqueued[uid] for uid in enqueued]
+    print(f'subscribers={args.subscribers} blocked={len(blocked)} rate={args.rate}/s '
+          f'api_latency={args.latency * 1000:.0f}ms+{args.latency * 1000:.0f}ms')
+    print(f'crash after {crashed_at} deliveries; resumed from chat_id {resumed_from}')
+    print(f'delivered={len(set(delivered))}/{expected} duplicates={duplicates} removed={resumed["removed"]} '
+          f'remaining_subscribers={len(registry)} failed={resumed["failed"]}')
+    print(f'total={elapsed:.2f}s throughput={len(delivered) / elapsed:.0f} msg/s '
+          f'(ideal {args.subscribers / args.rate:.2f}s incl. 1s retry_after)')
+    print(f'interactive /start during broadcast: p50={percentile(latencies, 0.5) * 1000:.1f}ms '
+          f'p99={percentile(latencies, 0.99) * 1000:.1f}ms')
+
+
+def cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--subscribers', type=int, default=20000)
+    parser.add_argument('--blocked', type=float, default=0.05, help='نسبت کاربرانی که ربات را بلاک کرده‌اند')
+    parser.add_argument('--rate', type=float, default=2000.0)
+    parser.add_argument('--workers', type=int, default=64)
+    parser.add_argument('--page-size', type=int, default=500)
+    parser.add_argument('--latency', type=float, default=0.02)
+    parser.add_argument('--interactive', type=int, default=100)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    cli()
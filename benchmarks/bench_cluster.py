@@ -0,0 +1,51 @@
+"""توان پردازش حالت چند کارگری با API جعلی
+
+اجرا از ریشه مخزن:
+    python -m benchmarks.bench_cluster --workers 1 2 4 --updates 4000
+"""
+import argparse
+import functools
+import time
+
+from benchmarks.bench_webhook import workload
+from benchmarks.fake_api import FakeBotAPI
+from cluster import ShardedDispatcher
+
+
+def fake_application(latency):
+    """Application واقعی با لایه HTTP جعلی؛ در پردازه کارگر اجرا می‌شود"""
+    import main
+    return main.build_application(request=FakeBotAPI(latency=latency), outbound_limits=False,
+                                  inbound_limits=False)
+
+
+def measure(workers, updates, latency):
+    dispatcher = ShardedDispatcher(workers, functools.partial(fake_application, latency))
+    dispatcher.start()
+    started = time.perf_counter()
+    for payload in updates:
+        dispatcher.dispatch(payload)
+    # stop تا تخلیه کامل صف همه کارگرها صبر می‌کند
+    dispatcher.stop(timeout=300)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--updates', type=int, default=3000)
+    parser.add_argument('--chats', type=int, default=500)
+    parser.add_argument('--latency', type=float, default=0.0)
+    args = parser.parse_args()
+
+    updates = list(workload(args.updates, args.chats))
+    baseline = None
+    for workers in args.workers:
+        elapsed = measure(workers, updates, args.latency)
+        rate = len(updates) / elapsed
+        baseline = baseline or rate
+        print(f'workers={workers}: {elapsed:.2f}s {rate:.0f} updates/s (x{rate / baseline:.2f})')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""تست بار پردازش هم‌زمان با API جعلی دارای تاخیر
+
+آپدیت‌ها با نرخ ثابت وارد update_queue می‌شوند و زمان تا پایان پردازش هر آپدیت
+(p50/p99) برای حالت ترتیبی و حالت هم‌زمان گزارش می‌شود. ترتیب پردازش در هر چت
+هم بررسی می‌شود.
+
+اجرا از ریشه مخزن:
+    python -m benchmarks.bench_concurrency --latency 0.05 --rate 200 --concurrency 1 64
+"""
+import argparse
+import asyncio
+import time
+
+from telegram import Update
+from telegram.ext import TypeHandler
+
+import main
+from benchmarks.bench_webhook import workload
+from benchmarks.canned_updates import callback_update, message_update
+from benchmarks.fake_api import FakeBotAPI
+
+
+def rapid_taps(n_updates, n_chats):
+    """ضربه‌های سریع پشت‌سرهم هر کاربر: منوی اصلی ← سفارش ← یک سوال"""
+    sequence = ['main_menu', 'cat_order', 'faq_پیگیری سفارش']
+    for i in range(n_updates):
+        chat_id = 1 + (i // len(sequence)) % n_chats
+        data = sequence[i % len(sequence)]
+        yield callback_update(i + 1, chat_id, data) if i % 7 else message_update(i + 1, chat_id, '/start')
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+async def run_once(updates, concurrency, latency, jitter, rate):
+    application = main.build_application(request=FakeBotAPI(latency=latency, jitter=jitter),
+                                         concurrency=concurrency, outbound_limits=False,
+                                         inbound_limits=False)
+    enqueued, finished, order = {}, {}, {}
+
+    async def record(update, context):
+        # گروه آخر پس از پایان handler اصلی همان آپدیت اجرا می‌شود
+        finished[update.update_id] = time.perf_counter()
+        order.setdefault(update.effective_chat.id, []).append(update.update_id)
+
+    application.add_handler(TypeHandler(Update, record), group=99)
+    await application.initialize()
+    await application.start()
+
+    started = time.perf_counter()
+    for index, data in enumerate(updates):
+        # ورود با نرخ ثابت
+        delay = started + index / rate - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        update = Update.de_json(data, application.bot)
+        enqueued[update.update_id] = time.perf_counter()
+        await application.update_queue.put(update)
+
+    while len(finished) < len(updates):
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - started
+    await application.stop()
+    await application.shutdown()
+
+    latencies = [finished[uid] - enqueued[uid] for uid in enqueued]
+    ordered = all(ids == sorted(ids) for ids in order.values())
+    return latencies, elapsed, ordered
+
+
+async def run(args):
+    updates = list(rapid_taps(args.updates, args.chats) if args.rapid else workload(args.updates, args.chats))
+    print(f'updates={len(updates)} chats={args.chats} rate={args.rate}/s '
+          f'api_latency={args.latency * 1000:.0f}ms+{args.jitter * 1000:.0f}ms')
+    for concurrency in args.concurrency:
+        latencies, elapsed, ordered = await run_once(updates, concurrency, args.latency, args.jitter, args.rate)
+        print(f'concurrency={concurrency:4d}: p50={percentile(latencies, 0.5) * 1000:8.1f}ms '
+              f'p99={percentile(latencies, 0.99) * 1000:8.1f}ms '
+              f'total={elapsed:.2f}s per-chat-order={"ok" if ordered else "BROKEN"}')
+
+
+def cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--updates', type=int, default=600)
+    parser.add_argument('--chats', type=int, default=50)
+    parser.add_argument('--rate', type=float, default=200.0)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--jitter', type=float, default=0.05)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 64])
+    parser.add_argument('--rapid', action='store_true', help='ضربه‌های پشت‌سرهم هر کاربر')
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,89 @@
+"""تست حذف ویرایش‌های بی‌تغییر پیام
+
+کاربران بین منوها جابه‌جا می‌شوند و گاهی همان دکمه را دوباره می‌زنند. API جعلی
+مثل تلگرام برای ویرایش بی‌تغییر خطای «message is not modified» برمی‌گرداند.
+تعداد فراخوانی‌های editMessageText و خطاها با و بدون MessageRenderCache مقایسه
+می‌شود.
+
+اجرا از ریشه مخزن:
+    python -m benchmarks.bench_edits --users 200 --taps 20
+"""
+import argparse
+import asyncio
+import json
+import random
+
+from telegram import Update
+
+import main
+from benchmarks.canned_updates import callback_update
+from benchmarks.fake_api import FakeBotAPI
+from render_cache import EDITS_SKIPPED, MessageRenderCache
+
+BUTTONS = ['cat_order', 'cat_payment', 'faq_پیگیری سفارش', 'faq_هزینه ارسال', 'promotions', 'show_promo', 'survey']
+
+
+def browsing(users, taps, repeat, seed=0):
+    """هر کاربر روی یک پیام بین دکمه‌ها جابه‌جا می‌شود؛ با احتمال repeat همان دکمه قبلی را می‌زند"""
+    rng = random.Random(seed)
+    update_id = 0
+    last = {}
+    for _ in range(taps):
+        for user in range(1, users + 1):
+            update_id += 1
+            data = last[user] if user in last and rng.random() < repeat else rng.choice(BUTTONS)
+            last[user] = data
+            yield callback_update(update_id, user, data)
+
+
+class NotModified:
+    """مدل سمت سرور: ویرایش با همان متن و کیبورد خطای 400 می‌گیرد"""
+
+    def __init__(self):
+        self.messages = {}
+        self.errors = 0
+
+    def __call__(self, api_method, params):
+        if api_method != 'editMessageText':
+            return None
+        key = (params['chat_id'], params['message_id'])
+        content = (params['text'], json.dumps(params.get('reply_markup'), sort_keys=True, default=str))
+        if self.messages.get(key) == content:
+            self.errors += 1
+            return 400, 'Bad Request: message is not modified', None
+        self.messages[key] = content
+        return None
+
+
+async def run_once(args, cached):
+    main.RENDERED = MessageRenderCache(50000 if cached else 0)
+    server = NotModified()
+    api = FakeBotAPI(fail=server)
+    application = main.build_application(request=api, outbound_limits=False, inbound_limits=False)
+    await application.initialize()
+    skipped = EDITS_SKIPPED.values[('cached',)]
+    taps = 0
+    for data in browsing(args.users, args.taps, args.repeat):
+        await application.process_update(Update.de_json(data, application.bot))
+        taps += 1
+    await application.shutdown()
+    edit_calls = api.count('editMessageText') + server.errors
+    print(f'{"cached" if cached else "uncached":>8}: taps={taps} edit_calls={edit_calls} '
+          f'not_modified_errors={server.errors} skipped_locally={EDITS_SKIPPED.values[("cached",)] - skipped:g}')
+
+
+async def run(args):
+    await run_once(args, cached=False)
+    await run_once(args, cached=True)
+
+
+def cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--taps', type=int, default=20)
+    parser.add_argument('--repeat', type=float, default=0.2, help='احتمال زدن دوباره همان دکمه')
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,120 @@
+"""تست لایه زمان‌بندی ارسال با API جعلی که مثل تلگرام 429 برمی‌گرداند
+
+API جعلی سقف سراسری و سقف هر چت را خودش اعمال می‌کند و در صورت عبور از آن
+429 با retry_after برمی‌گرداند. هم‌زمان با ضربه‌های سریع کاربران یک ارسال همگانی
+اجرا می‌شود. بدون زمان‌بندی بخشی از پاسخ‌ها با RetryAfter از دست می‌روند؛ با
+ScheduledRequest همه پاسخ‌ها می‌رسند و پاسخ کاربران جلوتر از ارسال همگانی است.
+
+اجرا از ریشه مخزن:
+    python -m benchmarks.bench_flood --updates 200 --subscribers 200
+"""
+import argparse
+import asyncio
+import math
+import time
+
+from telegram import Update
+from telegram.ext import TypeHandler
+
+import main
+from benchmarks.bench_concurrency import percentile, rapid_taps
+from benchmarks.fake_api import FakeBotAPI
+from broadcast import Broadcaster, SubscriberRegistry
+from flood_control import OUTBOUND_WAIT, TokenBucket
+
+SUBSCRIBER_BASE = 10 ** 6
+
+
+class TelegramLimits:
+    """مدل سمت سرور سقف‌های ارسال: سراسری و هر چت"""
+
+    def __init__(self, global_rate, chat_rate, burst):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.burst = burst
+        self.chats = {}
+        self.rejected = 0
+
+    def __call__(self, api_method, params):
+        if not api_method.startswith(('send', 'edit')):
+            return None
+        now = time.monotonic()
+        chat = self.chats.setdefault(params['chat_id'], TokenBucket(self.chat_rate, self.burst))
+        wait = max(self.global_bucket.delay(now), chat.delay(now))
+        if wait > 0:
+            self.rejected += 1
+            retry_after = math.ceil(wait)
+            return 429, f'Too Many Requests: retry after {retry_after}', {'retry_after': retry_after}
+        self.global_bucket.take(now)
+        chat.take(now)
+        return None
+
+
+async def run_once(args, scheduled):
+    limits = TelegramLimits(args.global_rate, 1.0, 3)
+    api = FakeBotAPI(latency=args.latency, fail=limits)
+    application = main.build_application(request=api, concurrency=64, outbound_limits=scheduled)
+    enqueued, finished = {}, {}
+
+    async def record(update, context):
+        finished[update.update_id] = time.perf_counter()
+
+    application.add_handler(TypeHandler(Update, record), group=99)
+    await application.initialize()
+    await application.start()
+
+    registry = SubscriberRegistry()
+    for chat_id in range(args.subscribers):
+        registry.add(SUBSCRIBER_BASE + chat_id)
+    broadcaster = Broadcaster(application.bot, registry, rate=args.bulk_rate, workers=8)
+
+    started = time.perf_counter()
+    await broadcaster.start('📣 پیام آزمایشی')
+    for index, data in enumerate(rapid_taps(args.updates, args.chats)):
+        delay = started + index / args.rate - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        update = Update.de_json(data, application.bot)
+        enqueued[update.update_id] = time.perf_counter()
+        await application.update_queue.put(update)
+
+    while len(finished) < len(enqueued) or broadcaster.active:
+        await asyncio.sleep(0.05)
+    elapsed = time.perf_counter() - started
+    await application.stop()
+    await application.shutdown()
+
+    replies = sum(1 for call in api.calls
+                  if call[0] in ('sendMessage', 'editMessageText') and call[1]['chat_id'] < SUBSCRIBER_BASE)
+    bulk = sum(1 for call in api.calls if call[0] == 'sendMessage' and call[1]['chat_id'] >= SUBSCRIBER_BASE)
+    latencies = [finished[uid] - enqueued[uid] for uid in enqueued]
+    print(f'{"scheduled" if scheduled else "direct":>9}: replies={replies}/{len(enqueued)} '
+          f'bulk={bulk}/{args.subscribers} 429s={limits.rejected} total={elapsed:.1f}s '
+          f'reply p50={percentile(latencies, 0.5) * 1000:.0f}ms p99={percentile(latencies, 0.99) * 1000:.0f}ms')
+    if scheduled:
+        for priority in ('interactive', 'bulk'):
+            print(f'{"":>11}{priority} token wait p50={OUTBOUND_WAIT.quantile(0.5, priority) * 1000:g}ms '
+                  f'p99={OUTBOUND_WAIT.quantile(0.99, priority) * 1000:g}ms')
+
+
+async def run(args):
+    print(f'updates={args.updates} chats={args.chats} rate={args.rate}/s subscribers={args.subscribers} '
+          f'bulk_rate={args.bulk_rate}/s telegram_limit={args.global_rate}/s, 1/s per chat')
+    await run_once(args, scheduled=False)
+    await run_once(args, scheduled=True)
+
+
+def cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--updates', type=int, default=200)
+    parser.add_argument('--chats', type=int, default=40)
+    parser.add_argument('--rate', type=float, default=20.0)
+    parser.add_argument('--subscribers', type=int, default=200)
+    parser.add_argument('--bulk-rate', type=float, default=40.0)
+    parser.add_argument('--global-rate', type=float, default=30.0)
+    parser.add_argument('--latency', type=float, default=0.03)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    cli()
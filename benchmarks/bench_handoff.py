@@ -0,0 +1,156 @@
+"""تست بار گفتگو با اپراتور (تیکت پشتیبانی) با API جعلی
+
+چند صد کاربر هم‌زمان تیکت باز می‌کنند و هر کدام چند پیام می‌فرستند؛ پخش
+تیکت‌ها بین اپراتورها و تعداد پیام‌های ردشده وقتی صف اپراتور پر است گزارش
+می‌شود. سپس اپراتورها روی همه پیام‌های فرستاده‌شده reply می‌کنند و زمان
+مسیریابی پاسخ (از حافظه و پس از خالی شدن LRU، از SQLite) و درستی مقصد
+copyMessage بررسی می‌شود. پاسخ‌های هر اپراتور به ترتیب پردازش می‌شوند (ترتیب
+هر چت)، پس توان کل پاسخ‌ها تقریبا تعداد اپراتورها تقسیم بر تاخیر API است.
+در پایان عکس و استیکر یک کاربر باید با copyMessage به اپراتورش برسد و reply روی
+آن‌ها به کاربر برگردد، و /close تیکت فقط از اپراتور همان تیکت پذیرفته شود.
+
+اجرا از ریشه مخزن:
+    python -m benchmarks.bench_handoff --users 500 --messages 3 --operators 5
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from collections import Counter
+
+from telegram import Update
+from telegram.ext import TypeHandler
+
+import main
+from benchmarks.bench_concurrency import percentile
+from benchmarks.canned_updates import callback_update, message_update, photo_update, reply_update, sticker_update
+from benchmarks.fake_api import FakeBotAPI
+from handoff import HandoffDesk, TicketStore
+
+
+async def run(args):
+    operators = [9001 + index for index in range(args.operators)]
+    main.OPERATOR_IDS[:] = operators
+    api = FakeBotAPI(latency=args.latency)
+    application = main.build_application(request=api, concurrency=32, outbound_limits=False, inbound_limits=False)
+    store = TicketStore(os.path.join(tempfile.mkdtemp(), 'tickets.db'))
+    desk = application.bot_data['handoff'] = HandoffDesk(
+        application.bot, store, operators, max_per_operator=args.max_per_operator, queue_size=args.queue_size)
+    finished = {}
+
+    async def record(update, context):
+        finished[update.update_id] = time.perf_counter()
+
+    application.add_handler(TypeHandler(Update, record), group=99)
+    await application.initialize()
+    await application.start()
+    await desk.start()
+    update_ids = iter(range(1, 10 ** 9))
+
+    async def feed(updates):
+        """آپدیت‌ها را به صف می‌دهد و زمان پردازش هر کدام را برمی‌گرداند"""
+        enqueued = {}
+        for data in updates:
+            update = Update.de_json(data, application.bot)
+            enqueued[update.update_id] = time.perf_counter()
+            await application.update_queue.put(update)
+        while any(uid not in finished for uid in enqueued):
+            await asyncio.sleep(0.005)
+        return [finished[uid] - enqueued[uid] for uid in enqueued]
+
+    users = [100000 + index for index in range(args.users)]
+    started = time.perf_counter()
+    latencies = await feed(callback_update(next(update_ids), user, 'ticket_open') for user in users)
+    elapsed = time.perf_counter() - started
+    spread = Counter(ticket['operator_id'] for ticket in store.open_tickets())
+    print(f'opened {sum(spread.values())} tickets for {args.users} users in {elapsed:.2f}s '
+          f'p50={percentile(latencies, 0.5) * 1000:.1f}ms p99={percentile(latencies, 0.99) * 1000:.1f}ms')
+    print(f'per operator: {dict(sorted(spread.items()))} (cap {args.max_per_operator})')
+
+    sent_before = api.count('sendMessage')
+    started = time.perf_counter()
+    latencies = await feed(
+        message_update(next(update_ids), user, f'سوال {index} کاربر {user}')
+        for index in range(args.messages) for user in users
+    )
+    handled = time.perf_counter() - started
+    while desk.queue_depth() or any(queue._unfinished_tasks for queue in desk.queues.values()):
+        await asyncio.sleep(0.005)
+    drained = time.perf_counter() - started
+    rejected = sum(1 for call in api.calls[sent_before:]
+                   if call[0] == 'sendMessage' and call[1]['text'].startswith('⏳'))
+    links = store._conn.execute('SELECT chat_id, message_id, ticket_id FROM ticket_messages').fetchall()
+    print(f'user messages: {len(latencies)} handled in {handled:.2f}s (p99 {percentile(latencies, 0.99) * 1000:.1f}ms), '
+          f'queues drained after {drained:.2f}s; rejected (queue full)={rejected}; indexed operator messages={len(links)}')
+
+    tickets = {ticket['id']: ticket for ticket in store.open_tickets()}
+    for label in ('warm', 'cold'):
+        if label == 'cold':
+            desk._by_message.clear()
+        started = time.perf_counter()
+        for chat_id, message_id, _ in links:
+            await desk.ticket_of(chat_id, message_id)
+        lookup = (time.perf_counter() - started) / len(links)
+        if label == 'cold':
+            desk._by_message.clear()
+        copies_before = len(api.calls)
+        started = time.perf_counter()
+        latencies = await feed(
+            reply_update(next(update_ids), chat_id, 'پاسخ اپراتور', message_id) for chat_id, message_id, _ in links)
+        elapsed = time.perf_counter() - started
+        copies = [call[1] for call in api.calls[copies_before:] if call[0] == 'copyMessage']
+        expected = Counter(tickets[ticket_id]['chat_id'] for _, _, ticket_id in links)
+        correct = Counter(params['chat_id'] for params in copies) == expected
+        print(f'operator replies ({label} index): {len(latencies)} in {elapsed:.2f}s '
+              f'({len(latencies) / elapsed:.0f}/s) p50={percentile(latencies, 0.5) * 1000:.2f}ms '
+              f'p99={percentile(latencies, 0.99) * 1000:.2f}ms lookup={lookup * 1e6:.0f}us routed_correctly={correct}')
+
+    # پیوست‌ها: عکس با کپشن (سرتیتر در کپشن) و استیکر (سرتیتر جداگانه)
+    ticket = tickets[min(tickets)]
+    operator, user = ticket['operator_id'], ticket['chat_id']
+    calls_before = len(api.calls)
+    await feed([photo_update(next(update_ids), user, 'رسید پرداخت'), sticker_update(next(update_ids), user)])
+    while desk.queue_depth() or any(queue._unfinished_tasks for queue in desk.queues.values()):
+        await asyncio.sleep(0.005)
+    copies = [call[1] for call in api.calls[calls_before:] if call[0] == 'copyMessage']
+    assert [params['chat_id'] for params in copies] == [operator, operator], copies
+    assert f"#{ticket['id']}" in copies[0]['caption'] and 'رسید پرداخت' in copies[0]['caption']
+    assert not copies[1].get('caption')
+    # آخرین پیام ثبت‌شده تیکت در چت اپراتور همان استیکر کپی‌شده است
+    (copied,), = store._conn.execute(
+        'SELECT MAX(message_id) FROM ticket_messages WHERE chat_id = ? AND ticket_id = ?', (operator, ticket['id']))
+    calls_before = len(api.calls)
+    await feed([reply_update(next(update_ids), operator, 'دریافت شد', copied)])
+    routed = [call[1]['chat_id'] for call in api.calls[calls_before:] if call[0] == 'copyMessage']
+    assert routed == [user], routed
+
+    # /close فقط برای اپراتور همان تیکت (یا ادمین)
+    other = next(op for op in operators if op != operator)
+    calls_before = len(api.calls)
+    await feed([message_update(next(update_ids), other, f"/close {ticket['id']}")])
+    assert store.get(ticket['id'])['status'] == 'open', 'اپراتور دیگری تیکت را بست'
+    assert 'اپراتور دیگری' in api.calls[-1][1]['text'], api.calls[-1]
+    await feed([message_update(next(update_ids), operator, f"/close {ticket['id']}")])
+    assert store.get(ticket['id'])['status'] == 'closed'
+    print(f"attachments: photo and sticker copied to operator {operator}, reply routed to user {user}; "
+          f"/close by operator {other} refused, by {operator} accepted")
+
+    await desk.stop()
+    await application.stop()
+    await application.shutdown()
+
+
+def cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--messages', type=int, default=3, help='پیام هر کاربر پس از باز کردن تیکت')
+    parser.add_argument('--operators', type=int, default=5)
+    parser.add_argument('--max-per-operator', type=int, default=200)
+    parser.add_argument('--queue-size', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.01, help='تاخیر API جعلی به ثانیه')
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    cli()
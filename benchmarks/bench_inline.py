@@ -0,0 +1,80 @@
+"""تست جستجوی inline سوالات متداول
+
+کاربران کلیدواژه‌ها را حرف‌به‌حرف تایپ می‌کنند و هر کلید یک پرسش inline است.
+زمان پاسخ از حافظه (اولین بار و تکرار پرسش از LRU) و سپس کل مسیر handler با API
+جعلی اندازه‌گیری می‌شود؛ صفحه‌بندی با next_offset هم بررسی می‌شود.
+
+اجرا از ریشه مخزن:
+    python -m benchmarks.bench_inline --users 200
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from telegram import Update
+
+import main
+from benchmarks.canned_updates import inline_update
+from benchmarks.fake_api import FakeBotAPI
+
+
+def keystrokes(keywords, users, seed=0):
+    """(کاربر، پرسش) برای تایپ حرف‌به‌حرف یک کلیدواژه توسط هر کاربر"""
+    rng = random.Random(seed)
+    for user in range(1, users + 1):
+        keyword = rng.choice(keywords)
+        for end in range(1, len(keyword) + 1):
+            yield user, keyword[:end]
+
+
+def quantile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+async def run(args):
+    content = main.CONTENT.current
+    keywords = [keyword for item in content.faq.values() for keyword in item['keywords']]
+    queries = list(keystrokes(keywords, args.users))
+
+    for label in ('cold', 'warm'):
+        timings = []
+        for _, text in queries:
+            started = time.perf_counter()
+            content.inline.page(text)
+            timings.append(time.perf_counter() - started)
+        print(f'{label:>5}: queries={len(timings)} p50={quantile(timings, 0.5) * 1e6:.1f}µs '
+              f'p99={quantile(timings, 0.99) * 1e6:.1f}µs cached={len(content.inline._cache)}')
+
+    api = FakeBotAPI()
+    application = main.build_application(request=api, outbound_limits=False)
+    await application.initialize()
+    started = time.perf_counter()
+    for update_id, (user, text) in enumerate(queries, 1):
+        await application.process_update(Update.de_json(inline_update(update_id, user, text), application.bot))
+    elapsed = time.perf_counter() - started
+    print(f'handler: {len(queries) / elapsed:.0f} queries/s answered={api.count("answerInlineQuery")}')
+
+    # صفحه‌بندی: پرسش خالی همه موضوع‌ها را صفحه‌به‌صفحه برمی‌گرداند
+    offset, pages, seen = '', 0, set()
+    while True:
+        await application.process_update(Update.de_json(inline_update(0, 1, '', offset), application.bot))
+        params = api.calls[-1][1]
+        seen.update(result['id'] for result in params['results'])
+        pages += 1
+        offset = params.get('next_offset', '')
+        if not offset:
+            break
+    await application.shutdown()
+    print(f'pagination: pages={pages} results={len(seen)} topics={len(content.faq)}')
+
+
+def cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=200)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,69 @@
+"""هزینه لاگ روی event loop: StreamHandler هم‌زمان در برابر صف و نخ نویسنده
+
+خروجی با تاخیر هر write شبیه‌سازی می‌شود (مثل pipe پر یا دیسک کند). زمانی که
+خود فراخوانی logger.info در نخ event loop می‌گیرد برای هر حالت اندازه‌گیری می‌شود.
+
+اجرا از ریشه مخزن:
+    python -m benchmarks.bench_logging --records 2000 --write-delay 0.0005
+"""
+import argparse
+import io
+import logging
+import logging.handlers
+import queue
+import time
+
+from logging_setup import DeferredQueueHandler, JsonFormatter, SamplingFilter, TEXT_FORMAT
+
+
+class SlowStream(io.StringIO):
+    def __init__(self, delay):
+        super().__init__()
+        self.delay = delay
+
+    def write(self, text):
+        time.sleep(self.delay)
+        return super().write(text)
+
+
+def measure(logger, records):
+    started = time.perf_counter()
+    for index in range(records):
+        logger.info("پاسخ به کاربر %d ارسال شد", index, extra={'update_id': index, 'handler': 'start'})
+    return (time.perf_counter() - started) / records * 1e6
+
+
+def run(args):
+    results = {}
+    for mode in ('sync', 'queue', 'queue+json', 'queue+sample'):
+        logger = logging.getLogger(f'bench.{mode}')
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+        output = logging.StreamHandler(SlowStream(args.write_delay))
+        output.setFormatter(JsonFormatter() if mode == 'queue+json' else logging.Formatter(TEXT_FORMAT))
+        listener = None
+        if mode == 'sync':
+            logger.addHandler(output)
+        else:
+            records = queue.SimpleQueue()
+            logger.addHandler(DeferredQueueHandler(records))
+            listener = logging.handlers.QueueListener(records, output)
+            listener.start()
+        if mode == 'queue+sample':
+            logger.addFilter(SamplingFilter(args.sample))
+        results[mode] = measure(logger, args.records)
+        if listener is not None:
+            listener.stop()
+        print(f'{mode:>13}: {results[mode]:8.2f}µs per record on the caller thread')
+
+
+def cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--records', type=int, default=2000)
+    parser.add_argument('--write-delay', type=float, default=0.0005, help='تاخیر هر write خروجی به ثانیه')
+    parser.add_argument('--sample', type=float, default=0.01)
+    run(parser.parse_args())
+
+
+if __name__ == '__main__':
+    cli()
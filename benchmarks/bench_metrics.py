@@ -0,0 +1,70 @@
+"""هزینه اندازه‌گیری متریک‌ها
+
+هزینه هر فراخوانی handler پوشانده‌شده با instrument در برابر handler خام سنجیده
+می‌شود، سپس یک بار کاری کامل با API جعلی اجرا و خروجی /metrics و /stats چاپ می‌شود.
+
+اجرا از ریشه مخزن:
+    python -m benchmarks.bench_metrics --calls 200000 --updates 600
+"""
+import argparse
+import asyncio
+import time
+
+from telegram import Update
+
+import main
+from benchmarks.bench_webhook import workload
+from benchmarks.canned_updates import message_update
+from benchmarks.fake_api import FakeBotAPI
+from metrics import METRICS, instrument
+
+
+async def noop(update, context):
+    return None
+
+
+async def per_call(handler, calls):
+    started = time.perf_counter()
+    for _ in range(calls):
+        await handler(None, None)
+    return (time.perf_counter() - started) / calls
+
+
+async def run(args):
+    raw = await per_call(noop, args.calls)
+    wrapped = await per_call(instrument(noop), args.calls)
+    print(f'handler raw={raw * 1e6:.2f}µs instrumented={wrapped * 1e6:.2f}µs '
+          f'overhead={(wrapped - raw) * 1e6:.2f}µs per call')
+
+    api = FakeBotAPI(latency=args.latency)
+    application = main.build_application(request=api, outbound_limits=False, inbound_limits=False)
+    await application.initialize()
+    await application.start()
+    updates = list(workload(args.updates, args.chats))
+    updates.append(message_update(len(updates) + 1, main.ADMIN_ID, '/stats'))
+    started = time.perf_counter()
+    for data in updates:
+        await application.update_queue.put(Update.de_json(data, application.bot))
+    while api.count('sendMessage') + api.count('editMessageText') < len(updates):
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - started
+    await application.stop()
+    await application.shutdown()
+
+    print(f'updates={len(updates)} total={elapsed:.2f}s metric_lines={len(METRICS.render().splitlines())}')
+    if args.show:
+        print(api.calls[-1][1]['text'])
+
+
+def cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--calls', type=int, default=200000)
+    parser.add_argument('--updates', type=int, default=600)
+    parser.add_argument('--chats', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--show', action='store_true', help='چاپ خروجی /stats')
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,132 @@
+"""تست استخراج کلیدواژه از سوالات بی‌پاسخ
+
+سوالات مصنوعی با چند واژه جایگزین «کاشته‌شده» برای موضوع‌های موجود (مثلا
+وارانتی به‌جای گارانتی) به‌همراه پیام‌های بی‌ربط ساخته می‌شوند. فقط سوال‌هایی که
+ربات واقعا جواب نمی‌داد (بدون تطابق کلیدواژه و پاسخ رتبه‌بندی‌شده) مثل
+handle_message همراه موضوع‌های پیشنهادی از طریق MissLog با چرخش فایل ثبت می‌شوند، سپس keyword_mining اجرا و بررسی می‌شود که هر واژه کاشته‌شده برای
+موضوع درستش پیشنهاد شده باشد و هیچ کلمه بی‌ربطی برای موضوع‌های موجود پیشنهاد نشود.
+
+اجرا از ریشه مخزن:
+    python -m benchmarks.bench_mining --misses 1000000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from content_store import DEFAULT_CONTENT_PATH, load_content
+from keyword_mining import load_misses, mine, print_report
+from main import ANSWER_MIN_MARGIN, ANSWER_MIN_SCORE, SUGGEST_MIN_SCORE
+from matcher import KeywordMatcher
+from miss_log import MissLog, log_files
+from normalizer import normalize_text
+from retrieval import FAQRetriever
+
+# (موضوع، واژه جایگزین، کلمه‌های همراه)؛ کلمه‌های همراه کلیدواژه نیستند (وگرنه ربات
+# جواب می‌داد) ولی باید به موضوع درست اشاره کنند، نه به موضوع دیگری (مثلا «شرایط» که
+# عنوان شرایط مرجوعی است)
+PLANTED = [
+    ('گارانتی محصولات', 'وارانتی', ['دستگاه', 'محصول', 'لپتاپ']),
+    ('پیگیری سفارش', 'مرسوله', ['سفارشم', 'وضعیتش', 'هنوز']),
+    ('پرداخت قسطی', 'اعتباری', ['خرید', 'ماهانه', 'مدارک']),
+    ('رسید پرداخت', 'صورتحساب', ['خرید', 'سفارشم', 'ایمیل']),
+    ('تغییر آدرس', 'محل تحویل', ['عوض', 'اشتباه', 'جابجا']),
+]
+TEMPLATES = ['{}', 'سلام {}', '{} چطوریه', 'درباره {} سوال داشتم', '{} رو میخواستم بدونم', 'ببخشید {} چی میشه']
+NOISE = ['سلام', 'ممنون', 'قیمت', 'گوشی', 'سامسونگ', 'اپل', 'رنگ', 'مشکی', 'سفید', 'سایز', 'مدل', 'کدوم',
+         'بهتره', 'جدید', 'چنده', 'دارید', 'اوکی', 'عالی', 'باشه', 'تشکر']
+
+
+def classify(text, matcher, retriever):
+    """(نتیجه، موضوع‌های پیشنهادی) مثل handle_message، یا None اگر ربات جواب می‌داد"""
+    if matcher.best_match(text):
+        return None
+    results = retriever.search(text, k=3)
+    if results and results[0][1] >= ANSWER_MIN_SCORE and (
+            len(results) == 1 or results[0][1] - results[1][1] >= ANSWER_MIN_MARGIN):
+        return None
+    suggestions = [topic for topic, score in results if score >= SUGGEST_MIN_SCORE]
+    return ('suggestions' if suggestions else 'not_found'), suggestions
+
+
+def generate(log, n_misses, noise, seed=0):
+    """ثبت n_misses سوال بی‌پاسخ در log؛ خروجی تعداد متن‌های تولیدشده"""
+    faq, _ = load_content(DEFAULT_CONTENT_PATH)
+    matcher = KeywordMatcher(faq)
+    retriever = FAQRetriever(faq)
+    outcomes = {}
+    rng = random.Random(seed)
+    logged = generated = 0
+    while logged < n_misses:
+        generated += 1
+        if rng.random() < noise:
+            text = ' '.join(rng.choice(NOISE) for _ in range(rng.randint(1, 4)))
+        else:
+            _, term, context = rng.choice(PLANTED)
+            words = [term] + rng.sample(context, rng.randint(0, 2))
+            rng.shuffle(words)
+            text = rng.choice(TEMPLATES).format(' '.join(words))
+        text = normalize_text(text)
+        if text not in outcomes:
+            outcomes[text] = classify(text, matcher, retriever)
+        if outcomes[text] is not None:
+            log.record(text, *outcomes[text])
+            logged += 1
+            if len(log) >= 10000:
+                log.flush()
+    log.flush()
+    return generated
+
+
+def run(args):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'misses.jsonl')
+        log = MissLog(path, max_bytes=args.max_mb * 2 ** 20, backups=1000)
+        started = time.perf_counter()
+        generated = generate(log, args.misses, args.noise)
+        files = log_files(path)
+        print(f'generated={generated} logged={args.misses} files={len(files)} '
+              f'size={sum(os.path.getsize(name) for name in files) / 2 ** 20:.1f}MB '
+              f'in {time.perf_counter() - started:.1f}s')
+
+        started = time.perf_counter()
+        texts, counts = load_misses(files)
+        load_seconds = time.perf_counter() - started
+        faq, _ = load_content(DEFAULT_CONTENT_PATH)
+        report = mine(texts, counts, faq, min_count=max(20, args.misses // 10000))
+        report['timings'] = {'load': round(load_seconds, 2), **report['timings']}
+        print_report(report)
+        print(f'total mining time: {sum(report["timings"].values()):.1f}s')
+
+    proposed = {item['keyword']: (group['topic'], item) for group in report['groups'] for item in group['keywords']}
+    print()
+    wrong = []
+    for topic, term, _ in PLANTED:
+        term = normalize_text(term)
+        if term in proposed:
+            found, item = proposed[term]
+            print(f'{term}: proposed for {found or "new topic"} (expected {topic}) '
+                  f'coverage={item["coverage"]:.1%} precision={item["precision"]:.0%}')
+        else:
+            found = None
+            print(f'{term}: not proposed (expected {topic})')
+        if found != topic:
+            wrong.append(term)
+    noise = {normalize_text(word) for word in NOISE}
+    leaked = sorted(term for term, (found, _) in proposed.items() if found and set(term.split()) & noise)
+    assert not wrong, f'planted synonyms attributed to the wrong topic: {wrong}'
+    assert not leaked, f'noise terms proposed for existing topics: {leaked}'
+    print('ok: every planted synonym was proposed for its own topic')
+
+
+def cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--misses', type=int, default=1000000)
+    parser.add_argument('--noise', type=float, default=0.3, help='سهم پیام‌های بی‌ربط')
+    parser.add_argument('--max-mb', type=int, default=16, help='حجم هر فایل پیش از چرخش')
+    run(parser.parse_args())
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,137 @@
+"""تست بار کلاینت وضعیت سفارش در برابر سرور جعلی محلی
+
+۱. اوج «سفارشم کجاست»: تعداد زیادی استعلام هم‌زمان برای چند سفارش پرتکرار؛
+   تعداد درخواست‌ها و اتصال‌های رسیده به سرور و زمان پاسخ گزارش می‌شود.
+۲. سرور خراب (500): قطع‌کننده مدار پس از چند خطا باز می‌شود و بقیه استعلام‌ها
+   بلافاصله رد می‌شوند؛ پس از reset_timeout با یک درخواست آزمایشی بسته می‌شود.
+۳. سرور بی‌پاسخ: استعلام‌ها با timeout تمام می‌شوند.
+۴. پیام‌های متنی از مسیر کامل ربات: شماره سفارش فارسی با #، عدد بدون نشانه سفارش
+   (قیمت) که نباید استعلام شود، عدد خالی در جواب /track و شماره ناموجود که باید به
+   سوالات متداول برسد.
+
+اجرا از ریشه مخزن:
+    python -m benchmarks.bench_orders --lookups 5000 --orders 50
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from telegram import Update
+
+import main
+from benchmarks.bench_concurrency import percentile
+from benchmarks.canned_updates import message_update
+from benchmarks.fake_api import FakeBotAPI
+from benchmarks.order_stub import OrderStub
+from normalizer import normalize_text
+from orders import CircuitBreaker, OrderServiceUnavailable, OrderStatusClient, find_order_number
+
+
+async def timed_lookup(client, order_id):
+    started = time.perf_counter()
+    try:
+        await client.get(order_id)
+        outcome = 'ok'
+    except OrderServiceUnavailable:
+        outcome = 'unavailable'
+    return time.perf_counter() - started, outcome
+
+
+async def peak(args):
+    stub = await OrderStub(latency=args.latency).start()
+    client = OrderStatusClient(stub.url, cache_ttl=args.cache_ttl)
+    rng = random.Random(0)
+    orders = [str(1000000 + rng.randrange(10 ** 6)) for _ in range(args.orders)]
+    started = time.perf_counter()
+    results = []
+    # استعلام‌ها در دسته‌های هم‌زمان در طول اوج
+    for batch in range(0, args.lookups, args.burst):
+        results += await asyncio.gather(*(timed_lookup(client, rng.choice(orders))
+                                          for _ in range(min(args.burst, args.lookups - batch))))
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - started
+    latencies = [latency for latency, outcome in results]
+    print(f'peak: lookups={len(results)} orders={args.orders} backend_requests={stub.requests} '
+          f'connections={stub.connections} p50={percentile(latencies, 0.5) * 1000:.1f}ms '
+          f'p99={percentile(latencies, 0.99) * 1000:.1f}ms total={elapsed:.2f}s')
+    await client.close()
+    await stub.stop()
+
+
+async def outage(args):
+    stub = await OrderStub(mode='error').start()
+    breaker = CircuitBreaker(threshold=5, reset_timeout=0.5)
+    client = OrderStatusClient(stub.url, cache_ttl=0, breaker=breaker)
+    results = [await timed_lookup(client, str(2000000 + i)) for i in range(50)]
+    fast = [latency for latency, outcome in results[5:]]
+    print(f'outage: backend_requests={stub.requests}/50 breaker={breaker.state} '
+          f'rejected_p99={percentile(fast, 0.99) * 1e6:.0f}µs')
+    stub.mode = 'ok'
+    await asyncio.sleep(0.6)
+    latency, outcome = await timed_lookup(client, '2000001')
+    print(f'recovery: probe={outcome} breaker={breaker.state} backend_requests={stub.requests}')
+    await client.close()
+    await stub.stop()
+
+
+async def hang(args):
+    stub = await OrderStub(mode='hang').start()
+    client = OrderStatusClient(stub.url, timeout=args.timeout)
+    latency, outcome = await timed_lookup(client, '3000001')
+    print(f'hang: outcome={outcome} after {latency:.2f}s (timeout={args.timeout}s)')
+    await client.close()
+    await stub.stop()
+
+
+async def end_to_end(args):
+    for text in ('سلام، سفارش #۱۲۳۴۵۶۸ من کجاست؟', 'قیمت ۵۰۰۰۰۰ تومان', '۱۲۳۴۵۶۸', '09121234567 سفارش'):
+        print(f'detect: {text!r} -> {find_order_number(normalize_text(text))}')
+    stub = await OrderStub(latency=args.latency).start()
+    main.ORDERS = OrderStatusClient(stub.url)
+    api = FakeBotAPI()
+    application = main.build_application(request=api, outbound_limits=False, inbound_limits=False)
+    await application.initialize()
+    # (متن، آیا استعلام انتظار می‌رود، بخشی از پاسخ مورد انتظار)
+    steps = [
+        ('سلام، سفارش #۱۲۳۴۵۶۸ من کجاست؟', True, 'وضعیت سفارش 1234568'),
+        ('قیمت ۵۰۰۰۰۰ تومان', False, None),
+        ('/track', False, None),
+        ('۱۲۳۴۵۷۰', True, 'وضعیت سفارش 1234570'),
+        ('1234571', False, None),
+        # مضرب ۷ در سرور جعلی ناموجود است؛ پیام به پاسخ سوالات متداول می‌رسد
+        ('پیگیری سفارش ۷۰۰۰۰۰۷', True, main.CONTENT.current.answers['پیگیری سفارش'][0]),
+    ]
+    for update_id, (text, lookup, expected) in enumerate(steps, 1):
+        requests = stub.requests
+        await application.process_update(Update.de_json(message_update(update_id, 42, text), application.bot))
+        reply = api.calls[-1][1]['text']
+        looked_up = stub.requests > requests
+        print(f'{text!r}: lookup={looked_up} reply={reply.splitlines()[0]!r}')
+        assert looked_up == lookup, text
+        assert expected is None or expected in reply, text
+    await application.shutdown()
+    await main.ORDERS.close()
+    await stub.stop()
+
+
+async def run(args):
+    await peak(args)
+    await outage(args)
+    await hang(args)
+    await end_to_end(args)
+
+
+def cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--lookups', type=int, default=5000)
+    parser.add_argument('--orders', type=int, default=50)
+    parser.add_argument('--burst', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--cache-ttl', type=float, default=30.0)
+    parser.add_argument('--timeout', type=float, default=0.5)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    cli()
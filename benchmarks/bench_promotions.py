@@ -0,0 +1,130 @@
+"""تست پیشنهادهای زمان‌دار: ایندکس heap و ارسال خودکار هنگام باز شدن بازه
+
+بخش اول چند ده هزار بازه تصادفی یک سال را می‌سازد و همه شروع‌ها و پایان‌ها را به
+ترتیب زمانی با advance اعمال می‌کند؛ هزینه هر تغییر با پیمایش خطی همه بازه‌ها
+(کاری که بدون ایندکس در هر درخواست لازم بود) مقایسه می‌شود.
+بخش دوم با API جعلی و ساعت ساختگی باز شدن یک پیشنهاد را اجرا می‌کند: نسخه جدید
+محتوا با منوی پیشنهادهای فعال منتشر می‌شود و نسخه قبلی دست‌نخورده می‌ماند، مهلت به
+منطقه زمانی بازه نمایش داده می‌شود، ارسال همگانی فقط یک بار (حتی از Broadcaster یک
+کارگر دیگر) ساخته می‌شود و با بسته شدن بازه منو به حالت قبل برمی‌گردد.
+
+اجرا از ریشه مخزن:
+    python -m benchmarks.bench_promotions --windows 50000 --subscribers 2000
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+import main
+from benchmarks.fake_api import FakeBotAPI
+from broadcast import Broadcaster, SubscriberRegistry
+from promotions import PromotionSchedule
+
+YEAR = 365 * 86400
+
+
+def bench_index(args):
+    rng = random.Random(args.seed)
+    base = time.time()
+    windows = []
+    for index in range(args.windows):
+        start = base + rng.uniform(0, YEAR)
+        windows.append({'title': f'p{index}', 'start': start, 'end': start + rng.uniform(3600, 14 * 86400),
+                        'audience': 'none'})
+    started = time.perf_counter()
+    schedule = PromotionSchedule(windows, now=base)
+    built = time.perf_counter() - started
+
+    boundaries = sorted({window['start'] for window in windows} | {window['end'] for window in windows})
+    events = peak = 0
+    started = time.perf_counter()
+    for now in boundaries:
+        opened, closed = schedule.advance(now)
+        events += len(opened) + len(closed)
+        peak = max(peak, len(schedule.active))
+    elapsed = time.perf_counter() - started
+    print(f'index: {args.windows} windows built in {built * 1000:.1f}ms; {events} open/close events in '
+          f'{elapsed:.2f}s ({elapsed / events * 1e6:.1f}us/event incl. active rebuild), peak active={peak}')
+
+    probes = [base + rng.uniform(0, YEAR) for _ in range(200)]
+    started = time.perf_counter()
+    for now in probes:
+        [window for window in windows if window['start'] <= now < window['end']]
+    scan = (time.perf_counter() - started) / len(probes)
+    started = time.perf_counter()
+    for _ in range(100000):
+        schedule.active
+    read = (time.perf_counter() - started) / 100000
+    print(f'per request: linear scan {scan * 1e6:.0f}us vs cached active set {read * 1e9:.0f}ns')
+
+
+async def bench_push(args):
+    registry = SubscriberRegistry(os.path.join(tempfile.mkdtemp(), 'subscribers.db'))
+    for chat_id in range(args.subscribers):
+        registry.add(100000 + chat_id)
+    api = FakeBotAPI(latency=args.latency)
+    application = main.build_application(request=api, concurrency=1, outbound_limits=False, inbound_limits=False)
+    await application.initialize()
+    application.bot_data['broadcaster'] = Broadcaster(
+        application.bot, registry, rate=args.rate, parse_mode=main.PARSE_MODE)
+    other_worker = Broadcaster(application.bot, registry, rate=args.rate, parse_mode=main.PARSE_MODE)
+
+    # بازه با منطقه زمانی غیر از ساعت سرور تا مهلت نمایش‌داده‌شده بررسی شود
+    content = main.CONTENT.current.copy()
+    title = 'جشنواره پاییزه'
+    t0 = time.time()
+    zone = timezone(timedelta(hours=3, minutes=30))
+    content.timed = content.timed | {title}
+    content.schedule = PromotionSchedule(
+        [{'title': title, 'start': t0 + 10, 'end': t0 + 20, 'audience': 'subscribers', 'tzinfo': zone}], now=t0)
+    main.build_promotion_views(content)
+    main.CONTENT.current = content
+    before = content.menus['show_promo'][0]
+
+    broadcaster = application.bot_data['broadcaster']
+    await main.refresh_promotions(application, now=t0 + 5)
+    quiet = main.CONTENT.current is content and not broadcaster.active
+    started = time.perf_counter()
+    await main.refresh_promotions(application, now=t0 + 10)
+    swap = time.perf_counter() - started
+    current = main.CONTENT.current
+    assert current is not content and content.menus['show_promo'][0] == before and not content.schedule.active, \
+        'نسخه منتشرشده قبلی نباید تغییر کند'
+    opened = current.menus['show_promo'][0] != before and current.menus['promotions'][1].inline_keyboard[0][0].text
+    deadline = f"{datetime.fromtimestamp(t0 + 20, zone):%Y-%m-%d %H:%M}"
+    assert deadline in current.menus['show_promo'][0], 'مهلت باید به منطقه زمانی بازه نمایش داده شود'
+    await main.refresh_promotions(application, now=t0 + 11)
+    duplicate = await other_worker.start(current.promotion_texts[title][0], key=f'promotion:{title}:{t0 + 10:.0f}')
+
+    jobs = len(broadcaster.active)
+    while broadcaster.active:
+        await asyncio.sleep(0.05)
+    pushed = api.count('sendMessage')
+    pushed_elapsed = time.perf_counter() - started
+    await main.refresh_promotions(application, now=t0 + 20)
+    closed = main.CONTENT.current.menus['show_promo'][0] == before
+
+    print(f'push: before-open unchanged={quiet}; swap on open {swap * 1000:.2f}ms, button={opened!r}; '
+          f'broadcast jobs={jobs} (other worker duplicate={duplicate is not None}); '
+          f'{pushed} messages to {args.subscribers} subscribers in {pushed_elapsed:.2f}s; menu restored on close={closed}')
+    await application.shutdown()
+
+
+def cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--windows', type=int, default=50000)
+    parser.add_argument('--subscribers', type=int, default=2000)
+    parser.add_argument('--rate', type=float, default=5000, help='نرخ ارسال همگانی در ثانیه')
+    parser.add_argument('--latency', type=float, default=0.005, help='تاخیر API جعلی به ثانیه')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    bench_index(args)
+    asyncio.run(bench_push(args))
+
+
+if __name__ == '__main__':
+    cli()
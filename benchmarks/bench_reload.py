@@ -0,0 +1,118 @@
+"""بررسی بارگذاری مجدد محتوا هم‌زمان با handle_message
+
+دو نسخه از فایل محتوا ساخته می‌شود: در نسخه B کلیدواژه‌های دو موضوع جابه‌جا شده‌اند
+و پاسخ هر موضوع در هر نسخه با برچسب [نسخه:موضوع] شروع می‌شود. در حالی که صدها پیام
+با همان کلیدواژه هم‌زمان پردازش می‌شوند، فایل مدام بین دو نسخه عوض و در یک thread
+دوباره بارگذاری می‌شود. پاسخ هر پیام باید یا [A:X] باشد یا [B:Y]؛ ترکیب ایندکس یک
+نسخه با پاسخ‌های نسخه دیگر ([A:Y] یا [B:X]) یعنی handler نسخه نیمه‌ساخته دیده است.
+
+اجرا از ریشه مخزن:
+    python -m benchmarks.bench_reload --messages 3000 --concurrency 32
+"""
+import argparse
+import asyncio
+import copy
+import json
+import os
+import tempfile
+import time
+from collections import Counter
+
+from telegram import Update
+
+import main
+from benchmarks.canned_updates import message_update
+from benchmarks.fake_api import FakeBotAPI
+from content_store import DEFAULT_CONTENT_PATH, ContentStore
+from normalizer import normalize_text
+
+
+def write_version(path, data, tag, swap):
+    """نوشتن اتمیک یک نسخه از فایل محتوا"""
+    data = copy.deepcopy(data)
+    first, second = swap
+    if tag == 'B':
+        data['faq'][first]['keywords'], data['faq'][second]['keywords'] = \
+            data['faq'][second]['keywords'], data['faq'][first]['keywords']
+    for topic, entry in data['faq'].items():
+        entry['answer'] = f'[{tag}:{topic}] ' + entry['answer']
+    temporary = f'{path}.tmp'
+    with open(temporary, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(temporary, path)
+
+
+async def run(args):
+    with open(DEFAULT_CONTENT_PATH, encoding='utf-8') as f:
+        data = json.load(f)
+    swap = (args.first, args.second)
+    keyword = data['faq'][args.first]['keywords'][0]
+    path = os.path.join(tempfile.mkdtemp(), 'content.json')
+
+    # موضوع مورد انتظار هر نسخه از یک بارگذاری جداگانه
+    expected = {}
+    for tag in ('A', 'B'):
+        write_version(path, data, tag, swap)
+        expected[tag] = ContentStore(path, view_builder=main.build_views).current.matcher.best_match(
+            normalize_text(keyword))
+    assert expected['A'] != expected['B'], 'کلیدواژه در دو نسخه باید به دو موضوع متفاوت برسد'
+    valid = {f"[{tag}:{topic}]" for tag, topic in expected.items()}
+    mixed = {f"[A:{expected['B']}]", f"[B:{expected['A']}]"}
+
+    write_version(path, data, 'A', swap)
+    store = main.CONTENT = ContentStore(path, view_builder=main.build_views)
+    api = FakeBotAPI(latency=args.latency, jitter=args.latency)
+    application = main.build_application(
+        request=api, concurrency=args.concurrency, outbound_limits=False, inbound_limits=False)
+    await application.initialize()
+    await application.start()
+
+    reloads = 0
+    done = asyncio.Event()
+
+    async def reloader():
+        nonlocal reloads
+        tags = iter(('B', 'A') * 10 ** 6)
+        while not done.is_set():
+            write_version(path, data, next(tags), swap)
+            await asyncio.to_thread(store.reload)
+            reloads += 1
+            await asyncio.sleep(args.interval)
+
+    reloading = asyncio.create_task(reloader())
+    started = time.perf_counter()
+    for update_id in range(1, args.messages + 1):
+        await application.update_queue.put(
+            Update.de_json(message_update(update_id, 100000 + update_id % 500, keyword), application.bot))
+        if update_id % args.concurrency == 0:
+            await asyncio.sleep(0)
+    while api.count('sendMessage') < args.messages:
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - started
+    done.set()
+    await reloading
+    await application.stop()
+    await application.shutdown()
+
+    seen = Counter(next((label for label in valid | mixed if label in params['text']), 'other')
+                   for method, params, _ in api.calls if method == 'sendMessage')
+    print(f'{args.messages} messages in {elapsed:.2f}s with {reloads} reloads; replies: {dict(seen)}')
+    assert not any(seen[label] for label in mixed), 'handler نسخه مخلوط محتوا را دیده است'
+    assert seen['other'] == 0, 'پاسخی بدون برچسب نسخه فرستاده شده است'
+    assert all(seen[label] for label in valid), 'هر دو نسخه باید در حین اجرا دیده شوند'
+    print('ok: every reply came from a single, complete snapshot')
+
+
+def cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--messages', type=int, default=3000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--interval', type=float, default=0.01, help='فاصله بارگذاری‌های مجدد به ثانیه')
+    parser.add_argument('--latency', type=float, default=0.002, help='تاخیر API جعلی به ثانیه')
+    parser.add_argument('--first', default='پیگیری سفارش', help='موضوعی که کلیدواژه‌اش فرستاده می‌شود')
+    parser.add_argument('--second', default='هزینه ارسال', help='موضوعی که در نسخه B کلیدواژه‌ها را می‌گیرد')
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,77 @@
+"""مقایسه حلقه تودرتوی قدیمی با KeywordMatcher و FAQRetriever
+
+اجرا از ریشه مخزن:
+    python -m benchmarks.bench_retrieval --topics 10000
+"""
+import argparse
+import random
+import time
+
+from content_store import DEFAULT_CONTENT_PATH, load_content
+from matcher import KeywordMatcher
+from normalizer import normalize_text
+from retrieval import FAQRetriever
+
+FAQ_DATABASE, _ = load_content(DEFAULT_CONTENT_PATH)
+
+
+def synthetic_faq(n_topics):
+    """تکثیر دیتابیس واقعی با پسوند عددی تا n موضوع"""
+    faq = {}
+    base = list(FAQ_DATABASE.items())
+    for i in range(n_topics):
+        topic, data = base[i % len(base)]
+        suffix = '' if i < len(base) else f' {i}'
+        faq[topic + suffix] = {
+            'answer': data['answer'],
+            'keywords': [keyword + suffix for keyword in data['keywords']],
+        }
+    return faq
+
+
+def nested_loop(faq, text):
+    """پیاده‌سازی قبلی handle_message"""
+    for category, data in faq.items():
+        for keyword in data['keywords']:
+            if keyword in text:
+                return category
+    return None
+
+
+def timed(func, queries):
+    start = time.perf_counter()
+    for query in queries:
+        func(query)
+    return (time.perf_counter() - start) / len(queries) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--topics', type=int, default=len(FAQ_DATABASE))
+    parser.add_argument('--queries', type=int, default=2000)
+    args = parser.parse_args()
+
+    faq = synthetic_faq(args.topics)
+    keywords = [keyword for data in faq.values() for keyword in data['keywords']]
+    rng = random.Random(0)
+    # نیمی از پرسش‌ها کلیدواژه دارند و نیمی به شاخه «پیدا نشد» می‌روند
+    queries = [f'سلام {rng.choice(keywords)} لطفا راهنمایی کنید' for _ in range(args.queries // 2)]
+    queries += ['سلام وقت بخیر یک سوال داشتم درباره قیمت'] * (args.queries - len(queries))
+
+    start = time.perf_counter()
+    matcher = KeywordMatcher(faq)
+    matcher_build = time.perf_counter() - start
+    start = time.perf_counter()
+    retriever = FAQRetriever(faq)
+    retriever_build = time.perf_counter() - start
+
+    print(f'topics={len(faq)} queries={len(queries)}')
+    print(f'build: matcher={matcher_build * 1e3:.1f}ms retriever={retriever_build * 1e3:.1f}ms '
+          f'index={retriever.nbytes / 1024:.0f}KiB vocabulary={len(retriever.vocabulary)}')
+    print(f'nested loop: {timed(lambda q: nested_loop(faq, q.lower()), queries):9.1f} us/query')
+    print(f'matcher:     {timed(lambda q: matcher.best_match(normalize_text(q)), queries):9.1f} us/query')
+    print(f'retriever:   {timed(lambda q: retriever.search(q, k=3), queries):9.1f} us/query')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""تست محدودیت ورودی کاربران
+
+یک کاربر مزاحم یک دکمه را پشت‌سرهم می‌زند و پیام‌های متنی پشت‌سرهم می‌فرستد،
+هم‌زمان کاربران عادی از ربات استفاده می‌کنند. تعداد فراخوانی‌های API و پاسخ‌های
+کاربران عادی با و بدون InboundThrottle مقایسه می‌شود. سپس تعداد زیادی کاربر
+یکتا با گذر زمان عبور داده می‌شود تا محدود ماندن وضعیت نگه‌داشته‌شده دیده شود.
+
+اجرا از ریشه مخزن:
+    python -m benchmarks.bench_throttle --taps 200 --users 100000
+"""
+import argparse
+import asyncio
+import time
+
+from telegram import Update
+from telegram.ext import ApplicationHandlerStop
+
+import main
+from benchmarks.canned_updates import callback_update, message_update
+from benchmarks.fake_api import FakeBotAPI
+from throttle import InboundThrottle
+
+ABUSER = 666
+
+
+def traffic(taps):
+    """ضربه‌های کاربر مزاحم با فاصله ۱۰ میلی‌ثانیه و هر ۱۰۰ میلی‌ثانیه یک کاربر عادی"""
+    update_id = 0
+    for i in range(taps):
+        update_id += 1
+        if i % 2:
+            yield i * 0.01, callback_update(update_id, ABUSER, 'cat_order')
+        else:
+            yield i * 0.01, message_update(update_id, ABUSER, 'سلام')
+        if i % 10 == 0:
+            update_id += 1
+            yield i * 0.01, callback_update(update_id, 1 + i, 'cat_payment')
+
+
+async def run_app(args, throttled):
+    api = FakeBotAPI(latency=args.latency)
+    application = main.build_application(request=api, concurrency=16, outbound_limits=False,
+                                         inbound_limits=throttled)
+    await application.initialize()
+    await application.start()
+    started = time.perf_counter()
+    for offset, data in traffic(args.taps):
+        delay = started + offset - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        await application.update_queue.put(Update.de_json(data, application.bot))
+    await asyncio.sleep(args.latency * 4 + 0.5)
+    await application.stop()
+    await application.shutdown()
+
+    abuser = sum(1 for call in api.calls if call[1].get('chat_id') == ABUSER and call[0] != 'answerCallbackQuery')
+    normal = sum(1 for call in api.calls if call[0] == 'editMessageText' and call[1].get('chat_id') != ABUSER)
+    print(f'{"throttled" if throttled else "open":>9}: api_calls={len(api.calls)} abuser_replies={abuser} '
+          f'normal_replies={normal}/{args.taps // 10}')
+
+
+async def run_state(args):
+    throttle = InboundThrottle(idle_ttl=args.idle_ttl)
+    bot = main.build_application(request=FakeBotAPI()).bot
+    peak = 0
+    started = time.perf_counter()
+    for user_id in range(1, args.users + 1):
+        update = Update.de_json(message_update(user_id, user_id, 'سلام'), bot)
+        try:
+            await throttle(update, None)
+        except ApplicationHandlerStop:
+            pass
+        peak = max(peak, len(throttle))
+    elapsed = time.perf_counter() - started
+    print(f'users={args.users} idle_ttl={throttle.idle_ttl}s peak_tracked={peak} final_tracked={len(throttle)} '
+          f'per_update={elapsed / args.users * 1e6:.1f}µs (incl. Update.de_json)')
+
+
+async def run(args):
+    await run_app(args, throttled=False)
+    await run_app(args, throttled=True)
+    await run_state(args)
+
+
+def cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--taps', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.03)
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--idle-ttl', type=float, default=1.0)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,131 @@
+"""تست لایه HTTP ربات (pool اتصال، keep-alive و timeoutها) با Bot API محلی جعلی
+
+یک سرور HTTP محلی با تاخیر ثابت به getMe و sendMessage پاسخ می‌دهد. یک موج
+هم‌زمان sendMessage با اندازه‌های مختلف pool، یک بار با HTTPXRequest پیش‌فرض و
+یک بار با TunedHTTPXRequest، فرستاده می‌شود و برای هر حالت تعداد خطاهای «Pool
+timeout»، اتصال‌های باز شده، توان و چندک‌های زمان گزارش می‌شود.
+
+اجرا از ریشه مخزن:
+    python -m benchmarks.bench_transport --requests 1000 --latency 0.05 --pools 8,32,256
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from telegram import Bot
+from telegram.error import TimedOut
+from telegram.request import HTTPXRequest
+
+from metrics import API_ERRORS, InstrumentedRequest
+from transport import TunedHTTPXRequest
+
+TOKEN = '123456:TEST'
+
+
+class BotAPIStub:
+    """سرور HTTP/1.1 کوچک با پاسخ ثابت Bot API و اتصال‌های keep-alive"""
+
+    def __init__(self, latency=0.05):
+        self.latency = latency
+        self.requests = 0
+        self.connections = 0
+        self._server = None
+
+    @property
+    def url(self):
+        host, port = self._server.sockets[0].getsockname()[:2]
+        return f'http://{host}:{port}'
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, '127.0.0.1', 0, backlog=1024)
+        return self
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    def result(self, api_method):
+        if api_method == 'getMe':
+            return {'id': 1000, 'is_bot': True, 'first_name': 'FakeBot', 'username': 'fake_bot'}
+        return {'message_id': self.requests, 'date': int(time.time()), 'chat': {'id': 1, 'type': 'private'}}
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                length = 0
+                while (line := await reader.readline()) not in (b'\r\n', b'\n', b''):
+                    name, _, value = line.partition(b':')
+                    if name.strip().lower() == b'content-length':
+                        length = int(value)
+                if length:
+                    await reader.readexactly(length)
+                self.requests += 1
+                await asyncio.sleep(self.latency)
+                api_method = request_line.split()[1].decode().rsplit('/', 1)[-1]
+                payload = json.dumps({'ok': True, 'result': self.result(api_method)}).encode()
+                writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n'
+                             b'Content-Length: ' + str(len(payload)).encode() + b'\r\n\r\n' + payload)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+
+def quantile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))] if values else 0.0
+
+
+async def run_once(args, pool_size, tuned):
+    stub = await BotAPIStub(args.latency).start()
+    if tuned:
+        inner = TunedHTTPXRequest(pool_size=pool_size, pool_timeout=args.pool_timeout)
+    else:
+        inner = HTTPXRequest(connection_pool_size=pool_size, pool_timeout=args.pool_timeout)
+    request = InstrumentedRequest(inner)
+    bot = Bot(TOKEN, base_url=f'{stub.url}/bot', request=request)
+    pool_errors = API_ERRORS.values[('sendMessage', 'PoolTimeout')]
+    timings = []
+
+    async def send(index):
+        started = time.perf_counter()
+        try:
+            await bot.send_message(chat_id=index, text='سلام')
+        except TimedOut:
+            return
+        timings.append(time.perf_counter() - started)
+
+    async with bot:
+        started = time.perf_counter()
+        await asyncio.gather(*(send(index) for index in range(args.requests)))
+        elapsed = time.perf_counter() - started
+    await stub.stop()
+    print(f'{"tuned" if tuned else "httpx":>5} pool={pool_size:>4}: ok={len(timings):>5} pool_timeouts='
+          f'{API_ERRORS.values[("sendMessage", "PoolTimeout")] - pool_errors:>5g} connections={stub.connections:>4} '
+          f'throughput={len(timings) / elapsed:>6.0f}/s p50={quantile(timings, 0.5) * 1000:.0f}ms '
+          f'p99={quantile(timings, 0.99) * 1000:.0f}ms')
+
+
+async def run(args):
+    for pool_size in (int(size) for size in args.pools.split(',')):
+        await run_once(args, pool_size, tuned=False)
+        await run_once(args, pool_size, tuned=True)
+
+
+def cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--pool-timeout', type=float, default=1.0)
+    parser.add_argument('--pools', default='8,32,256')
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    cli()
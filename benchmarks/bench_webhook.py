@@ -0,0 +1,118 @@
+"""ارسال آپدیت‌های نمونه به اپلیکیشن ASGI وب‌هوک بدون شبکه
+
+زمان پاسخ (ACK) هر POST و توان پردازش تا ارسال همه پاسخ‌ها به API جعلی اندازه‌گیری می‌شود.
+
+اجرا از ریشه مخزن:
+    python -m benchmarks.bench_webhook --updates 2000 --latency 0.05
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+import main
+from benchmarks.canned_updates import callback_update, message_update
+from benchmarks.fake_api import FakeBotAPI
+from webhook import WebhookApp
+
+SECRET = 'bench-secret'
+
+
+async def post(app, path, payload, secret=SECRET):
+    """یک درخواست POST درون‌فرایندی به اپلیکیشن ASGI؛ خروجی کد وضعیت"""
+    body = json.dumps(payload).encode()
+    scope = {
+        'type': 'http', 'method': 'POST', 'path': path,
+        'headers': [(b'content-type', b'application/json'),
+                    (b'x-telegram-bot-api-secret-token', secret.encode())],
+    }
+    sent = False
+    status = []
+
+    async def receive():
+        nonlocal sent
+        if sent:
+            return {'type': 'http.disconnect'}
+        sent = True
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            status.append(message['status'])
+
+    await app(scope, receive, send)
+    return status[0]
+
+
+def workload(n_updates, n_chats):
+    """ترکیب /start، دکمه‌ها و سوالات متنی"""
+    texts = ['گارانتی داره؟', 'هزینه ارسال چقدره', 'سلام وقت بخیر']
+    buttons = ['main_menu', 'cat_order', 'faq_پیگیری سفارش', 'promotions']
+    for i in range(n_updates):
+        chat_id = 1 + i % n_chats
+        kind = i % 3
+        if kind == 0:
+            yield message_update(i + 1, chat_id, '/start')
+        elif kind == 1:
+            yield callback_update(i + 1, chat_id, buttons[i % len(buttons)])
+        else:
+            yield message_update(i + 1, chat_id, texts[i % len(texts)])
+
+
+async def run(args):
+    api = FakeBotAPI(latency=args.latency)
+    app = WebhookApp(
+        lambda: main.build_application(request=api, outbound_limits=False, inbound_limits=False),
+        secret_token=SECRET, path='/webhook'
+    )
+    await app.startup()
+
+    updates = list(workload(args.updates, args.chats))
+    expected = len(updates)
+    callbacks = sum('callback_query' in update for update in updates)
+    ack_times = []
+    started = time.perf_counter()
+    for payload in updates:
+        t0 = time.perf_counter()
+        status = await post(app, '/webhook', payload)
+        ack_times.append(time.perf_counter() - t0)
+        assert status == 200, status
+    acked = time.perf_counter() - started
+
+    # هر پیام یک sendMessage و هر دکمه یک answerCallbackQuery تولید می‌کند؛ editMessageText برای
+    # منوی بی‌تغییر فرستاده نمی‌شود و بعضی دکمه‌ها پیام هم می‌فرستند، پس هر نوع جدا شمرده می‌شود
+    def handled():
+        return min(api.count('sendMessage'), expected - callbacks) + \
+            min(api.count('answerCallbackQuery'), callbacks)
+
+    while handled() < expected:
+        if time.perf_counter() - started > args.timeout:
+            break
+        await asyncio.sleep(0.01)
+    processed = time.perf_counter() - started
+    done = handled()
+
+    forbidden = await post(app, '/webhook', updates[0], secret='wrong')
+    await app.shutdown()
+
+    ack_times.sort()
+    print(f'updates={expected} chats={args.chats} api_latency={args.latency * 1000:.0f}ms')
+    print(f'ack: p50={statistics.median(ack_times) * 1e6:.0f}us '
+          f'p99={ack_times[int(len(ack_times) * 0.99) - 1] * 1e6:.0f}us '
+          f'rate={expected / acked:.0f}/s')
+    print(f'processed={done}/{expected} in {processed:.2f}s ({done / processed:.0f} updates/s)')
+    print(f'wrong secret -> {forbidden}')
+
+
+def cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--updates', type=int, default=1000)
+    parser.add_argument('--chats', type=int, default=100)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--timeout', type=float, default=120.0)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    cli()
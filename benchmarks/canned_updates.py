@@ -0,0 +1,88 @@
+"""ساخت JSON آپدیت‌های نمونه تلگرام برای تست‌های محلی"""
+import time
+
+
+def _user(chat_id):
+    return {'id': chat_id, 'is_bot': False, 'first_name': f'user{chat_id}'}
+
+
+def message_update(update_id, chat_id, text):
+    """آپدیت پیام متنی یا دستور"""
+    message = {
+        'message_id': update_id,
+        'date': int(time.time()),
+        'chat': {'id': chat_id, 'type': 'private'},
+        'from': _user(chat_id),
+        'text': text,
+    }
+    if text.startswith('/'):
+        command = text.split()[0]
+        message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(command)}]
+    return {'update_id': update_id, 'message': message}
+
+
+def photo_update(update_id, chat_id, caption=None):
+    """آپدیت پیام عکس (با کپشن اختیاری)"""
+    update = message_update(update_id, chat_id, '')
+    message = update['message']
+    del message['text']
+    message['photo'] = [{'file_id': f'photo{update_id}', 'file_unique_id': f'p{update_id}', 'width': 90, 'height': 90}]
+    if caption:
+        message['caption'] = caption
+    return update
+
+
+def sticker_update(update_id, chat_id):
+    """آپدیت پیام استیکر (بدون امکان کپشن)"""
+    update = message_update(update_id, chat_id, '')
+    message = update['message']
+    del message['text']
+    message['sticker'] = {'file_id': f'sticker{update_id}', 'file_unique_id': f's{update_id}', 'width': 512,
+                          'height': 512, 'is_animated': False, 'is_video': False, 'type': 'regular'}
+    return update
+
+
+def reply_update(update_id, chat_id, text, reply_to_message_id):
+    """آپدیت پیام متنی که reply روی یکی از پیام‌های ربات است"""
+    update = message_update(update_id, chat_id, text)
+    update['message']['reply_to_message'] = {
+        'message_id': reply_to_message_id,
+        'date': int(time.time()),
+        'chat': {'id': chat_id, 'type': 'private'},
+        'from': {'id': 1000, 'is_bot': True, 'first_name': 'FakeBot'},
+        'text': 'ticket',
+    }
+    return update
+
+
+def callback_update(update_id, chat_id, data, message_id=1):
+    """آپدیت فشردن دکمه اینلاین روی یک پیام ربات"""
+    return {
+        'update_id': update_id,
+        'callback_query': {
+            'id': str(update_id),
+            'from': _user(chat_id),
+            'chat_instance': str(chat_id),
+            'data': data,
+            'message': {
+                'message_id': message_id,
+                'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private'},
+                'from': {'id': 1000, 'is_bot': True, 'first_name': 'FakeBot'},
+                'text': 'menu',
+            },
+        },
+    }
+
+
+def inline_update(update_id, user_id, query, offset=''):
+    """آپدیت پرسش inline (@bot عبارت)"""
+    return {
+        'update_id': update_id,
+        'inline_query': {
+            'id': str(update_id),
+            'from': _user(user_id),
+            'query': query,
+            'offset': offset,
+        },
+    }
@@ -0,0 +1,88 @@
+"""API جعلی تلگرام برای تست بار بدون شبکه
+
+FakeBotAPI جایگزین لایه HTTP ربات می‌شود (Application.builder().request(...))،
+برای هر متد پاسخ معتبر برمی‌گرداند و می‌تواند تاخیر شبکه را شبیه‌سازی کند.
+"""
+import asyncio
+import json
+import random
+import time
+
+from telegram.request import BaseRequest
+
+BOT_USER = {'id': 1000, 'is_bot': True, 'first_name': 'FakeBot', 'username': 'fake_bot'}
+
+
+class FakeBotAPI(BaseRequest):
+    """لایه HTTP جعلی که فراخوانی‌ها را ثبت و با تاخیر قابل تنظیم پاسخ می‌دهد
+
+    latency: تاخیر ثابت به ثانیه؛ jitter: بیشینه تاخیر تصادفی اضافه.
+    fail: تابع اختیاری (متد، پارامترها) که برای شبیه‌سازی خطا
+    (کد، توضیح، parameters) و در غیر این صورت None برمی‌گرداند.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, seed=0, fail=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.fail = fail
+        self.calls = []
+        self._random = random.Random(seed)
+        self._message_id = 0
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def count(self, method=None):
+        """تعداد فراخوانی‌های ثبت‌شده (برای یک متد یا همه)"""
+        if method is None:
+            return len(self.calls)
+        return sum(1 for call in self.calls if call[0] == method)
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None,
+                         write_timeout=None, connect_timeout=None, pool_timeout=None):
+        api_method = url.rsplit('/', 1)[-1]
+        params = request_data.parameters if request_data else {}
+
+        delay = self.latency + (self._random.random() * self.jitter if self.jitter else 0.0)
+        if api_method == 'getUpdates':
+            # long polling جعلی: هیچ آپدیتی از این مسیر نمی‌آید
+            delay = max(delay, 0.05)
+        if delay:
+            await asyncio.sleep(delay)
+
+        fault = self.fail(api_method, params) if self.fail else None
+        if fault:
+            code, description, parameters = fault
+            payload = {'ok': False, 'error_code': code, 'description': description}
+            if parameters:
+                payload['parameters'] = parameters
+            return code, json.dumps(payload).encode()
+
+        self.calls.append((api_method, params, time.perf_counter()))
+        return 200, json.dumps({'ok': True, 'result': self._result(api_method, params)}).encode()
+
+    def _result(self, api_method, params):
+        if api_method == 'getMe':
+            return BOT_USER
+        if api_method == 'getUpdates':
+            return []
+        if api_method in ('sendMessage', 'editMessageText'):
+            if api_method == 'sendMessage':
+                self._message_id += 1
+                message_id = self._message_id
+            else:
+                message_id = params.get('message_id', 1)
+            return {
+                'message_id': message_id,
+                'date': int(time.time()),
+                'chat': {'id': params.get('chat_id', 0), 'type': 'private'},
+                'from': BOT_USER,
+                'text': params.get('text', ''),
+            }
+        if api_method == 'copyMessage':
+            self._message_id += 1
+            return {'message_id': self._message_id}
+        return True
@@ -0,0 +1,100 @@
+"""سرور محلی جعلی وضعیت سفارش برای تست کلاینت بدون سرویس واقعی فروشگاه
+
+GET /orders/<id> را با JSON سفارش (یا 404 برای شماره‌های بخش‌پذیر بر ۷) پاسخ
+می‌دهد، اتصال‌ها را keep-alive نگه می‌دارد و تعداد درخواست‌ها و اتصال‌ها را می‌شمارد.
+mode می‌تواند 'ok'، 'error' (پاسخ 500) یا 'hang' (بدون پاسخ) باشد.
+
+اجرای مستقل از ریشه مخزن:
+    python -m benchmarks.order_stub --port 8081
+"""
+import argparse
+import asyncio
+import json
+
+STATUSES = ('pending', 'processing', 'shipped', 'delivered', 'cancelled')
+
+
+class OrderStub:
+    def __init__(self, latency=0.0, mode='ok'):
+        self.latency = latency
+        self.mode = mode
+        self.requests = 0
+        self.connections = 0
+        self._server = None
+
+    @property
+    def url(self):
+        host, port = self._server.sockets[0].getsockname()[:2]
+        return f'http://{host}:{port}'
+
+    async def start(self, port=0):
+        self._server = await asyncio.start_server(self._handle, '127.0.0.1', port)
+        return self
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    def order(self, order_id):
+        number = int(order_id)
+        if number % 7 == 0:
+            return None
+        status = STATUSES[number % len(STATUSES)]
+        return {
+            'id': order_id,
+            'status': status,
+            'updated_at': '1403/05/12 14:30',
+            'tracking_code': f'PK{number:012d}' if status in ('shipped', 'delivered') else None,
+            'eta': '۲ روز کاری' if status in ('processing', 'shipped') else None,
+        }
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                    pass
+                self.requests += 1
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+                if self.mode == 'hang':
+                    await asyncio.sleep(3600)
+
+                path = request_line.split()[1].decode()
+                order_id = path.rsplit('/', 1)[-1]
+                if self.mode == 'error':
+                    status, body = b'500 Internal Server Error', {'error': 'down'}
+                elif not path.startswith('/orders/') or not order_id.isdigit():
+                    status, body = b'404 Not Found', {'error': 'not found'}
+                else:
+                    order = self.order(order_id)
+                    status, body = (b'200 OK', order) if order else (b'404 Not Found', {'error': 'not found'})
+                payload = json.dumps(body, ensure_ascii=False).encode()
+                writer.write(b'HTTP/1.1 ' + status + b'\r\nContent-Type: application/json\r\n'
+                             b'Content-Length: ' + str(len(payload)).encode() + b'\r\n\r\n' + payload)
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(args):
+    stub = await OrderStub(latency=args.latency, mode=args.mode).start(args.port)
+    print(f'order stub on {stub.url}')
+    await asyncio.Event().wait()
+
+
+def cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--mode', choices=('ok', 'error', 'hang'), default='ok')
+    asyncio.run(serve(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,151 @@
+"""بازپخش آپدیت‌های ضبط‌شده روی اپلیکیشن واقعی ربات با API جعلی
+
+آپدیت‌ها از فایل recorder (RECORD_UPDATES_PATH در حالت عادی ربات) یا از بار کاری
+مصنوعی benchmarks.workload خوانده می‌شوند و با همه handlerهای ثبت‌شده پردازش
+می‌شوند. زمان‌بندی اصلی آپدیت‌ها با ضریب speedup حفظ می‌شود (۰ یعنی با حداکثر
+سرعت). گزارش: توان پردازش، چندک‌های زمان هر handler و کل آپدیت، حافظه و تعداد
+فراخوانی‌های API. با --max-p99 اگر p99 هر handler از حد بیشتر شود خروجی ناموفق
+است تا در CI قابل استفاده باشد.
+
+اجرا از ریشه مخزن:
+    python -m benchmarks.replay recording.jsonl --speedup 10 --concurrency 16
+    python -m benchmarks.replay --synthetic 5000 --max-p99 50
+"""
+import argparse
+import asyncio
+import collections
+import resource
+import sys
+import time
+import tracemalloc
+
+from telegram import Update
+
+import main
+from benchmarks.fake_api import FakeBotAPI
+from benchmarks.workload import synthetic
+from recorder import read_recording
+
+
+def quantile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))] if values else 0.0
+
+
+def timed(callback, samples):
+    """پوشاندن callback یک handler برای ثبت زمان دقیق هر اجرا"""
+    name = getattr(callback, '__name__', type(callback).__name__)
+
+    async def wrapper(update, context):
+        started = time.perf_counter()
+        try:
+            return await callback(update, context)
+        finally:
+            samples[name].append(time.perf_counter() - started)
+
+    return wrapper
+
+
+def load(args):
+    if args.path:
+        return list(read_recording(args.path))
+    # بار مصنوعی با نرخ ثابت rate در ثانیه
+    return [(index / args.rate, update) for index, update in enumerate(synthetic(args.synthetic, args.chats))]
+
+
+async def replay(args, records):
+    api = FakeBotAPI(latency=args.latency, jitter=args.jitter)
+    application = main.build_application(request=api, concurrency=args.concurrency,
+                                         outbound_limits=args.outbound_limits, inbound_limits=args.inbound_limits)
+    samples = collections.defaultdict(list)
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            handler.callback = timed(handler.callback, samples)
+
+    enqueued, finished = {}, {}
+    process_update = application.process_update
+
+    async def process_and_record(update):
+        try:
+            await process_update(update)
+        finally:
+            finished[update.update_id] = time.perf_counter()
+
+    application.process_update = process_and_record
+    await application.initialize()
+    await application.start()
+
+    started = time.perf_counter()
+    first = records[0][0]
+    for recorded_at, data in records:
+        if args.speedup:
+            delay = started + (recorded_at - first) / args.speedup - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        update = Update.de_json(data, application.bot)
+        enqueued[update.update_id] = time.perf_counter()
+        await application.update_queue.put(update)
+    await application.update_queue.join()
+    elapsed = time.perf_counter() - started
+    await application.stop()
+    await application.shutdown()
+
+    latencies = [finished[update_id] - enqueued[update_id] for update_id in enqueued if update_id in finished]
+    return elapsed, latencies, samples, api
+
+
+def report(args, records, elapsed, latencies, samples, api, rss_before):
+    print(f'updates={len(records)} speedup={args.speedup or "max"} concurrency={args.concurrency} '
+          f'api_latency={args.latency * 1000:.0f}ms+{args.jitter * 1000:.0f}ms')
+    print(f'elapsed={elapsed:.2f}s throughput={len(records) / elapsed:.0f} updates/s')
+    print(f'update latency: p50={quantile(latencies, 0.5) * 1000:.2f}ms p95={quantile(latencies, 0.95) * 1000:.2f}ms '
+          f'p99={quantile(latencies, 0.99) * 1000:.2f}ms')
+    print(f'{"handler":<24}{"count":>8}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}{"max ms":>10}')
+    for name, values in sorted(samples.items()):
+        print(f'{name:<24}{len(values):>8}{quantile(values, 0.5) * 1000:>10.3f}{quantile(values, 0.95) * 1000:>10.3f}'
+              f'{quantile(values, 0.99) * 1000:>10.3f}{max(values) * 1000:>10.3f}')
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f'memory: peak_rss={rss:.1f}MB (+{rss - rss_before:.1f}MB during replay)', end='')
+    if args.tracemalloc:
+        current, peak = tracemalloc.get_traced_memory()
+        print(f' traced_peak={peak / 2 ** 20:.1f}MB', end='')
+    print()
+    methods = collections.Counter(call[0] for call in api.calls)
+    print('api calls: ' + ' '.join(f'{method}={count}' for method, count in methods.most_common()))
+
+
+async def run(args):
+    records = load(args)
+    if not records:
+        sys.exit('no updates to replay')
+    if args.tracemalloc:
+        tracemalloc.start()
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    elapsed, latencies, samples, api = await replay(args, records)
+    report(args, records, elapsed, latencies, samples, api, rss_before)
+
+    if args.max_p99 is not None:
+        slow = [name for name, values in samples.items() if quantile(values, 0.99) * 1000 > args.max_p99]
+        if slow:
+            sys.exit(f'p99 above {args.max_p99}ms: {", ".join(sorted(slow))}')
+
+
+def cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('path', nargs='?', help='فایل ضبط‌شده؛ بدون آن بار مصنوعی ساخته می‌شود')
+    parser.add_argument('--synthetic', type=int, default=5000, help='تعداد آپدیت‌های مصنوعی')
+    parser.add_argument('--chats', type=int, default=100)
+    parser.add_argument('--rate', type=float, default=200.0, help='نرخ بار مصنوعی در ثانیه')
+    parser.add_argument('--speedup', type=float, default=0.0, help='ضریب سرعت بازپخش؛ ۰ یعنی حداکثر سرعت')
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--inbound-limits', action='store_true')
+    parser.add_argument('--outbound-limits', action='store_true')
+    parser.add_argument('--tracemalloc', action='store_true', help='اندازه‌گیری دقیق حافظه (کندتر)')
+    parser.add_argument('--max-p99', type=float, help='حداکثر p99 مجاز هر handler به میلی‌ثانیه')
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    cli()
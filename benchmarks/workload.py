@@ -0,0 +1,95 @@
+"""بار کاری مصنوعی ربات برای بازپخش و تست بار
+
+ترکیبی از /start، دکمه‌های cat_*، دکمه‌های موضوع (q1_<شناسه> و ۱۰٪ با قالب
+قدیمی faq_<عنوان> از پیام‌های قدیمی)، پرسش‌های inline و سوالات
+متنی ساخته‌شده از کلیدواژه‌های واقعی سوالات متداول (با نویسه‌های عربی، نیم‌فاصله
+و ارقام فارسی) به‌همراه چند پیام بی‌ربط. خروجی در قالب فایل ضبط‌شده recorder است، پس با
+benchmarks.replay مثل ترافیک واقعی بازپخش می‌شود.
+
+اجرا از ریشه مخزن:
+    python -m benchmarks.workload /tmp/synthetic.jsonl --updates 10000 --rate 50
+"""
+import argparse
+import json
+import random
+import time
+
+from benchmarks.canned_updates import callback_update, inline_update, message_update
+from callbacks import LEGACY_TOPIC_PREFIX, CallbackRegistry
+from content_store import DEFAULT_CONTENT_PATH, load_content
+
+CATEGORIES = ['cat_products', 'cat_order', 'cat_payment', 'cat_shipping', 'cat_return']
+TEMPLATES = ['{}', '{}؟', 'سلام {} چطوریه', 'ببخشید درباره {} سوال داشتم', '{} رو توضیح میدید؟', 'سلام وقت بخیر، {}']
+UNRELATED = ['سلام', 'ممنون', 'قیمت گوشی سامسونگ A54', 'کی باز میشید', 'اوکی', '😂😂', 'asdf qwer']
+DEFAULT_MIX = {'start': 0.1, 'category': 0.2, 'faq': 0.25, 'text': 0.35, 'inline': 0.05, 'unrelated': 0.05}
+
+
+def _noisy(text, rng):
+    """تنوع نوشتاری کاربران: ی و ک عربی، نیم‌فاصله و ارقام فارسی"""
+    if rng.random() < 0.3:
+        text = text.replace('ی', 'ي').replace('ک', 'ك')
+    if rng.random() < 0.2:
+        text = text.replace(' ', '‌', 1)
+    if rng.random() < 0.2:
+        text += ' ' + ''.join(rng.choice('۰۱۲۳۴۵۶۷۸۹') for _ in range(2))
+    return text
+
+
+def synthetic(n_updates, n_chats=100, mix=None, seed=0, content_path=DEFAULT_CONTENT_PATH):
+    """آپدیت‌های مصنوعی (دیکشنری JSON) به ترتیب"""
+    faq, promotions = load_content(content_path)
+    topics = list(faq)
+    callbacks = CallbackRegistry(faq)
+    keywords = [keyword for item in faq.values() for keyword in item['keywords']]
+    mix = mix or DEFAULT_MIX
+    kinds, weights = list(mix), list(mix.values())
+    rng = random.Random(seed)
+    for update_id in range(1, n_updates + 1):
+        chat_id = rng.randint(1, n_chats)
+        kind = rng.choices(kinds, weights)[0]
+        if kind == 'start':
+            yield message_update(update_id, chat_id, '/start')
+        elif kind == 'category':
+            yield callback_update(update_id, chat_id, rng.choice(CATEGORIES), message_id=rng.randint(1, 5))
+        elif kind == 'faq':
+            topic = rng.choice(topics)
+            data = LEGACY_TOPIC_PREFIX + topic if rng.random() < 0.1 else callbacks.encode(topic)
+            yield callback_update(update_id, chat_id, data, message_id=rng.randint(1, 5))
+        elif kind == 'inline':
+            # پرسش inline نیمه‌تایپ‌شده، مثل آپدیت‌های هر کلید
+            keyword = rng.choice(keywords)
+            yield inline_update(update_id, chat_id, keyword[:rng.randint(1, len(keyword))])
+        elif kind == 'text':
+            question = rng.choice(TEMPLATES).format(rng.choice(keywords))
+            yield message_update(update_id, chat_id, _noisy(question, rng))
+        else:
+            yield message_update(update_id, chat_id, rng.choice(UNRELATED))
+
+
+def write_recording(path, updates, rate, seed=0):
+    """ذخیره آپدیت‌ها در قالب recorder با فاصله‌های پواسون با نرخ rate در ثانیه"""
+    rng = random.Random(seed)
+    now = time.time()
+    count = 0
+    with open(path, 'w', encoding='utf-8') as file:
+        for update in updates:
+            now += rng.expovariate(rate)
+            file.write(json.dumps({'t': now, 'update': update}, ensure_ascii=False) + '\n')
+            count += 1
+    return count
+
+
+def cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('path')
+    parser.add_argument('--updates', type=int, default=10000)
+    parser.add_argument('--chats', type=int, default=100)
+    parser.add_argument('--rate', type=float, default=50.0, help='نرخ میانگین آپدیت در ثانیه')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    count = write_recording(args.path, synthetic(args.updates, args.chats, seed=args.seed), args.rate, args.seed)
+    print(f'{count} updates written to {args.path}')
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,301 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import logging
+import sqlite3
+import threading
+
+from telegram import InlineKeyboardMarkup
+from telegram.error import BadRequest, Forbidden, RetryAfter, TelegramError
+
+from flood_control import BULK, OUTBOUND_PRIORITY
+from metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+BROADCAST_MESSAGES = METRICS.counter('bot_broadcast_messages_total', 'Broadcast deliveries', ['outcome'])
+
+# خطاهایی که یعنی کاربر دیگر قابل دسترسی نیست
+_GONE = ('chat not found', 'user is deactivated', 'bot was blocked', 'bot was kicked')
+
+
+class SubscriberRegistry:
+    """فهرست مشترکین اطلاع‌رسانی و وضعیت ماندگار ارسال‌های همگانی روی SQLite
+
+    مشترکین به ترتیب chat_id صفحه‌به‌صفحه خوانده می‌شوند، پس پیمایش ۲۰۰ هزار
+    مشترک هیچ‌وقت کل فهرست را در حافظه نمی‌آورد. هر ارسال همگانی یک ردیف در
+    جدول broadcasts دارد که مکان نما (آخرین chat_id کامل‌شده) و شمارنده‌ها را
+    نگه می‌دارد تا پس از کرش از همان‌جا ادامه پیدا کند. ارسال‌های خودکار یک کلید
+    یکتا در جدول broadcast_keys می‌گیرند تا هر کدام فقط یک بار (در همه پردازه‌ها و پس
+    از راه‌اندازی مجدد) ساخته شوند.
+    مسیر خالی یعنی پایگاه داده درون‌حافظه‌ای.
+    """
+
+    def __init__(self, path=''):
+        self.path = path or ':memory:'
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        if self.path != ':memory:':
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS subscribers (chat_id INTEGER PRIMARY KEY, subscribed_at REAL NOT NULL)'
+        )
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS broadcasts ('
+            'id INTEGER PRIMARY KEY AUTOINCREMENT, text TEXT NOT NULL, markup TEXT, status TEXT NOT NULL, '
+            'cursor INTEGER NOT NULL DEFAULT 0, total INTEGER NOT NULL, sent INTEGER NOT NULL DEFAULT 0, '
+            'failed INTEGER NOT NULL DEFAULT 0, removed INTEGER NOT NULL DEFAULT 0, '
+            'owner TEXT, heartbeat REAL NOT NULL, created_at REAL NOT NULL)'
+        )
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS broadcast_keys (key TEXT PRIMARY KEY, broadcast_id INTEGER NOT NULL)'
+        )
+        self._conn.commit()
+
+    def add(self, chat_id):
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT OR IGNORE INTO subscribers (chat_id, subscribed_at) VALUES (?, ?)', (chat_id, time.time()))
+
+    def remove(self, chat_ids):
+        """حذف یک یا چند مشترک؛ خروجی تعداد حذف‌شده‌ها"""
+        if isinstance(chat_ids, int):
+            chat_ids = [chat_ids]
+        with self._lock, self._conn:
+            return self._conn.executemany(
+                'DELETE FROM subscribers WHERE chat_id = ?', [(chat_id,) for chat_id in chat_ids]).rowcount
+
+    def __contains__(self, chat_id):
+        with self._lock:
+            return self._conn.execute('SELECT 1 FROM subscribers WHERE chat_id = ?', (chat_id,)).fetchone() is not None
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM subscribers').fetchone()[0]
+
+    def page(self, after, limit):
+        """chat_idهای بعد از after به ترتیب صعودی"""
+        with self._lock:
+            return [row[0] for row in self._conn.execute(
+                'SELECT chat_id FROM subscribers WHERE chat_id > ? ORDER BY chat_id LIMIT ?', (after, limit))]
+
+    def create_job(self, text, owner, markup=None, key=None):
+        """ساخت ارسال جدید؛ اگر ارسالی با همین key قبلا ساخته شده باشد None"""
+        with self._lock, self._conn:
+            total = self._conn.execute('SELECT COUNT(*) FROM subscribers').fetchone()[0]
+            now = time.time()
+            cursor = self._conn.execute(
+                "INSERT INTO broadcasts (text, markup, status, cursor, total, owner, heartbeat, created_at) "
+                "VALUES (?, ?, 'running', ?, ?, ?, ?, ?)", (text, markup, -2 ** 63, total, owner, now, now))
+            if key is not None and not self._conn.execute(
+                    'INSERT OR IGNORE INTO broadcast_keys (key, broadcast_id) VALUES (?, ?)',
+                    (key, cursor.lastrowid)).rowcount:
+                # ارسال تکراری؛ ردیف ساخته‌شده با بازگشت تراکنش حذف می‌شود
+                self._conn.rollback()
+                return None
+            return self._job(cursor.lastrowid)
+
+    def checkpoint(self, job):
+        """ذخیره مکان نما و شمارنده‌ها؛ همزمان مهلت مالکیت تمدید می‌شود"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                'UPDATE broadcasts SET cursor = ?, sent = ?, failed = ?, removed = ?, status = ?, heartbeat = ? '
+                'WHERE id = ?',
+                (job['cursor'], job['sent'], job['failed'], job['removed'], job['status'], time.time(), job['id']))
+
+    def touch(self, job):
+        """تمدید مهلت مالکیت بدون جابه‌جایی مکان نما"""
+        with self._lock, self._conn:
+            self._conn.execute('UPDATE broadcasts SET heartbeat = ? WHERE id = ?', (time.time(), job['id']))
+
+    def release(self, job):
+        """رها کردن ارسال نیمه‌تمام تا پردازه دیگری بلافاصله ادامه‌اش دهد"""
+        with self._lock, self._conn:
+            self._conn.execute('UPDATE broadcasts SET owner = NULL, heartbeat = 0 WHERE id = ?', (job['id'],))
+
+    def claim_stale(self, owner, lease):
+        """گرفتن ارسال‌های نیمه‌تمامی که مالکشان (پردازه‌ای دیگر) بیش از lease ثانیه خبری نداده"""
+        claimed = []
+        now = time.time()
+        with self._lock, self._conn:
+            for (job_id,) in self._conn.execute(
+                    "SELECT id FROM broadcasts WHERE status = 'running' AND heartbeat < ? "
+                    "AND (owner IS NULL OR owner != ?)", (now - lease, owner)).fetchall():
+                updated = self._conn.execute(
+                    "UPDATE broadcasts SET owner = ?, heartbeat = ? "
+                    "WHERE id = ? AND status = 'running' AND heartbeat < ? AND (owner IS NULL OR owner != ?)",
+                    (owner, now, job_id, now - lease, owner))
+                if updated.rowcount:
+                    claimed.append(job_id)
+        return [self._job(job_id) for job_id in claimed]
+
+    def _job(self, job_id):
+        row = self._conn.execute(
+            'SELECT id, text, markup, status, cursor, total, sent, failed, removed FROM broadcasts WHERE id = ?',
+            (job_id,)).fetchone()
+        return dict(zip(('id', 'text', 'markup', 'status', 'cursor', 'total', 'sent', 'failed', 'removed'), row))
+
+
+class RatePacer:
+    """فاصله‌گذاری ارسال‌ها با نرخ ثابت؛ pause همه ارسال‌ها را عقب می‌اندازد"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate
+        self._next = 0.0
+
+    async def wait(self):
+        now = time.monotonic()
+        slot = max(now, self._next)
+        self._next = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    def pause(self, seconds):
+        self._next = max(self._next, time.monotonic() + seconds)
+
+
+class Broadcaster:
+    """ارسال همگانی جریانی به مشترکین با محدودیت نرخ و قابلیت ادامه پس از کرش
+
+    یک تولیدکننده مشترکین را صفحه‌به‌صفحه از SQLite می‌خواند و در صف محدود
+    می‌گذارد؛ workers مصرف‌کننده با فاصله‌گذاری RatePacer ارسال می‌کنند. نرخ
+    پیش‌فرض کمی زیر سقف سراسری تلگرام (۳۰ پیام در ثانیه) است تا برای پاسخ به
+    کاربران جا بماند؛ هر مشترک فقط یک پیام می‌گیرد، پس سقف هر چت رعایت می‌شود.
+    متن با parse_mode داده‌شده (برای متن‌های رندرشده HTML) فرستاده می‌شود.
+    ارسال‌ها با اولویت BULK به ScheduledRequest می‌رسند تا پاسخ کاربران جلوتر بروند.
+    RetryAfter همه ارسال‌ها را به اندازه خواسته‌شده متوقف و همان پیام را دوباره
+    می‌فرستد؛ کاربرانی که ربات را بلاک کرده‌اند از فهرست حذف می‌شوند.
+    پس از تمام شدن هر صفحه مکان نما ذخیره می‌شود، پس پس از کرش حداکثر یک صفحه
+    دوباره ارسال می‌شود.
+    """
+
+    def __init__(self, bot, registry, rate=25.0, workers=8, page_size=500, lease=60.0, max_retries=5,
+                 report_to=None, parse_mode=None):
+        self.bot = bot
+        self.registry = registry
+        self.pacer = RatePacer(rate)
+        self.workers = workers
+        self.page_size = page_size
+        self.lease = lease
+        self.max_retries = max_retries
+        self.report_to = report_to
+        self.parse_mode = parse_mode
+        self.owner = f'{os.getpid()}-{uuid.uuid4().hex[:8]}'
+        # شناسه ارسال ← (وضعیت جاری، task)
+        self.active = {}
+
+    async def start(self, text, reply_markup=None, key=None):
+        """شروع ارسال همگانی جدید؛ خروجی وضعیت ارسال (یا None اگر ارسال با این key قبلا انجام شده)"""
+        markup = reply_markup.to_json() if reply_markup is not None else None
+        job = await asyncio.to_thread(self.registry.create_job, text, self.owner, markup, key)
+        if job is not None:
+            self._spawn(job)
+        return job
+
+    async def resume_forever(self, interval=30.0):
+        """ادامه ارسال‌های نیمه‌تمامی که مالکشان از کار افتاده است"""
+        while True:
+            try:
+                for job in await asyncio.to_thread(self.registry.claim_stale, self.owner, self.lease):
+                    logger.info("ادامه ارسال همگانی %d از chat_id %d", job['id'], job['cursor'])
+                    self._spawn(job)
+            except Exception:
+                logger.exception("بررسی ارسال‌های نیمه‌تمام ناموفق بود")
+            await asyncio.sleep(interval)
+
+    async def stop(self):
+        """توقف ارسال‌های در حال اجرا؛ وضعیتشان برای ادامه ذخیره می‌ماند"""
+        tasks = [task for job, task in self.active.values()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _spawn(self, job):
+        task = asyncio.create_task(self._run(job))
+        self.active[job['id']] = (job, task)
+        task.add_done_callback(lambda _: self.active.pop(job['id'], None))
+
+    async def _run(self, job):
+        send_kwargs = {}
+        if self.parse_mode:
+            send_kwargs['parse_mode'] = self.parse_mode
+        if job['markup']:
+            send_kwargs['reply_markup'] = InlineKeyboardMarkup.de_json(json.loads(job['markup']), self.bot)
+        queue = asyncio.Queue(self.workers * 2)
+        consumers = [asyncio.create_task(self._consume(job, queue, send_kwargs)) for _ in range(self.workers)]
+        try:
+            while True:
+                chat_ids = await asyncio.to_thread(self.registry.page, job['cursor'], self.page_size)
+                if not chat_ids:
+                    break
+                for chat_id in chat_ids:
+                    await queue.put(chat_id)
+                # صبر برای تمام شدن صفحه؛ در توقف‌های طولانی RetryAfter مالکیت تمدید می‌شود
+                page_done = asyncio.ensure_future(queue.join())
+                try:
+                    while not (await asyncio.wait({page_done}, timeout=self.lease / 3))[0]:
+                        await asyncio.to_thread(self.registry.touch, job)
+                finally:
+                    page_done.cancel()
+                job['cursor'] = chat_ids[-1]
+                await asyncio.to_thread(self.registry.checkpoint, job)
+            job['status'] = 'done'
+            await asyncio.to_thread(self.registry.checkpoint, job)
+        except asyncio.CancelledError:
+            await asyncio.to_thread(self.registry.release, job)
+            raise
+        finally:
+            for consumer in consumers:
+                consumer.cancel()
+            await asyncio.gather(*consumers, return_exceptions=True)
+
+        logger.info("ارسال همگانی %d تمام شد: %d موفق، %d ناموفق، %d حذف",
+                    job['id'], job['sent'], job['failed'], job['removed'])
+        if self.report_to:
+            try:
+                await self.bot.send_message(
+                    self.report_to,
+                    f"📣 ارسال همگانی {job['id']} تمام شد\n\n"
+                    f"• ✅ موفق: {job['sent']}\n• ❌ ناموفق: {job['failed']}\n• 🚫 حذف از فهرست: {job['removed']}")
+            except TelegramError:
+                logger.warning("گزارش ارسال همگانی %d به ادمین نرسید", job['id'])
+
+    async def _consume(self, job, queue, send_kwargs):
+        # ارسال‌های همگانی پس از پاسخ به کاربران زمان‌بندی می‌شوند
+        OUTBOUND_PRIORITY.set(BULK)
+        while True:
+            chat_id = await queue.get()
+            try:
+                outcome = await self._deliver(chat_id, job['text'], send_kwargs)
+            except Exception:
+                logger.exception("ارسال به %s با خطای غیرمنتظره متوقف شد", chat_id)
+                outcome = 'failed'
+            finally:
+                queue.task_done()
+            job[outcome] += 1
+            BROADCAST_MESSAGES.inc(outcome)
+
+    async def _deliver(self, chat_id, text, send_kwargs):
+        for _ in range(self.max_retries):
+            await self.pacer.wait()
+            try:
+                await self.bot.send_message(chat_id, text, **send_kwargs)
+                return 'sent'
+            except RetryAfter as exc:
+                self.pacer.pause(_seconds(exc.retry_after))
+            except (Forbidden, BadRequest) as exc:
+                if isinstance(exc, Forbidden) or any(reason in exc.message.lower() for reason in _GONE):
+                    await asyncio.to_thread(self.registry.remove, chat_id)
+                    return 'removed'
+                logger.warning("ارسال به %s رد شد: %s", chat_id, exc.message)
+                return 'failed'
+            except TelegramError as exc:
+                logger.warning("ارسال به %s ناموفق بود: %s", chat_id, exc)
+        return 'failed'
+
+
+def _seconds(value):
+    return value.total_seconds() if hasattr(value, 'total_seconds') else float(value)
@@ -0,0 +1,53 @@
+# قالب نسخه ۱ دکمه موضوع: q1_<شناسه موضوع>؛ قالب بعدی پیشوند تازه می‌گیرد و
+# پیشوندهای قبلی همچنان پذیرفته می‌شوند تا دکمه پیام‌های قدیمی کار کنند
+TOPIC_PREFIX = 'q1_'
+# قالب قدیمی: faq_<عنوان موضوع>
+LEGACY_TOPIC_PREFIX = 'faq_'
+DEFAULT_PARENT = 'main_menu'
+
+# سقف تلگرام برای callback_data
+MAX_CALLBACK_BYTES = 64
+
+
+class CallbackRegistry:
+    """callback_data کوتاه و پایدار برای موضوع‌های سوالات متداول
+
+    هر موضوع در فایل محتوا یک شناسه ثابت (id) و دسته والد (category، نام منوی
+    بازگشت) دارد. callback_data از شناسه ساخته می‌شود، پس تغییر عنوان موضوع
+    دکمه‌های ارسال‌شده را از کار نمی‌اندازد؛ شناسه موضوع حذف‌شده نباید دوباره
+    استفاده شود. callback_data قدیمی faq_<عنوان> هم تا وقتی عنوان وجود دارد
+    پذیرفته می‌شود. هر دو قالب با یک دیکشنری به موضوع می‌رسند.
+    """
+
+    def __init__(self, faq):
+        # موضوع ← callback_data؛ callback_data (هر دو قالب) ← موضوع؛ موضوع ← دسته والد
+        self._data = {}
+        self._topics = {}
+        self._parents = {}
+        for topic, entry in faq.items():
+            data = f"{TOPIC_PREFIX}{entry['id']}"
+            if data in self._topics:
+                raise ValueError(f"شناسه تکراری موضوع در فایل محتوا: {entry['id']}")
+            if len(data.encode()) > MAX_CALLBACK_BYTES:
+                raise ValueError(f"شناسه موضوع بیش از حد طولانی است: {entry['id']}")
+            self._data[topic] = data
+            self._topics[data] = topic
+            self._topics[LEGACY_TOPIC_PREFIX + topic] = topic
+            self._parents[topic] = entry.get('category') or DEFAULT_PARENT
+
+    def encode(self, topic):
+        """callback_data دکمه یک موضوع؛ برای عنوانی که در محتوا نیست همان قالب قدیمی (دکمه بی‌اثر)"""
+        return self._data.get(topic) or LEGACY_TOPIC_PREFIX + topic
+
+    def topic(self, data):
+        """موضوع یک callback_data (قالب فعلی یا قدیمی) یا None"""
+        return self._topics.get(data)
+
+    def canonical(self, data):
+        """callback_data قالب فعلی برای یک callback_data موضوع یا None"""
+        topic = self._topics.get(data)
+        return self._data[topic] if topic is not None else None
+
+    def parent(self, topic):
+        """منوی والد موضوع (برای دکمه بازگشت)"""
+        return self._parents.get(topic, DEFAULT_PARENT)
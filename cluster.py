@@ -0,0 +1,135 @@
+import asyncio
+import logging
+import multiprocessing
+
+from telegram import Update
+from telegram.error import NetworkError, RetryAfter
+
+logger = logging.getLogger(__name__)
+
+
+def chat_key(data):
+    """کلید شاردینگ یک آپدیت خام: شناسه چت، در غیر این صورت شناسه کاربر"""
+    for field in ('message', 'edited_message', 'channel_post', 'edited_channel_post'):
+        if field in data:
+            return data[field]['chat']['id']
+    query = data.get('callback_query')
+    if query:
+        if query.get('message'):
+            return query['message']['chat']['id']
+        return query['from']['id']
+    for field in ('inline_query', 'chosen_inline_result', 'shipping_query', 'pre_checkout_query'):
+        if field in data:
+            return data[field]['from']['id']
+    return data.get('update_id', 0)
+
+
+class ShardedDispatcher:
+    """توزیع آپدیت‌ها بین N پردازه کارگر بر اساس شناسه چت
+
+    آپدیت‌های هر چت همیشه به یک کارگر و به ترتیب ورود می‌رسند؛
+    هر کارگر Application خودش را با application_factory می‌سازد.
+    application_factory باید تابعی سطح ماژول باشد تا در پردازه جدید قابل بارگذاری باشد.
+    """
+
+    def __init__(self, workers, application_factory):
+        self.workers = workers
+        self.application_factory = application_factory
+        self._context = multiprocessing.get_context('spawn')
+        self._queues = []
+        self._processes = []
+
+    def start(self, ready_timeout=60):
+        """راه‌اندازی کارگرها و انتظار تا آماده شدن همه آن‌ها"""
+        ready = self._context.Semaphore(0)
+        for index in range(self.workers):
+            queue = self._context.Queue()
+            process = self._context.Process(
+                target=_worker_main, args=(index, self.application_factory, queue, ready),
+                name=f'bot-worker-{index}', daemon=True
+            )
+            process.start()
+            self._queues.append(queue)
+            self._processes.append(process)
+        for _ in range(self.workers):
+            if not ready.acquire(timeout=ready_timeout):
+                raise RuntimeError("کارگرها در زمان مقرر آماده نشدند")
+        logger.info("%d پردازه کارگر راه‌اندازی شد", self.workers)
+
+    def dispatch(self, data):
+        """ارسال آپدیت خام (دیکشنری JSON) به کارگر مربوط به چت"""
+        self._queues[chat_key(data) % self.workers].put(data)
+
+    def queue_sizes(self):
+        """طول صف هر کارگر (در صورت پشتیبانی سیستم‌عامل)"""
+        try:
+            return [queue.qsize() for queue in self._queues]
+        except NotImplementedError:
+            return []
+
+    def stop(self, timeout=30):
+        """ارسال سیگنال پایان و انتظار برای تخلیه صف‌ها"""
+        for queue in self._queues:
+            queue.put(None)
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        self._queues.clear()
+        self._processes.clear()
+
+
+def _worker_main(index, application_factory, queue, ready):
+    logger.info("کارگر %d شروع به کار کرد", index)
+    asyncio.run(_serve(application_factory(), queue, ready))
+
+
+async def _serve(application, queue, ready):
+    """خواندن آپدیت‌ها از صف پردازه و تحویل آن‌ها به update_queue اپلیکیشن"""
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    await application.start()
+    ready.release()
+
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            data = await loop.run_in_executor(None, queue.get)
+            if data is None:
+                break
+            await application.update_queue.put(Update.de_json(data, application.bot))
+    finally:
+        # stop تا پایان پردازش آپدیت‌های مانده در صف صبر می‌کند
+        await application.stop()
+        if application.post_stop:
+            await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+
+
+async def poll_into(bot, dispatcher, timeout=30):
+    """دریافت آپدیت‌ها با long polling در یک پردازه و توزیع آن‌ها بین کارگرها"""
+    await bot.initialize()
+    await bot.delete_webhook()
+    offset = 0
+    try:
+        while True:
+            try:
+                updates = await bot.get_updates(
+                    offset=offset, timeout=timeout, read_timeout=timeout + 10,
+                    allowed_updates=Update.ALL_TYPES
+                )
+            except RetryAfter as exc:
+                await asyncio.sleep(exc.retry_after)
+                continue
+            except NetworkError as exc:
+                logger.warning("خطای شبکه در دریافت آپدیت‌ها: %s", exc)
+                await asyncio.sleep(1)
+                continue
+            for update in updates:
+                dispatcher.dispatch(update.to_dict())
+                offset = update.update_id + 1
+    finally:
+        await bot.shutdown()
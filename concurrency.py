@@ -0,0 +1,62 @@
+import asyncio
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """پردازش هم‌زمان آپدیت‌ها با حفظ ترتیب در هر چت
+
+    آپدیت‌های یک چت پشت یک قفل FIFO صف می‌شوند، پس ضربه‌های پشت‌سرهم یک کاربر
+    هیچ‌وقت هم‌زمان اجرا نمی‌شوند. محدودیت سراسری max_in_flight فقط پس از گرفتن
+    قفل چت اعمال می‌شود تا کاربری که صف طولانی دارد جای بقیه را اشغال نکند.
+    max_pending سقف کل آپدیت‌های در حال انتظار و اجرا است.
+    """
+
+    def __init__(self, max_in_flight, max_pending=4096):
+        super().__init__(max(max_pending, max_in_flight))
+        self.max_in_flight = max_in_flight
+        self._in_flight = asyncio.BoundedSemaphore(max_in_flight)
+        # کلید چت ← [قفل، تعداد آپدیت‌های منتظر یا در حال اجرا]
+        self._chats = {}
+
+    @property
+    def active_chats(self):
+        """تعداد چت‌هایی که آپدیت در حال پردازش یا انتظار دارند"""
+        return len(self._chats)
+
+    async def do_process_update(self, update, coroutine):
+        key = _chat_key(update)
+        if key is None:
+            async with self._in_flight:
+                await coroutine
+            return
+
+        entry = self._chats.get(key)
+        if entry is None:
+            entry = self._chats[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                async with self._in_flight:
+                    await coroutine
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._chats[key]
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+
+def _chat_key(update):
+    if not isinstance(update, Update):
+        return None
+    if update.effective_chat:
+        return update.effective_chat.id
+    if update.effective_user:
+        return update.effective_user.id
+    return None
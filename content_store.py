@@ -0,0 +1,149 @@
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+
+from callbacks import CallbackRegistry
+from matcher import KeywordMatcher
+from promotions import PromotionSchedule, parse_window
+from retrieval import FAQRetriever
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONTENT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'content.json')
+
+
+def load_content(path):
+    """خواندن و اعتبارسنجی فایل محتوا؛ خروجی (FAQ، پیشنهادات)
+
+    هر پیشنهاد یا متن ساده است یا دیکشنری text با start، end و audience اختیاری
+    (پیشنهاد زمان‌دار)؛ بازه‌ها همین‌جا بررسی می‌شوند تا فایل نامعتبر بارگذاری نشود.
+    """
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+
+    faq = data['faq']
+    promotions = data['promotions']
+    for topic, entry in faq.items():
+        if not isinstance(entry.get('answer'), str) or not isinstance(entry.get('keywords'), list):
+            raise ValueError(f"موضوع نامعتبر در فایل محتوا: {topic}")
+        if not isinstance(entry.get('id'), (int, str)) or not isinstance(entry.get('category', ''), str):
+            raise ValueError(f"شناسه یا دسته موضوع نامعتبر در فایل محتوا: {topic}")
+    for title, entry in promotions.items():
+        if isinstance(entry, dict):
+            if not isinstance(entry.get('text'), str):
+                raise ValueError(f"متن پیشنهاد نامعتبر در فایل محتوا: {title}")
+            parse_window(title, entry)
+        elif not isinstance(entry, str):
+            raise ValueError(f"پیشنهاد نامعتبر در فایل محتوا: {title}")
+    return faq, promotions
+
+
+class ContentSnapshot:
+    """یک نسخه کامل و تغییرناپذیر از محتوا به همراه ایندکس‌ها و کیبوردها
+
+    keyboards کیبوردهای نام‌دار و menus جفت (متن، کیبورد) برای هر callback_data است.
+    callbacks شناسه کوتاه callback_data و منوی والد هر موضوع را نگه می‌دارد.
+    texts (متن‌های نام‌دار)، answers (هر موضوع) و promotion_texts (هر پیشنهاد) تاپل
+    بخش‌های HTML رندرشده‌اند؛ overflow بخش‌های بعدی منوهایی است که در یک پیام جا نمی‌شوند.
+    promotions متن هر پیشنهاد، timed عنوان پیشنهادهای زمان‌دار و schedule ایندکس آن‌هاست؛ باز و بسته
+    شدن بازه‌ها نسخه منتشرشده را تغییر نمی‌دهد و روی copy آن یک نسخه جدید ساخته می‌شود.
+    """
+
+    def __init__(self, faq, promotions, version):
+        self.faq = faq
+        self.promotions = {
+            title: entry['text'] if isinstance(entry, dict) else entry for title, entry in promotions.items()
+        }
+        self.timed = frozenset(title for title, entry in promotions.items() if isinstance(entry, dict))
+        self.schedule = PromotionSchedule([parse_window(title, promotions[title]) for title in promotions
+                                           if title in self.timed])
+        self.version = version
+        self.matcher = KeywordMatcher(faq)
+        self.retriever = FAQRetriever(faq)
+        self.callbacks = CallbackRegistry(faq)
+        self.keyboards = {}
+        self.menus = {}
+        self.texts = {}
+        self.answers = {}
+        self.promotion_texts = {}
+        self.overflow = {}
+
+    def copy(self):
+        """نسخه جدید با همان ایندکس‌ها؛ منوها، متن‌ها و schedule جدا کپی می‌شوند تا قابل تغییر باشند"""
+        clone = object.__new__(ContentSnapshot)
+        clone.__dict__.update(self.__dict__)
+        clone.schedule = self.schedule.copy()
+        clone.menus = dict(self.menus)
+        clone.texts = dict(self.texts)
+        clone.overflow = dict(self.overflow)
+        return clone
+
+
+class ContentStore:
+    """نگهداری محتوای فعلی و بارگذاری مجدد آن هنگام تغییر فایل
+
+    نسخه جدید کامل ساخته می‌شود و سپس با یک انتساب جایگزین نسخه قبلی می‌شود؛
+    بنابراین هر درخواست یا نسخه قدیم را می‌بیند یا نسخه کامل جدید را. انتشار زیر
+    قفل انجام می‌شود تا نسخه‌ای که از روی نسخه قبلی ساخته شده (replace) بارگذاری
+    مجدد هم‌زمان را بازنویسی نکند.
+    """
+
+    def __init__(self, path=DEFAULT_CONTENT_PATH, view_builder=None):
+        self.path = path
+        self.view_builder = view_builder
+        self.current = None
+        self._mtime = None
+        self._lock = threading.Lock()
+        self.reload()
+
+    def changed(self):
+        """آیا فایل از آخرین بارگذاری تغییر کرده است"""
+        return os.stat(self.path).st_mtime_ns != self._mtime
+
+    def reload(self):
+        """ساخت نسخه جدید از فایل و جایگزینی اتمیک آن"""
+        started = time.perf_counter()
+        # زمان تغییر قبل از خواندن ثبت می‌شود تا تغییر هم‌زمان در دور بعد دیده شود
+        mtime = os.stat(self.path).st_mtime_ns
+        faq, promotions = load_content(self.path)
+
+        version = self.current.version + 1 if self.current else 1
+        snapshot = ContentSnapshot(faq, promotions, version)
+        if self.view_builder:
+            self.view_builder(snapshot)
+
+        with self._lock:
+            self.current = snapshot
+        self._mtime = mtime
+        logger.info(
+            "محتوا بارگذاری شد: نسخه %d، %d موضوع، %d پیشنهاد، ایندکس %.1f KiB، %.1f ms",
+            version, len(faq), len(promotions), snapshot.retriever.nbytes / 1024,
+            (time.perf_counter() - started) * 1000
+        )
+        return snapshot
+
+    def replace(self, update):
+        """انتشار نسخه‌ای که update از روی نسخه فعلی می‌سازد
+
+        update نسخه فعلی را می‌گیرد و نسخه جدید (ساخته‌شده با copy) یا None برای
+        بدون تغییر برمی‌گرداند؛ زیر قفل اجرا می‌شود، پس بارگذاری مجدد نمی‌تواند بین
+        خواندن و جایگزینی نسخه فعلی انجام شود. خروجی نسخه فعلی پس از جایگزینی است.
+        """
+        with self._lock:
+            snapshot = update(self.current)
+            if snapshot is not None:
+                self.current = snapshot
+            return self.current
+
+    async def watch(self, interval=5.0):
+        """بررسی دوره‌ای فایل و بارگذاری مجدد در یک thread جداگانه"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if self.changed():
+                    await asyncio.to_thread(self.reload)
+            except Exception:
+                logger.exception("بارگذاری مجدد محتوا ناموفق بود؛ نسخه قبلی حفظ شد")
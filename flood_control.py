@@ -0,0 +1,195 @@
+import json
+import time
+import asyncio
+import itertools
+from collections import OrderedDict
+from contextvars import ContextVar
+
+from telegram.request import BaseRequest
+
+from metrics import METRICS
+
+# اولویت ارسال؛ عدد کمتر زودتر ارسال می‌شود
+INTERACTIVE = 0
+BULK = 1
+OUTBOUND_PRIORITY = ContextVar('outbound_priority', default=INTERACTIVE)
+
+# متدهایی که در سقف ارسال پیام تلگرام حساب می‌شوند
+_LIMITED = ('send', 'edit', 'copyMessage', 'forwardMessage')
+
+OUTBOUND_WAIT = METRICS.histogram('bot_outbound_wait_seconds', 'Time spent waiting for send tokens', ['priority'])
+OUTBOUND_RETRIES = METRICS.counter('bot_outbound_retries_total', 'Sends re-queued after 429', ['priority'])
+
+
+class TokenBucket:
+    """سطل توکن با نرخ rate در ثانیه و ظرفیت capacity؛ توکن منفی یعنی جریمه RetryAfter"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now):
+        """ثانیه‌های باقی‌مانده تا در دسترس بودن یک توکن"""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now):
+        self._refill(now)
+        self.tokens -= 1
+
+    def pause(self, seconds, now):
+        self._refill(now)
+        self.tokens = min(self.tokens, 0) - seconds * self.rate
+
+
+class ScheduledRequest(BaseRequest):
+    """لایه HTTP ربات با زمان‌بندی ارسال زیر سقف‌های تلگرام
+
+    هر ارسال پیام (send*/edit*/...) پیش از رفتن به Bot API باید یک توکن از سطل
+    سراسری و یک توکن از سطل همان چت بگیرد. درخواست‌های منتظر بر اساس
+    (اولویت، ترتیب ورود) مرتب می‌شوند، پس پاسخ به کاربران همیشه پیش از ارسال‌های
+    همگانی (OUTBOUND_PRIORITY=BULK) می‌رود و چتی که سطلش خالی است جلوی بقیه را
+    نمی‌گیرد. پاسخ 429 به‌جای خطا، چت را به اندازه retry_after متوقف و همان
+    درخواست را با جایگاه قبلی‌اش دوباره در صف می‌گذارد. حداکثر max_chats سطل چت
+    (LRU) نگه داشته می‌شود.
+    متدهای دیگر (getUpdates، answerCallbackQuery و ...) بدون انتظار ارسال می‌شوند.
+    """
+
+    def __init__(self, inner, global_rate=30.0, chat_rate=1.0, group_rate=20 / 60, burst=3, max_retries=3,
+                 max_chats=10000):
+        self.inner = inner
+        self.global_bucket = TokenBucket(global_rate, max(1.0, global_rate / 10))
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self.max_chats = max_chats
+        # سطل هر چت به ترتیب آخرین استفاده
+        self._chats = OrderedDict()
+        # درخواست‌های منتظر: [اولویت، ترتیب، chat_id، future]
+        self._waiting = []
+        self._sequence = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._task = None
+        METRICS.gauge('bot_outbound_queue_depth', 'Sends waiting for tokens', lambda: len(self._waiting))
+
+    @property
+    def read_timeout(self):
+        return self.inner.read_timeout
+
+    @property
+    def queue_depth(self):
+        return len(self._waiting)
+
+    async def initialize(self):
+        await self.inner.initialize()
+
+    async def shutdown(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.inner.shutdown()
+
+    async def do_request(self, url, method, request_data=None, read_timeout=BaseRequest.DEFAULT_NONE,
+                         write_timeout=BaseRequest.DEFAULT_NONE, connect_timeout=BaseRequest.DEFAULT_NONE,
+                         pool_timeout=BaseRequest.DEFAULT_NONE):
+        endpoint = url.rsplit('/', 1)[-1]
+        chat_id = request_data.parameters.get('chat_id') if request_data else None
+        if chat_id is None or not endpoint.startswith(_LIMITED):
+            return await self.inner.do_request(
+                url, method, request_data=request_data, read_timeout=read_timeout,
+                write_timeout=write_timeout, connect_timeout=connect_timeout, pool_timeout=pool_timeout
+            )
+
+        priority = OUTBOUND_PRIORITY.get()
+        sequence = next(self._sequence)
+        for attempt in range(self.max_retries + 1):
+            await self._acquire(priority, sequence, chat_id)
+            code, payload = await self.inner.do_request(
+                url, method, request_data=request_data, read_timeout=read_timeout,
+                write_timeout=write_timeout, connect_timeout=connect_timeout, pool_timeout=pool_timeout
+            )
+            if code != 429 or attempt == self.max_retries:
+                return code, payload
+            # توقف همین چت و کم کردن سرعت سراسری، سپس ارسال دوباره با همان جایگاه صف
+            now = time.monotonic()
+            self._bucket(chat_id).pause(_retry_after(payload), now)
+            self.global_bucket.pause(0, now)
+            OUTBOUND_RETRIES.inc(_label(priority))
+        return code, payload
+
+    async def _acquire(self, priority, sequence, chat_id):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._schedule())
+        future = asyncio.get_running_loop().create_future()
+        self._waiting.append([priority, sequence, chat_id, future])
+        self._wakeup.set()
+        started = time.perf_counter()
+        await future
+        OUTBOUND_WAIT.observe(time.perf_counter() - started, _label(priority))
+
+    def _bucket(self, chat_id):
+        bucket = self._chats.get(chat_id)
+        if bucket is not None:
+            self._chats.move_to_end(chat_id)
+            return bucket
+        # حذف کم‌استفاده‌ترین سطل‌ها تا حافظه با سیل شناسه‌های چت متفاوت رشد نکند؛ این سطل‌ها
+        # معمولا پرند (هم‌ارز سطل تازه) و در بدترین حالت آن چت یک burst اضافه می‌گیرد
+        while len(self._chats) >= self.max_chats:
+            self._chats.popitem(last=False)
+        group = isinstance(chat_id, str) or chat_id < 0
+        bucket = self._chats[chat_id] = TokenBucket(self.group_rate if group else self.chat_rate, self.burst)
+        return bucket
+
+    async def _schedule(self):
+        while True:
+            self._wakeup.clear()
+            if not self._waiting:
+                await self._wakeup.wait()
+                continue
+
+            now = time.monotonic()
+            delay = self.global_bucket.delay(now)
+            chosen = None
+            if delay <= 0:
+                delay = float('inf')
+                self._waiting.sort(key=lambda entry: (entry[0], entry[1]))
+                for entry in self._waiting:
+                    if entry[3].done():
+                        continue
+                    chat_delay = self._bucket(entry[2]).delay(now)
+                    if chat_delay <= 0:
+                        chosen = entry
+                        break
+                    delay = min(delay, chat_delay)
+                self._waiting = [entry for entry in self._waiting if not entry[3].done() and entry is not chosen]
+
+            if chosen is not None:
+                self.global_bucket.take(now)
+                self._bucket(chosen[2]).take(now)
+                chosen[3].set_result(None)
+                continue
+
+            # انتظار تا آزاد شدن توکن یا رسیدن درخواست تازه
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), delay if delay != float('inf') else None)
+            except asyncio.TimeoutError:
+                pass
+
+
+def _retry_after(payload):
+    try:
+        return float(json.loads(payload)['parameters']['retry_after'])
+    except (ValueError, KeyError, TypeError):
+        return 1.0
+
+
+def _label(priority):
+    return 'interactive' if priority == INTERACTIVE else 'bulk'
@@ -0,0 +1,327 @@
+import time
+import asyncio
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from telegram.error import Forbidden, RetryAfter, TelegramError
+
+from metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+HANDOFF_TICKETS = METRICS.counter('bot_handoff_tickets_total', 'Support tickets', ['event'])
+HANDOFF_MESSAGES = METRICS.counter('bot_handoff_messages_total', 'Support conversation messages', ['direction', 'outcome'])
+
+# نوع پیام‌هایی که کپشن می‌پذیرند و سقف طول کپشن تلگرام
+_CAPTIONED = ('photo', 'video', 'document', 'audio', 'voice', 'animation')
+_CAPTION_LIMIT = 1024
+
+_TICKET_FIELDS = ('id', 'user_id', 'chat_id', 'name', 'operator_id', 'status', 'created_at')
+
+
+class TicketStore:
+    """ذخیره ماندگار تیکت‌های پشتیبانی و نگاشت پیام‌های اپراتور به تیکت روی SQLite
+
+    هر پیامی که برای اپراتور فرستاده می‌شود یک ردیف (چت اپراتور، message_id) ←
+    تیکت در جدول ticket_messages دارد؛ کلید اصلی همین جفت است، پس پیدا کردن
+    تیکت پاسخ اپراتور بدون پیمایش تاریخچه است. هر کاربر حداکثر یک تیکت باز دارد
+    (ایندکس یکتای جزئی) و نگاشت پیام‌های تیکت بسته‌شده حذف می‌شود تا جدول با
+    زمان رشد نکند. مسیر خالی یعنی پایگاه داده درون‌حافظه‌ای.
+    """
+
+    def __init__(self, path=''):
+        self.path = path or ':memory:'
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        if self.path != ':memory:':
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS tickets ('
+            'id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL, chat_id INTEGER NOT NULL, '
+            'name TEXT NOT NULL, operator_id INTEGER NOT NULL, status TEXT NOT NULL, '
+            'created_at REAL NOT NULL, closed_at REAL)'
+        )
+        self._conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS tickets_open_user ON tickets (user_id) WHERE status = 'open'")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS tickets_open_operator ON tickets (operator_id) WHERE status = 'open'")
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS ticket_messages ('
+            'chat_id INTEGER NOT NULL, message_id INTEGER NOT NULL, ticket_id INTEGER NOT NULL, '
+            'PRIMARY KEY (chat_id, message_id)) WITHOUT ROWID'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS ticket_messages_ticket ON ticket_messages (ticket_id)')
+        self._conn.commit()
+
+    def open(self, user_id, chat_id, name, operators, max_per_operator):
+        """باز کردن تیکت برای کاربر و سپردن آن به کم‌کارترین اپراتور
+
+        خروجی (تیکت، تازه‌ساخته‌شده)؛ اگر کاربر تیکت باز داشته باشد همان برمی‌گردد.
+        اگر همه اپراتورها max_per_operator تیکت باز داشته باشند خروجی (None, False) است.
+        """
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                f"SELECT {', '.join(_TICKET_FIELDS)} FROM tickets WHERE user_id = ? AND status = 'open'",
+                (user_id,)).fetchone()
+            if row:
+                return dict(zip(_TICKET_FIELDS, row)), False
+            load = dict(self._conn.execute(
+                "SELECT operator_id, COUNT(*) FROM tickets WHERE status = 'open' GROUP BY operator_id"))
+            # ترتیب operators حالت تساوی را می‌شکند
+            operator_id = min(operators, key=lambda operator: load.get(operator, 0))
+            if load.get(operator_id, 0) >= max_per_operator:
+                return None, False
+            now = time.time()
+            cursor = self._conn.execute(
+                "INSERT INTO tickets (user_id, chat_id, name, operator_id, status, created_at) "
+                "VALUES (?, ?, ?, ?, 'open', ?)", (user_id, chat_id, name, operator_id, now))
+            return dict(zip(_TICKET_FIELDS, (cursor.lastrowid, user_id, chat_id, name, operator_id, 'open', now))), True
+
+    def get(self, ticket_id):
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(_TICKET_FIELDS)} FROM tickets WHERE id = ?", (ticket_id,)).fetchone()
+        return dict(zip(_TICKET_FIELDS, row)) if row else None
+
+    def open_tickets(self, operator_id=None):
+        """تیکت‌های باز (همه یا یک اپراتور) به ترتیب زمان باز شدن"""
+        query = f"SELECT {', '.join(_TICKET_FIELDS)} FROM tickets WHERE status = 'open'"
+        params = ()
+        if operator_id is not None:
+            query += ' AND operator_id = ?'
+            params = (operator_id,)
+        with self._lock:
+            return [dict(zip(_TICKET_FIELDS, row)) for row in self._conn.execute(query + ' ORDER BY id', params)]
+
+    def link(self, chat_id, message_id, ticket_id):
+        """ثبت پیامی که در چت اپراتور متعلق به تیکت است"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO ticket_messages (chat_id, message_id, ticket_id) VALUES (?, ?, ?)',
+                (chat_id, message_id, ticket_id))
+
+    def ticket_of(self, chat_id, message_id):
+        """تیکت یک پیام چت اپراتور یا None"""
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join('tickets.' + field for field in _TICKET_FIELDS)} FROM ticket_messages "
+                'JOIN tickets ON tickets.id = ticket_messages.ticket_id '
+                'WHERE ticket_messages.chat_id = ? AND ticket_messages.message_id = ?',
+                (chat_id, message_id)).fetchone()
+        return dict(zip(_TICKET_FIELDS, row)) if row else None
+
+    def close(self, ticket_id):
+        """بستن تیکت؛ خروجی False اگر از قبل بسته بوده"""
+        with self._lock, self._conn:
+            closed = self._conn.execute(
+                "UPDATE tickets SET status = 'closed', closed_at = ? WHERE id = ? AND status = 'open'",
+                (time.time(), ticket_id)).rowcount
+            self._conn.execute('DELETE FROM ticket_messages WHERE ticket_id = ?', (ticket_id,))
+        return bool(closed)
+
+
+class HandoffDesk:
+    """گفتگوی کاربر با اپراتور انسانی از طریق ربات
+
+    کاربر تیکت باز می‌کند و به اپراتوری که کمترین تیکت باز را دارد سپرده می‌شود؛
+    پیام‌های بعدی کاربر با سرتیتر شماره تیکت برای اپراتور فرستاده می‌شوند (عکس، فایل
+    و صدا با copy_message) و اپراتور با reply روی همان پیام جواب می‌دهد
+    (copy_message به کاربر، پس عکس و فایل هم می‌رسد).
+
+    تلگرام به هر چت حدود یک پیام در ثانیه می‌فرستد، پس پیام‌های هر اپراتور از یک
+    صف محدود و یک worker می‌گذرند: کاربر بلافاصله جواب می‌گیرد و اگر صف پر باشد
+    پیامش پذیرفته نمی‌شود (باید کمی بعد دوباره بفرستد). تعداد تیکت باز هر اپراتور هم
+    سقف max_per_operator دارد.
+
+    تیکت باز هر کاربر و (چت اپراتور، message_id) ← تیکت در حافظه نگه داشته
+    می‌شوند و پیدا کردن هر دو O(1) است؛ دومی LRU است و در صورت نبودن از
+    TicketStore خوانده می‌شود (مثلا پس از ری‌استارت یا در حالت چند کارگری که
+    پیام اپراتور به پردازه دیگری رسیده است). تیکتی که پردازه دیگری بسته باشد
+    هنگام ارسال پیام بعدی کاربر تشخیص داده می‌شود.
+    """
+
+    def __init__(self, bot, store, operators, max_per_operator=50, queue_size=200, cache_size=10000,
+                 max_retries=3):
+        self.bot = bot
+        self.store = store
+        self.operators = list(operators)
+        self.max_per_operator = max_per_operator
+        self.cache_size = cache_size
+        self.max_retries = max_retries
+        self.queues = {operator: asyncio.Queue(queue_size) for operator in self.operators}
+        # کاربر ← تیکت باز
+        self._by_user = {}
+        # (چت اپراتور، message_id) ← شناسه تیکت
+        self._by_message = OrderedDict()
+        self._workers = []
+
+    async def start(self):
+        """بارگذاری تیکت‌های باز و شروع ارسال صف اپراتورها"""
+        for ticket in await asyncio.to_thread(self.store.open_tickets):
+            self._by_user[ticket['user_id']] = ticket
+        self._workers = [asyncio.create_task(self._deliver_forever(operator)) for operator in self.operators]
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def __len__(self):
+        return len(self._by_user)
+
+    def ticket_for(self, user_id):
+        """تیکت باز کاربر یا None"""
+        return self._by_user.get(user_id)
+
+    def queue_depth(self):
+        return sum(queue.qsize() for queue in self.queues.values())
+
+    async def open(self, user):
+        """باز کردن تیکت برای کاربر؛ خروجی (تیکت، تازه‌ساخته‌شده) یا (None, False) وقتی اپراتورها پرند"""
+        name = user.full_name + (f' (@{user.username})' if user.username else '')
+        ticket, created = await asyncio.to_thread(
+            self.store.open, user.id, user.id, name, self.operators, self.max_per_operator)
+        if ticket is None:
+            HANDOFF_TICKETS.inc('rejected')
+            return None, False
+        self._by_user[user.id] = ticket
+        if created:
+            HANDOFF_TICKETS.inc('opened')
+            self._enqueue(ticket, f"🎫 تیکت جدید #{ticket['id']}\n👤 {name} ({user.id})\n\n"
+                                  f"برای پاسخ روی پیام‌های این تیکت reply کنید؛ /close برای بستن.")
+        return ticket, created
+
+    def submit(self, ticket, text):
+        """قرار دادن پیام کاربر در صف اپراتور؛ False یعنی صف پر است"""
+        accepted = self._enqueue(ticket, f"🎫 #{ticket['id']} | {ticket['name']}:\n\n{text}")
+        HANDOFF_MESSAGES.inc('to_operator', 'queued' if accepted else 'rejected')
+        return accepted
+
+    def submit_copy(self, ticket, message):
+        """قرار دادن پیام غیرمتنی کاربر (عکس، فایل، صدا، ...) در صف اپراتور؛ False یعنی صف پر است
+
+        پیام با copy_message به اپراتور می‌رسد؛ سرتیتر تیکت اگر پیام کپشن بپذیرد
+        جلوی کپشن کاربر و در غیر این صورت (استیکر، موقعیت، ...) در پیامی جداگانه
+        پیش از آن فرستاده می‌شود.
+        """
+        header = f"🎫 #{ticket['id']} | {ticket['name']}"
+        captioned = any(getattr(message, kind) for kind in _CAPTIONED)
+        if captioned and message.caption:
+            header = f"{header}:\n\n{message.caption}"[:_CAPTION_LIMIT]
+        accepted = self._enqueue(ticket, header, source=(message.chat_id, message.message_id, captioned))
+        HANDOFF_MESSAGES.inc('to_operator', 'queued' if accepted else 'rejected')
+        return accepted
+
+    async def ticket_of(self, chat_id, message_id):
+        """تیکت پیامی در چت اپراتور (پیام reply‌شده) یا None"""
+        key = (chat_id, message_id)
+        ticket_id = self._by_message.get(key)
+        if ticket_id is None:
+            ticket = await asyncio.to_thread(self.store.ticket_of, chat_id, message_id)
+            if ticket is not None:
+                self._remember(key, ticket['id'])
+            return ticket
+        self._by_message.move_to_end(key)
+        # وضعیت از TicketStore خوانده می‌شود چون ممکن است پردازه دیگری تیکت را بسته باشد
+        return await asyncio.to_thread(self.store.get, ticket_id)
+
+    async def reply(self, ticket, message):
+        """رساندن پاسخ اپراتور به کاربر؛ False اگر کاربر در دسترس نباشد"""
+        try:
+            await self.bot.copy_message(ticket['chat_id'], from_chat_id=message.chat_id, message_id=message.message_id)
+        except Forbidden:
+            HANDOFF_MESSAGES.inc('to_user', 'failed')
+            await self.close(ticket, notify_user=False)
+            return False
+        HANDOFF_MESSAGES.inc('to_user', 'sent')
+        # reply روی پاسخ خود اپراتور هم به همین تیکت می‌رسد
+        self._remember((message.chat_id, message.message_id), ticket['id'])
+        await asyncio.to_thread(self.store.link, message.chat_id, message.message_id, ticket['id'])
+        return True
+
+    async def close(self, ticket, notify_user=True):
+        """بستن تیکت و خبر دادن به کاربر و اپراتور؛ False اگر از قبل بسته بوده"""
+        self._by_user.pop(ticket['user_id'], None)
+        if not await asyncio.to_thread(self.store.close, ticket['id']):
+            return False
+        HANDOFF_TICKETS.inc('closed')
+        if notify_user:
+            try:
+                await self.bot.send_message(
+                    ticket['chat_id'], "✅ گفتگو با پشتیبانی بسته شد. برای سوال جدید دوباره /support را بزنید.")
+            except TelegramError:
+                logger.warning("خبر بسته شدن تیکت %d به کاربر نرسید", ticket['id'])
+        self._enqueue(ticket, f"✅ تیکت #{ticket['id']} ({ticket['name']}) بسته شد.", link=False)
+        return True
+
+    def _enqueue(self, ticket, text, link=True, source=None):
+        # اگر اپراتور از فهرست حذف شده باشد تیکت‌هایش به اولین اپراتور می‌رسند
+        queue = self.queues.get(ticket['operator_id']) or self.queues[self.operators[0]]
+        try:
+            queue.put_nowait((ticket, text, link, source))
+        except asyncio.QueueFull:
+            return False
+        return True
+
+    def _remember(self, key, ticket_id):
+        self._by_message[key] = ticket_id
+        if len(self._by_message) > self.cache_size:
+            self._by_message.popitem(last=False)
+
+    async def _deliver_forever(self, operator):
+        queue = self.queues[operator]
+        while True:
+            ticket, text, link, source = await queue.get()
+            try:
+                await self._deliver(operator, ticket, text, link, source)
+            except Exception:
+                logger.exception("ارسال پیام تیکت %d به اپراتور %s ناموفق بود", ticket['id'], operator)
+            finally:
+                queue.task_done()
+
+    async def _deliver(self, operator, ticket, text, link, source=None):
+        if link:
+            current = await asyncio.to_thread(self.store.get, ticket['id'])
+            if current is None or current['status'] != 'open':
+                # تیکت در پردازه دیگری بسته شده است
+                self._by_user.pop(ticket['user_id'], None)
+                HANDOFF_MESSAGES.inc('to_operator', 'closed')
+                try:
+                    await self.bot.send_message(
+                        ticket['chat_id'], "❗️ این گفتگو بسته شده و پیام شما به اپراتور نرسید. "
+                                           "برای گفتگوی جدید /support را بزنید.")
+                except TelegramError:
+                    pass
+                return
+        sends = []
+        if source is None or not source[2]:
+            sends.append((self.bot.send_message, {'chat_id': operator, 'text': text}))
+        if source is not None:
+            chat_id, message_id, captioned = source
+            sends.append((self.bot.copy_message, {'chat_id': operator, 'from_chat_id': chat_id, 'message_id': message_id,
+                                                  'caption': text if captioned else None}))
+        for method, kwargs in sends:
+            sent = await self._send(method, kwargs)
+            if sent is None:
+                HANDOFF_MESSAGES.inc('to_operator', 'failed')
+                return
+            if link:
+                # reply روی سرتیتر یا روی خود پیام کپی‌شده به همین تیکت می‌رسد
+                self._remember((operator, sent.message_id), ticket['id'])
+                await asyncio.to_thread(self.store.link, operator, sent.message_id, ticket['id'])
+        HANDOFF_MESSAGES.inc('to_operator', 'sent')
+
+    async def _send(self, method, kwargs):
+        """فراخوانی API با رعایت RetryAfter؛ None اگر پس از max_retries تلاش نرسید"""
+        for _ in range(self.max_retries):
+            try:
+                return await method(**kwargs)
+            except RetryAfter as exc:
+                await asyncio.sleep(_seconds(exc.retry_after))
+        return None
+
+
+def _seconds(value):
+    return value.total_seconds() if hasattr(value, 'total_seconds') else float(value)
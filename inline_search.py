@@ -0,0 +1,75 @@
+from collections import OrderedDict
+
+from telegram import InlineQueryResultArticle, InputTextMessageContent
+
+from metrics import METRICS
+from normalizer import normalize_text
+from rendering import PARSE_MODE, plain
+
+INLINE_QUERIES = METRICS.counter('bot_inline_queries_total', 'Inline queries answered', ['cache'])
+
+# تلگرام حداکثر ۵۰ نتیجه در هر پاسخ inline می‌پذیرد
+MAX_RESULTS = 50
+
+
+class InlineFAQSearch:
+    """جستجوی inline سوالات متداول با نتایج از پیش ساخته‌شده
+
+    برای هر موضوع یک InlineQueryResultArticle هنگام ساخت نسخه محتوا ساخته
+    می‌شود. هر پرسش یک بار با KeywordMatcher و FAQRetriever همان نسخه رتبه‌بندی
+    و فهرست موضوع‌هایش در یک LRU نگه داشته می‌شود؛ صفحه‌های بعدی (next_offset) و
+    تکرار همان پرسش فقط یک برش از همین فهرست‌اند.
+    """
+
+    def __init__(self, content, page_size=20, cache_size=4096, min_score=0.1):
+        self.content = content
+        self.page_size = min(page_size, MAX_RESULTS)
+        self.cache_size = cache_size
+        self.min_score = min_score
+        self.articles = {}
+        for index, (topic, entry) in enumerate(content.faq.items()):
+            self.articles[topic] = InlineQueryResultArticle(
+                id=str(index),
+                title=topic,
+                description=plain(entry['answer']).split('\n', 1)[0][:100],
+                # پاسخ رندرشده build_views؛ فقط بخش اول در یک پیام inline جا می‌شود
+                input_message_content=InputTextMessageContent(content.answers[topic][0], parse_mode=PARSE_MODE),
+            )
+        self._all = list(self.articles.values())
+        self._cache = OrderedDict()
+
+    def search(self, query):
+        """فهرست نتایج مرتب برای یک پرسش؛ پرسش خالی همه موضوع‌ها را برمی‌گرداند"""
+        key = normalize_text(query)
+        if not key:
+            return self._all
+        results = self._cache.get(key)
+        if results is not None:
+            self._cache.move_to_end(key)
+            INLINE_QUERIES.inc('hit')
+            return results
+        INLINE_QUERIES.inc('miss')
+
+        # اول موضوع‌هایی که کلیدواژه کاملشان در پرسش آمده، سپس بازیابی رتبه‌بندی‌شده
+        # (n-gramهای حرفی، پس کلمه نیمه‌تایپ‌شده هم پیدا می‌شود)
+        topics = []
+        topic_names = self.content.matcher.topics
+        for _, length, topic_index in sorted(self.content.matcher.find_all(key), key=lambda m: -m[1]):
+            if topic_names[topic_index] not in topics:
+                topics.append(topic_names[topic_index])
+        for topic, score in self.content.retriever.search(key, k=MAX_RESULTS):
+            if score >= self.min_score and topic not in topics:
+                topics.append(topic)
+        results = [self.articles[topic] for topic in topics[:MAX_RESULTS]]
+
+        self._cache[key] = results
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return results
+
+    def page(self, query, offset=''):
+        """(نتایج صفحه، next_offset)؛ next_offset خالی یعنی صفحه آخر"""
+        start = int(offset) if offset.isdigit() else 0
+        results = self.search(query)
+        end = start + self.page_size
+        return results[start:end], str(end) if end < len(results) else ''
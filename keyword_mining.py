@@ -0,0 +1,340 @@
+import json
+import math
+import time
+import zlib
+import argparse
+from collections import Counter
+
+import numpy as np
+
+from content_store import DEFAULT_CONTENT_PATH, load_content
+from matcher import KeywordMatcher
+from miss_log import log_files, read_misses
+from normalizer import normalize_text
+from retrieval import FAQRetriever, _features
+
+# کلمه‌های پرتکرار گفتگو که هیچ‌وقت کلیدواژه خوبی نیستند
+STOPWORDS = frozenset(normalize_text(word) for word in (
+    'سلام ببخشید لطفا ممنون مرسی من شما ما این اون آن که را رو با به از در برای تا یا و هم هست است نیست بود '
+    'میشه می شه چطور چطوری چی چه چرا کی کجا چند آیا یه یک دارم داره دارید میخواستم میخوام بدونم بگید بگین '
+    'کنید کنم کن باید خیلی الان وقت بخیر روز اگه اگر ولی یعنی درباره سوال داشتم چطوریه توضیح بدید میدید '
+    'راهنمایی'
+).split())
+
+
+class NgramVectorizer:
+    """بردار چگال n-gramهای حرفی با hashing علامت‌دار
+
+    هر ویژگی (کلمه و n-gramهای حرفی، مثل FAQRetriever) با crc32 به یکی از dim
+    خانه با علامت ± نگاشته می‌شود؛ ضرب داخلی بردارهای نرمال‌شده تقریب شباهت
+    کسینوسی n-gramهاست. نگاشت هر ویژگی یک بار محاسبه و نگه داشته می‌شود.
+    """
+
+    def __init__(self, dim=256, ngram=3):
+        self.dim = dim
+        self.ngram = ngram
+        # ویژگی ← خانه × ۲ + بیت علامت
+        self._slots = {}
+
+    def _slot(self, feature):
+        digest = zlib.crc32(feature.encode())
+        slot = self._slots[feature] = (digest % self.dim) * 2 + (digest >> 31)
+        return slot
+
+    def transform(self, texts, chunk_size=50000):
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        slots = self._slots
+        for start in range(0, len(texts), chunk_size):
+            chunk = texts[start:start + chunk_size]
+            flat, lengths = [], []
+            for text in chunk:
+                ids = [slots[f] if f in slots else self._slot(f) for f in _features(text, self.ngram)]
+                flat.extend(ids)
+                lengths.append(len(ids))
+            flat = np.fromiter(flat, dtype=np.int64, count=len(flat))
+            rows = np.repeat(np.arange(len(chunk)), lengths)
+            signs = 1.0 - 2.0 * (flat & 1)
+            block = np.bincount(rows * self.dim + (flat >> 1), weights=signs, minlength=len(chunk) * self.dim)
+            matrix[start:start + len(chunk)] = block.reshape(len(chunk), self.dim)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix /= np.maximum(norms, 1e-9)
+        return matrix
+
+
+def _assign(vectors, centroids, chunk_size=100000):
+    """نزدیک‌ترین مرکز (بیشترین شباهت کسینوسی) برای هر بردار"""
+    labels = np.empty(len(vectors), dtype=np.int64)
+    similarity = np.empty(len(vectors), dtype=np.float32)
+    for start in range(0, len(vectors), chunk_size):
+        scores = vectors[start:start + chunk_size] @ centroids.T
+        labels[start:start + len(scores)] = scores.argmax(axis=1)
+        similarity[start:start + len(scores)] = scores.max(axis=1)
+    return labels, similarity
+
+
+def spherical_kmeans(vectors, weights, centroids, iterations=10, chunk_size=100000):
+    """k-means کسینوسی وزن‌دار؛ مرکز خوشه‌های خالی تغییر نمی‌کند"""
+    centroids = centroids.copy()
+    k = len(centroids)
+    for _ in range(iterations):
+        sums = np.zeros_like(centroids)
+        for start in range(0, len(vectors), chunk_size):
+            block = vectors[start:start + chunk_size]
+            labels = (block @ centroids.T).argmax(axis=1)
+            onehot = np.zeros((len(block), k), dtype=np.float32)
+            onehot[np.arange(len(block)), labels] = weights[start:start + len(block)]
+            sums += onehot.T @ block
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        filled = norms[:, 0] > 0
+        centroids[filled] = sums[filled] / norms[filled]
+    return centroids
+
+
+def _farthest_seeds(vectors, weights, centroids, count):
+    """مرکز اولیه خوشه‌های جدید: پرتکرارترین سوال‌هایی که از مراکز فعلی دورند"""
+    seeds = []
+    _, best = _assign(vectors, centroids)
+    for _ in range(count):
+        score = weights * (1.0 - best)
+        index = int(score.argmax())
+        if score[index] <= 0:
+            break
+        seeds.append(vectors[index])
+        best = np.maximum(best, vectors @ vectors[index])
+    return np.array(seeds, dtype=np.float32).reshape(-1, vectors.shape[1])
+
+
+def _content(text):
+    """متن بدون کلمه‌های گفتگو؛ شباهت سوال‌ها به قالب جمله (سلام، سوال داشتم) وابسته نمی‌ماند"""
+    return ' '.join(word for word in text.split() if word not in STOPWORDS)
+
+
+def _terms(text):
+    """کلمه‌ها و جفت‌کلمه‌های نامزد کلیدواژه در یک متن"""
+    words = text.split()
+    terms = {word for word in words if len(word) > 2 and word not in STOPWORDS and not word.isdigit()}
+    for first, second in zip(words, words[1:]):
+        if first not in STOPWORDS and second not in STOPWORDS and not (first.isdigit() or second.isdigit()):
+            terms.add(f'{first} {second}')
+    return terms
+
+
+def load_misses(paths):
+    """شمارش سوالات بی‌پاسخ یکتا (یکسان‌سازی‌شده)؛ خروجی (متن‌ها، تعدادها)"""
+    counts = Counter()
+    for record in read_misses(paths):
+        text = normalize_text(record.get('text', ''))
+        if text:
+            counts[text] += 1
+    texts = list(counts)
+    return texts, np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+
+
+def _idf_weight(vectors, *others):
+    """وزن IDF هر خانه روی خود سوال‌ها؛ n-gramهای پرتکرار در همه سوال‌ها کم‌اثر می‌شوند"""
+    df = np.count_nonzero(vectors, axis=0)
+    idf = (np.log((1.0 + len(vectors)) / (1.0 + df)) + 1.0).astype(np.float32)
+    for matrix in (vectors, *others):
+        matrix *= idf
+        matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-9)
+
+
+def _context_scores(texts, counts, labels, clusters, topics, retriever, samples=1000):
+    """امتیاز موضوع‌ها برای هر خوشه از روی کلمه‌های همراه سوال‌ها
+
+    کلمه‌هایی که در دست‌کم نیمی از سوال‌های خوشه آمده‌اند (معمولا همان واژه ناشناخته،
+    مثلا مرسوله) کنار گذاشته می‌شوند و بقیه کلمه‌های samples سوال پرتکرار خوشه با
+    FAQRetriever ربات جستجو می‌شوند؛ امتیاز هر موضوع میانگین وزن‌دار امتیازهای
+    بازیابی است. شباهت n-gram خود واژه ناشناخته گمراه‌کننده است (مرسوله به مرجوعی
+    نزدیک است) و پیشنهادهای ثبت‌شده ربات هم از همان متن کامل ساخته شده‌اند.
+    """
+    column = {topic: index for index, topic in enumerate(topics)}
+    scores = np.zeros((clusters, len(topics)), dtype=np.float32)
+    searched = {}
+    for cluster in range(clusters):
+        members = np.flatnonzero(labels == cluster)
+        members = members[np.argsort(-counts[members], kind='stable')[:samples]]
+        size = float(counts[members].sum())
+        if not size:
+            continue
+        words = Counter()
+        for index in members:
+            words.update(dict.fromkeys(texts[index].split(), counts[index]))
+        defining = {word for word, count in words.items() if count >= size / 2}
+        for index in members:
+            context = ' '.join(word for word in texts[index].split() if word not in defining and word not in STOPWORDS)
+            if not context:
+                continue
+            if context not in searched:
+                searched[context] = retriever.search(context, k=3)
+            for topic, score in searched[context]:
+                scores[cluster, column[topic]] += counts[index] * score
+        scores[cluster] /= size
+    return scores
+
+
+def mine(texts, counts, faq, new_clusters=10, dim=256, iterations=10, min_member_similarity=0.15,
+         min_topic_score=0.25, min_count=20, min_lift=3.0, min_precision=0.5, per_group=5):
+    """خوشه‌بندی سوالات بی‌پاسخ و پیشنهاد کلیدواژه برای هر موضوع
+
+    مراکز اولیه خوشه‌ها بردار موضوع‌های فعلی (عنوان، کلیدواژه‌ها و پاسخ) به‌علاوه
+    new_clusters سوال پرتکرار دور از همه موضوع‌هاست. پس از k-means امتیاز هر خوشه
+    برای هر موضوع شباهت مرکز خوشه به موضوع به‌علاوه امتیاز کلمه‌های همراه
+    (_context_scores) است؛ خوشه به بهترین موضوع (با امتیاز دست‌کم min_topic_score)
+    نسبت داده می‌شود و خوشه‌های یک موضوع یک گروه‌اند؛ بقیه هر کدام یک «موضوع
+    جدید»اند. کلیدواژه‌های نامزد کلمه‌ها و جفت‌کلمه‌هایی‌اند که در گروه دست‌کم
+    min_lift برابر بیشتر از کل سوال‌ها آمده‌اند. پوشش هر پیشنهاد با همان تطبیق
+    Aho–Corasick ربات روی همه سوال‌ها سنجیده می‌شود: چند سوال را پاسخ می‌داد و چه
+    سهمی از آن‌ها واقعا از همان گروه بود (دقت)؛ فقط پیشنهادهای با دقت بیشتر از
+    min_precision می‌مانند.
+    """
+    timings = {}
+    started = time.perf_counter()
+    topics = list(faq)
+    vectorizer = NgramVectorizer(dim)
+    vectors = vectorizer.transform([_content(text) for text in texts])
+    topic_vectors = vectorizer.transform([
+        _content(normalize_text(' '.join([topic, *entry['keywords'], entry['answer']]))) for topic, entry in faq.items()
+    ])
+    _idf_weight(vectors, topic_vectors)
+    timings['vectorize'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    seeds = np.vstack([topic_vectors, _farthest_seeds(vectors, counts, topic_vectors, new_clusters)])
+    centroids = spherical_kmeans(vectors, counts, seeds, iterations)
+    labels, similarity = _assign(vectors, centroids)
+    # سوال‌های دور از همه مراکز (پیام‌های بی‌ربط) در هیچ گروهی شمرده نمی‌شوند
+    labels[similarity < min_member_similarity] = -1
+    # گروه هر خوشه: بهترین موضوع یا یک موضوع جدید جداگانه
+    cluster_topic = centroids @ topic_vectors.T + _context_scores(
+        texts, counts, labels, len(centroids), topics, FAQRetriever(faq))
+    groups, group_of = {}, np.empty(len(centroids), dtype=np.int64)
+    for index, scores in enumerate(cluster_topic):
+        best = int(scores.argmax())
+        key = topics[best] if scores[best] >= min_topic_score else ('new', index)
+        group_of[index] = groups.setdefault(key, len(groups))
+    labels = np.where(labels >= 0, group_of[labels], -1)
+    timings['cluster'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    existing = {normalize_text(keyword) for entry in faq.values() for keyword in entry['keywords']}
+    total = float(counts.sum())
+    global_terms = Counter()
+    group_terms = [Counter() for _ in groups]
+    group_sizes = np.bincount(labels[labels >= 0], weights=counts[labels >= 0], minlength=len(groups))
+    for text, count, label in zip(texts, counts.tolist(), labels.tolist()):
+        terms = _terms(text)
+        global_terms.update(dict.fromkeys(terms, count))
+        if label >= 0:
+            group_terms[label].update(dict.fromkeys(terms, count))
+
+    proposals = []
+    for index, terms in enumerate(group_terms):
+        size = group_sizes[index]
+        scored = []
+        for term, count in terms.items():
+            if count < min_count or term in existing:
+                continue
+            lift = (count / size) / (global_terms[term] / total)
+            if lift >= min_lift:
+                scored.append((count * math.log(lift), term))
+        chosen = []
+        for _, term in sorted(scored, reverse=True):
+            if not any(term in other or other in term for other in chosen):
+                chosen.append(term)
+        proposals.extend((index, term) for term in chosen)
+    timings['terms'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    covered = np.zeros(len(proposals))
+    in_group = np.zeros(len(proposals))
+    if proposals:
+        matcher = KeywordMatcher({str(i): {'keywords': [term]} for i, (_, term) in enumerate(proposals)})
+        for text, count, label in zip(texts, counts.tolist(), labels.tolist()):
+            for index in {index for _, _, index in matcher.find_all(text)}:
+                covered[index] += count
+                if proposals[index][0] == label:
+                    in_group[index] += count
+    precision = in_group / np.maximum(covered, 1)
+
+    report_groups = []
+    for key, index in groups.items():
+        members = np.flatnonzero(labels == index)
+        keywords = [{
+            'keyword': term,
+            'misses': int(covered[position]),
+            'coverage': round(covered[position] / total, 4),
+            'precision': round(float(precision[position]), 3),
+        } for position, (group, term) in enumerate(proposals) if group == index and precision[position] > min_precision]
+        report_groups.append({
+            'topic': key if isinstance(key, str) else None,
+            'score': round(float(cluster_topic[group_of == index].max()), 3),
+            'misses': int(group_sizes[index]),
+            'keywords': sorted(keywords, key=lambda item: -item['misses'])[:per_group],
+            'examples': [texts[i] for i in members[np.argsort(-counts[members], kind='stable')[:3]]],
+        })
+    # سوال‌هایی که دست‌کم یکی از پیشنهادهای پذیرفته‌شده جوابشان را می‌داد
+    accepted = [term for group in report_groups for term in (item['keyword'] for item in group['keywords'])]
+    answered = 0.0
+    if accepted:
+        matcher = KeywordMatcher({term: {'keywords': [term]} for term in accepted})
+        answered = sum(count for text, count in zip(texts, counts.tolist()) if matcher.find_all(text))
+    timings['coverage'] = time.perf_counter() - started
+
+    return {
+        'misses': int(total),
+        'unique': len(texts),
+        'coverage': round(answered / total, 4) if total else 0.0,
+        'groups': sorted(report_groups, key=lambda group: -group['misses']),
+        'timings': {name: round(value, 2) for name, value in timings.items()},
+    }
+
+
+def print_report(report):
+    print(f"{report['misses']} unanswered questions ({report['unique']} unique); "
+          f"proposed keywords would answer {report['coverage']:.1%}")
+    for group in report['groups']:
+        if not group['keywords']:
+            continue
+        title = group['topic'] or 'موضوع جدید'
+        print(f"\n[{title}] misses={group['misses']} score={group['score']}")
+        for item in group['keywords']:
+            print(f"  + {item['keyword']}: {item['misses']} misses ({item['coverage']:.2%}), "
+                  f"precision {item['precision']:.1%}")
+        for example in group['examples']:
+            print(f"    « {example} »")
+    print('\ntimings: ' + ' '.join(f'{name}={value}s' for name, value in report['timings'].items()))
+
+
+def cli():
+    """اجرا از ریشه مخزن:
+
+        python -m keyword_mining misses.jsonl --json suggestions.json
+    """
+    parser = argparse.ArgumentParser(description='پیشنهاد کلیدواژه از سوالات بی‌پاسخ')
+    parser.add_argument('path', nargs='?', default='misses.jsonl', help='فایل MissLog؛ فایل‌های چرخیده هم خوانده می‌شوند')
+    parser.add_argument('--content', default=DEFAULT_CONTENT_PATH)
+    parser.add_argument('--new-clusters', type=int, default=10)
+    parser.add_argument('--dim', type=int, default=256)
+    parser.add_argument('--min-count', type=int, default=20)
+    parser.add_argument('--min-lift', type=float, default=3.0)
+    parser.add_argument('--json', help='ذخیره گزارش کامل به صورت JSON')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    texts, counts = load_misses(log_files(args.path))
+    if not texts:
+        raise SystemExit(f'no unanswered questions in {args.path}')
+    load_seconds = time.perf_counter() - started
+    faq, _ = load_content(args.content)
+    report = mine(texts, counts, faq, new_clusters=args.new_clusters, dim=args.dim,
+                  min_count=args.min_count, min_lift=args.min_lift)
+    report['timings'] = {'load': round(load_seconds, 2), **report['timings']}
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,141 @@
+import sys
+import copy
+import json
+import queue
+import atexit
+import logging
+import logging.handlers
+from contextvars import ContextVar
+
+# فیلدهای آپدیت در حال پردازش؛ instrument آن‌ها را برای هر handler تنظیم می‌کند
+LOG_CONTEXT = ContextVar('log_context', default=None)
+CONTEXT_FIELDS = ('update_id', 'user_id', 'chat_id', 'handler', 'duration_ms', 'update')
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+# آرگومان‌هایی که می‌شود قالب‌بندی‌شان را به نخ نویسنده سپرد
+_IMMUTABLE = (str, int, float, bool, type(None))
+
+
+def update_context(update):
+    """شناسه آپدیت، کاربر و چت برای فیلدهای ساخت‌یافته لاگ"""
+    fields = {'update_id': getattr(update, 'update_id', None)}
+    user = getattr(update, 'effective_user', None)
+    chat = getattr(update, 'effective_chat', None)
+    if user is not None:
+        fields['user_id'] = user.id
+    if chat is not None:
+        fields['chat_id'] = chat.id
+    return fields
+
+
+class ContextFilter(logging.Filter):
+    """افزودن فیلدهای LOG_CONTEXT به رکورد در همان نخ و task لاگ‌کننده"""
+
+    def filter(self, record):
+        fields = LOG_CONTEXT.get()
+        if fields:
+            for name, value in fields.items():
+                if not hasattr(record, name):
+                    setattr(record, name, value)
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """نگه داشتن یکی از هر n رکورد INFO و پایین‌تر یک logger؛ هشدار و خطا همیشه عبور می‌کنند
+
+    نمونه‌برداری شمارشی است نه تصادفی، پس نرخ خروجی دقیق و قابل پیش‌بینی است.
+    """
+
+    def __init__(self, rate):
+        super().__init__()
+        self.every = max(1, round(1 / rate)) if rate > 0 else 0
+        self.seen = 0
+
+    def filter(self, record):
+        if record.levelno > logging.INFO:
+            return True
+        if not self.every:
+            return False
+        self.seen += 1
+        return (self.seen - 1) % self.every == 0
+
+
+class JsonFormatter(logging.Formatter):
+    """یک شیء JSON در هر خط با فیلدهای ثابت و فیلدهای آپدیت در صورت وجود"""
+
+    def format(self, record):
+        data = {
+            'ts': round(record.created, 6),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+            'pid': record.process,
+        }
+        for name in CONTEXT_FIELDS:
+            value = getattr(record, name, None)
+            if value is not None:
+                data[name] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data['exc'] = record.exc_text
+        if record.stack_info:
+            data['stack'] = record.stack_info
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler که قالب‌بندی پیام را به نخ نویسنده می‌سپارد
+
+    QueueHandler استاندارد پیام را در همان نخ event loop قالب‌بندی می‌کند. اینجا فقط
+    وقتی آرگومان‌ها تغییرپذیرند (و ممکن است تا زمان نوشتن عوض شوند) پیام همین‌جا
+    ساخته می‌شود. traceback همین‌جا به متن تبدیل می‌شود تا frameها زنده نمانند.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        args = record.args
+        if args and (isinstance(args, dict) or not all(isinstance(arg, _IMMUTABLE) for arg in args)):
+            record.msg = record.getMessage()
+            record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def parse_sample_rates(spec):
+    """'httpx=0.01,bot.handlers=0.1' ← {'httpx': 0.01, 'bot.handlers': 0.1}"""
+    rates = {}
+    for item in spec.split(','):
+        if '=' in item:
+            name, rate = item.split('=', 1)
+            rates[name.strip()] = float(rate)
+    return rates
+
+
+def setup_logging(fmt='text', level='INFO', sample_rates=None, stream=None):
+    """لاگ غیرمسدودکننده: رکوردها در صف و نوشتن در نخ جداگانه QueueListener
+
+    fmt یکی از text یا json است. sample_rates نرخ نگه‌داری رکوردهای INFO هر logger
+    است. فراخوانی دوباره (مثلا import دوباره main) کاری نمی‌کند. listener در
+    پایان پردازه متوقف می‌شود تا رکوردهای باقی‌مانده نوشته شوند.
+    """
+    root = logging.getLogger()
+    for handler in root.handlers:
+        if isinstance(handler, DeferredQueueHandler):
+            return handler.listener
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(JsonFormatter() if fmt == 'json' else logging.Formatter(TEXT_FORMAT))
+    records = queue.SimpleQueue()
+    handler = DeferredQueueHandler(records)
+    handler.addFilter(ContextFilter())
+    handler.listener = logging.handlers.QueueListener(records, output, respect_handler_level=True)
+    root.handlers[:] = [handler]
+    root.setLevel(level)
+    for name, rate in (sample_rates or {}).items():
+        logging.getLogger(name).addFilter(SamplingFilter(rate))
+    handler.listener.start()
+    atexit.register(handler.listener.stop)
+    return handler.listener
@@ -1,171 +1,177 @@
 import os
+import html
+import time
 import logging
 import asyncio
+from collections import OrderedDict
 from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import Application, CommandHandler, MessageHandler, filters, CallbackContext, CallbackQueryHandler
+from telegram.ext import Application, CommandHandler, MessageHandler, filters, CallbackContext, CallbackQueryHandler, InlineQueryHandler, TypeHandler
+from telegram.error import BadRequest
 
-# تنظیمات لاگ
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
+from broadcast import Broadcaster, SubscriberRegistry
+from callbacks import LEGACY_TOPIC_PREFIX, TOPIC_PREFIX
+from content_store import ContentStore, DEFAULT_CONTENT_PATH
+from normalizer import normalize_text
+from orders import OrderServiceUnavailable, OrderStatusClient, find_order_number
+from cluster import ShardedDispatcher, poll_into
+from flood_control import OUTBOUND_WAIT, ScheduledRequest
+from handoff import HandoffDesk, TicketStore
+from inline_search import InlineFAQSearch
+from logging_setup import parse_sample_rates, setup_logging, update_context
+from concurrency import ChatOrderedUpdateProcessor
+from miss_log import MissLog
+from metrics import METRICS, HANDLER_LATENCY, API_LATENCY, API_ERRORS, InstrumentedRequest, RateMeter, instrument, serve_metrics
+from recorder import UpdateRecorder
+from rendering import PARSE_MODE, pack, render
+from render_cache import EDITS_SKIPPED, MessageRenderCache
+from router import CallbackRouter
+from periodic import flush_periodically
+from survey_store import SurveyStore
+from throttle import InboundThrottle
+from transport import TunedHTTPXRequest
+from user_store import maintain, open_user_store
+from webhook import WebhookApp
+
+# تنظیمات لاگ: نوشتن در نخ جداگانه؛ LOG_FORMAT=json برای رکوردهای ساخت‌یافته
+# LOG_SAMPLE نرخ نگه‌داری لاگ‌های INFO پرحجم هر logger است (هشدار و خطا همیشه ثبت می‌شوند)
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text')
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+LOG_SAMPLE = os.environ.get('LOG_SAMPLE', 'httpx=0.01,bot.handlers=0.01')
+setup_logging(LOG_FORMAT, LOG_LEVEL, parse_sample_rates(LOG_SAMPLE))
 logger = logging.getLogger(__name__)
 
 # دریافت توکن از متغیرهای محیطی
 BOT_TOKEN = os.environ.get('BOT_TOKEN', '7800798991:AAE_NBnYwsJTNgCKIB5v88WuRjJnaAU9PnA')
 ADMIN_ID = int(os.environ.get('ADMIN_ID', '7321524568'))
 
-# دیتابیس کامل سوالات متداول
-FAQ_DATABASE = {
-    # دسته: محصولات
-    'موجودی محصول': {
-        'answer': '📦 **اطلاع از موجودی محصول:**\n\nموجودی هر محصول در صفحه محصول نمایش داده شده است:\n• ✅ اگر محصول موجود باشد، دکمه "افزودن به سبد خرید" فعال است\n• ❌ اگر ناموجود باشد، گزینه "ناموجود" نمایش داده می‌شود\n• 🔔 با فعال کردن "اطلاع از موجودی" می‌توانید هنگام موجود شدن مطلع شوید',
-        'keywords': ['موجودی', 'ناموجود', 'موجود', 'موجودي', 'موجود هست', 'موجود نیست', 'موجودی محصول']
-    },
-    'گارانتی محصولات': {
-        'answer': '🛡️ **گارانتی محصولات:**\n\n• بله، تمامی محصولات دارای گارانتی هستند\n• اطلاعات دقیق گارانتی هر محصول در صفحه توضیحات آن درج شده است\n• مدت گارانتی از 6 ماه تا 24 ماه متغیر است\n• گارانتی شامل نقص فنی و manufacturing defects می‌شود',
-        'keywords': ['گارانتی', 'ضمانت', 'گارانتی محصول', 'ضمانت محصول', 'گارانتی داره']
-    },
-    'مشخصات محصول': {
-        'answer': '📋 **مشاهده مشخصات کامل محصول:**\n\nبرای مشاهده مشخصات کامل:\n1. به صفحه محصول مراجعه کنید\n2. بخش "توضیحات کامل" را مطالعه کنید\n3. بخش "مشخصات فنی" را بررسی کنید\n4. تصاویر با کیفیت محصول را ببینید\n5. نظرات کاربران را مطالعه کنید',
-        'keywords': ['مشخصات', 'توضیحات', 'مشخصات فنی', 'ویژگی محصول', 'اطلاعات محصول']
-    },
-    'اصالت محصول': {
-        'answer': '✅ **اصالت محصولات:**\n\n• بله، تمامی محصولات اورجینال و اصلی هستند\n• از تامین‌کنندگان معتبر و رسمی تهیه می‌شوند\n• دارای هولوگرام اصالت و شماره سریال هستند\n• ضمانت بازگشت وجه در صورت عدم اصالت',
-        'keywords': ['اورجینال', 'اصل', 'اصالت', 'تقلبی', 'جنس اصلی', 'اورجينال']
-    },
-    'تست محصول': {
-        'answer': '🔧 **تست محصول قبل از خرید:**\n\n• 🏪 به صورت حضوری در فروشگاه امکان تست وجود دارد\n\n• 🛒 برای خرید آنلاین:\n  - می‌توانید از خدمات مرجوعی 7 روزه استفاده کنید\n  - در صورت عدم رضایت، محصول را مرجوع کنید\n  - هزینه مرجوعی در صورت سالم بودن محصول بر عهده ماست',
-        'keywords': ['تست', 'امتحان', 'ازمایش', 'قبل از خرید', 'امتحان محصول']
-    },
-
-    # دسته: سفارش
-    'ثبت سفارش': {
-        'answer': '🛒 **روش ثبت سفارش:**\n\n1. 🎯 محصول مورد نظر را انتخاب کنید\n2. ➕ به سبد خرید اضافه کنید\n3. 🛒 وارد سبد خرید شوید\n4. 📝 اطلاعات ارسال را تکمیل کنید\n5. 💳 روش پرداخت را انتخاب کنید\n6. ✅ سفارش را نهایی کنید\n\nپس از ثبت، کد رهگیری برای شما ارسال می‌شود.',
-        'keywords': ['ثبت سفارش', 'چطور سفارش بدم', 'نحوه خرید', 'خرید کنم', 'سفارش دادن']
-    },
-    'تغییر سفارش': {
-        'answer': '✏️ **تغییر یا لغو سفارش:**\n\n• ✅ فقط تا قبل از پردازش سفارش امکان تغییر یا لغو وجود دارد\n• ❌ پس از ارسال، سفارش قابل تغییر نیست\n• ⏰ برای تغییر با پشتیبانی تماس بگیرید\n• 📞 شماره پشتیبانی: 021-12345678',
-        'keywords': ['تغییر سفارش', 'لغو سفارش', 'ویرایش سفارش', 'سفارش رو عوض کنم', 'لغو کردن سفارش']
-    },
-    'پیگیری سفارش': {
-        'answer': '📦 **پیگیری سفارش:**\n\nروش‌های پیگیری:\n1. 🔐 ورود به حساب کاربری → بخش "سفارش‌ها"\n2. 🔢 وارد کردن شماره پیگیری در سایت\n3. 📞 تماس با پشتیبانی\n4. 🤖 پیام به این ربات با شماره سفارش\n\nشماره پیگیری پس از ثبت سفارش برای شما ارسال می‌شود.',
-        'keywords': ['پیگیری', 'پیگیری سفارش', 'وضعیت سفارش', 'کد رهگیری', 'سفارشم کجاست']
-    },
-    'تاخیر در ارسال': {
-        'answer': '⏳ **تأخیر در ارسال سفارش:**\n\n**دلایل احتمالی تأخیر:**\n• 📦 افزایش حجم سفارشات در روزهای خاص\n• 🚚 مشکلات لجستیکی و حمل و نقل\n• 🏪 عدم موجودی موقت محصول\n• 📋 بررسی امنیتی سفارش\n\n**راه‌حل‌ها:**\n1. با پشتیبانی تماس بگیرید: 021-12345678\n2. شماره سفارش خود را ارائه دهید\n3. وضعیت دقیق سفارش شما بررسی می‌شود\n4. در صورت تأخیر طولانی، غرامت دریافت می‌کنید\n\n⏰ حداکثر زمان تحویل: 7 روز کاری',
-        'keywords': ['تاخیر', 'دیر شده', 'ارسال نشده', 'لم رسیده', 'چرا نرسیده', 'تأخیر', 'گذشته']
-    },
-    'سفارش برای دیگران': {
-        'answer': '🎁 **سفارش برای دیگران:**\n\n• بله، می‌توانید برای شخص دیگری سفارش دهید\n• در صفحه پرداخت، آدرس و اطلاعات گیرنده را وارد کنید\n• می‌توانید به عنوان هدیه ارسال کنید\n• امکان درج پیام برای گیرنده وجود دارد',
-        'keywords': ['برای دیگران', 'هدیه', 'سفارش برای دوست', 'گیرنده متفاوت', 'برای کس دیگه']
-    },
-    'سفارش تلفنی': {
-        'answer': '📞 **سفارش تلفنی:**\n\n• بله، امکان ثبت سفارش تلفنی وجود دارد\n• 📞 شماره پشتیبانی: 021-12345678\n• ⏰ ساعات پاسخگویی: 9 صبح تا 6 عصر\n• در تماس، اطلاعات محصول و آدرس را ارائه دهید',
-        'keywords': ['سفارش تلفنی', 'تلفنی', 'تماس تلفنی', 'تلفنی سفارش بدم']
-    },
-
-    # دسته: پرداخت
-    'روش پرداخت': {
-        'answer': '💳 **روش‌های پرداخت:**\n\n• 💰 کارت‌به‌کارت به شماره کارت 6037-XXXX-XXXX-XXXX\n• 🏦 درگاه بانکی آنلاین\n• 📦 پرداخت در محل (در مناطق خاص)\n• 👛 کیف پول داخلی سایت\n\nتمام پرداخت‌ها امن و مطمئن هستند.',
-        'keywords': ['پرداخت', 'روش پرداخت', 'چطور پول بدم', 'درگاه پرداخت', 'کارت به کارت']
-    },
-    'امنیت پرداخت': {
-        'answer': '🔒 **امنیت پرداخت:**\n\n• تمامی پرداخت‌ها از درگاه‌های بانکی معتبر انجام می‌شوند\n• رمزنگاری SSL فعال است\n• اطلاعات کارت شما ذخیره نمی‌شود\n• دارای نماد اعتماد الکترونیکی\n• در صورت هرگونه مشکل، پشتیبانی 24 ساعته',
-        'keywords': ['امن', 'امنیت', 'پرداخت امن', 'ایمنی', 'اطلاعات کارت', 'رمزنگاری']
-    },
-    'پرداخت ناموفق': {
-        'answer': '❌ **پرداخت ناموفق:**\n\nاگر پرداخت شما ناموفق بود:\n• صفحه پرداخت دوباره باز می‌شود\n• مبلغ از حساب شما کسر نشده است\n• در صورت کسر مبلغ، طی 24 ساعت به حساب شما بازگردانده می‌شود\n• برای پیگیری با پشتیبانی تماس بگیرید\n• شماره پشتیبانی: 021-12345678',
-        'keywords': ['پرداخت ناموفق', 'پرداخت نشد', 'خطای پرداخت', 'پول کم شد ولی پرداخت نشد']
-    },
-    'پرداخت قسطی': {
-        'answer': '📅 **پرداخت اقساطی:**\n\n• در حال حاضر برخی محصولات با شرایط اقساطی قابل خرید هستند\n• اطلاعات اقساط در صفحه محصول ذکر شده است\n• معمولاً 6 تا 12 ماهه\n• نیاز به مدارک هویتی دارد\n• برای اطلاعات بیشتر با پشتیبانی تماس بگیرید',
-        'keywords': ['قسط', 'اقساط', 'پرداخت قسطی', 'اقساطی', 'چند قسط']
-    },
-    'رسید پرداخت': {
-        'answer': '🧾 **دریافت رسید پرداخت:**\n\n• رسید پرداخت به ایمیل ثبت شده ارسال می‌شود\n• در حساب کاربری شما در بخش "سفارش‌ها" قابل مشاهده است\n• می‌توانید از بخش پشتیبانی درخواست فاکتور رسمی کنید\n• فاکتور رسمی برای موارد گارانتی ضروری است',
-        'keywords': ['رسید', 'فاکتور', 'دریافت فاکتور', 'رسید پرداخت', 'فاکتور خرید']
-    },
-
-    # دسته: ارسال و تحویل
-    'زمان تحویل': {
-        'answer': '⏱️ **زمان تحویل سفارش:**\n\n• 🏙️ تهران: 1-2 روز کاری\n• 🏢 شهرستان‌ها: 3-5 روز کاری\n• 🚚 پست پیشتاز: 2-4 روز کاری\n• 📦 پست سفارشی: 4-7 روز کاری\n\nزمان دقیق پس از ثبت سفارش اعلام می‌شود.',
-        'keywords': ['زمان تحویل', 'چقد طول میکشه', 'کی میرسه', 'مدت ارسال', 'زمان ارسال']
-    },
-    'هزینه ارسال': {
-        'answer': '💰 **هزینه ارسال:**\n\n• هزینه ارسال بر اساس وزن، حجم و مقصد محاسبه می‌شود\n• قبل از پرداخت، هزینه نهایی نمایش داده می‌شود\n• 📦 خریدهای بالای 500 هزار تومان رایگان\n• 🏙️ تهران: از 20 هزار تومان\n• 🏢 شهرستان: از 30 هزار تومان',
-        'keywords': ['هزینه ارسال', 'پست', 'هزینه پست', 'ارسال چقدره', 'هزینه حمل']
-    },
-    'تغییر آدرس': {
-        'answer': '🏠 **تغییر آدرس تحویل:**\n\n• تا قبل از پردازش سفارش، می‌توانید آدرس را تغییر دهید\n• پس از پردازش، تغییر آدرس ممکن نیست\n• برای تغییر با پشتیبانی تماس بگیرید\n• 📞 شماره پشتیبانی: 021-12345678\n• ⏰ سریع اقدام کنید',
-        'keywords': ['تغییر آدرس', 'عوض کردن آدرس', 'آدرس اشتباه', 'آدرس جدید']
-    },
-    'تحویل فوری': {
-        'answer': '⚡ **تحویل فوری و همان روز:**\n\n• در برخی شهرها و محصولات منتخب، امکان تحویل همان روز فراهم است\n• 🏙️ تهران: برای سفارشات قبل از 12 ظهر\n• 📦 هزینه تحویل فوری: 50 هزار تومان\n• برای اطلاعات بیشتر با پشتیبانی تماس بگیرید',
-        'keywords': ['تحویل فوری', 'همان روز', 'سریع', 'فوری', 'تحویل سریع']
-    },
-    'محصول آسیب دیده': {
-        'answer': '🚨 **محصول آسیب دیده هنگام تحویل:**\n\n1. ❌ محصول را تحویل نگیرید\n2. 📸 در حضور پیک، عکس از آسیب بگیرید\n3. 📞 سریعاً با پشتیبانی تماس بگیرید\n4. 🔄 محصول تعویض خواهد شد\n5. ⚠️ در صورت تحویل گرفتن، گارانتی void می‌شود\n\nشماره پشتیبانی: 021-12345678',
-        'keywords': ['آسیب', 'شکسته', 'خراب', 'مشکل دار', 'محصول اسیب دیده', 'شکستگی']
-    },
-
-    # دسته: مرجوعی و بازگشت
-    'شرایط مرجوعی': {
-        'answer': '↩️ **شرایط مرجوعی کالا:**\n\n• ⏰ 7 روز مهلت برای مرجوعی\n• ✅ سلامت کامل محصول\n• 📦 داشتن فاکتور خرید\n• 🎁 بسته‌بندی اصلی و سالم\n• 🏷️ برچسب و لیبل دست نخورده\n\n💰 هزینه مرجوعی در صورت سالم بودن محصول بر عهده ماست',
-        'keywords': ['مرجوعی', 'برگشت', 'عودت', 'مرجوع کردن', 'شرایط مرجوعی']
-    },
-    'روش مرجوعی': {
-        'answer': '📋 **روش درخواست مرجوعی:**\n\n1. 🔐 وارد حساب کاربری شوید\n2. 📦 به بخش "سفارش‌ها" بروید\n3. ↩️ گزینه "درخواست مرجوعی" را انتخاب کنید\n4. 📝 دلیل مرجوعی را مشخص کنید\n5. ✅ درخواست را تأیید کنید\n\n📞 یا با پشتیبانی تماس بگیرید: 021-12345678',
-        'keywords': ['چطور مرجوع کنم', 'نحوه مرجوعی', 'درخواست مرجوعی', 'روش عودت']
-    },
-    'زمان بازگشت وجه': {
-        'answer': '💸 **زمان بازگشت وجه:**\n\n• پس از دریافت محصول در انبار: 24-48 ساعت\n• بازگشت به حساب بانکی: 3-5 روز کاری\n• بازگشت به کیف پول: فوری\n• 📞 برای پیگیری: 021-12345678',
-        'keywords': ['بازگشت وجه', 'کی پولم برمیگرده', 'زمان برگشت پول', 'عودت وجه']
-    },
-
-    # دسته: عمومی
-    'ساعات کاری': {
-        'answer': '🕒 **ساعات کاری فروشگاه:**\n\n⏰ شنبه تا چهارشنبه: ۸ صبح تا ۱۰ شب\n⏰ پنجشنبه: ۸ صبح تا ۸ شب\n⏰ جمعه: ۱۰ صبح تا ۶ شب\n\n📞 پشتیبانی تلفنی: ۹ صبح تا ۶ عصر',
-        'keywords': ['ساعت', 'زمان', 'باز', 'بسته', 'کاری', 'ساعات کاری']
-    },
-    'آدرس': {
-        'answer': '📍 **آدرس فروشگاه:**\n\n🏢 تهران، خیابان ولیعصر، پلاک ۱۰۰۰\n📱 شماره تماس: ۰۲۱-۱۲۳۴۵۶۷۸\n📞 پشتیبانی: ۰۲۱-۱۲۳۴۵۶۷۹\n🗺️ برای مسیریابی از گوگل مپ استفاده کنید.',
-        'keywords': ['آدرس', 'مکان', 'نشانی', 'کجا', 'آدرس فروشگاه', 'نشانی فروشگاه']
-    }
-}
+# منطقه زمانی روز کاری فروشگاه (آمار روزانه)؛ مستقل از ساعت سرور
+BUSINESS_TIMEZONE = ZoneInfo(os.environ.get('BUSINESS_TIMEZONE', 'Asia/Tehran'))
+
+# فایل سوالات متداول و پیشنهادات؛ تغییرات آن بدون ری‌استارت اعمال می‌شود
+CONTENT_PATH = os.environ.get('CONTENT_PATH', DEFAULT_CONTENT_PATH)
+CONTENT_RELOAD_INTERVAL = float(os.environ.get('CONTENT_RELOAD_INTERVAL', '5'))
+
+# حالت اجرا: polling یا webhook
+BOT_MODE = os.environ.get('BOT_MODE', 'polling')
+WEBHOOK_URL = os.environ.get('WEBHOOK_URL', '')
+WEBHOOK_PATH = os.environ.get('WEBHOOK_PATH', '/webhook')
+WEBHOOK_SECRET = os.environ.get('WEBHOOK_SECRET', '')
+PORT = int(os.environ.get('PORT', '8000'))
+
+# تعداد پردازه‌های کارگر؛ بیش از یک یعنی توزیع آپدیت‌ها بر اساس چت
+BOT_WORKERS = int(os.environ.get('BOT_WORKERS', '1'))
+
+# تعداد آپدیت‌های هم‌زمان در هر پردازه؛ ترتیب آپدیت‌های هر چت حفظ می‌شود
+CONCURRENT_UPDATES = int(os.environ.get('CONCURRENT_UPDATES', '1'))
+
+# اطلاعات کاربران؛ با مسیر فایل SQLite بین پردازه‌ها و استقرارها مشترک می‌ماند
+USER_STORE_PATH = os.environ.get('USER_STORE_PATH', 'users.db')
+USER_FLUSH_INTERVAL = float(os.environ.get('USER_FLUSH_INTERVAL', '5'))
+USER_SESSION_TTL = float(os.environ.get('USER_SESSION_TTL_DAYS', '180')) * 86400
+USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', '10000'))
+USER_STORE = open_user_store(USER_STORE_PATH, cache_size=USER_CACHE_SIZE)
+
+# نتایج نظرسنجی؛ پیش‌فرض در همان فایل اطلاعات کاربران
+SURVEY_STORE_PATH = os.environ.get('SURVEY_STORE_PATH', USER_STORE_PATH)
+SURVEY_STORE = SurveyStore(SURVEY_STORE_PATH, timezone=BUSINESS_TIMEZONE)
+
+# سوالات بی‌پاسخ برای استخراج کلیدواژه‌های جدید (python -m keyword_mining)؛ مسیر خالی یعنی غیرفعال
+MISS_LOG_PATH = os.environ.get('MISS_LOG_PATH', 'misses.jsonl')
+MISS_LOG_MAX_MB = float(os.environ.get('MISS_LOG_MAX_MB', '64'))
+MISS_LOG = MissLog(MISS_LOG_PATH, max_bytes=int(MISS_LOG_MAX_MB * 2 ** 20)) if MISS_LOG_PATH else None
+
+# گفتگو با اپراتور (تیکت پشتیبانی)؛ OPERATOR_IDS شناسه‌های اپراتورها با کاما (پیش‌فرض ADMIN_ID)
+# HANDOFF_MAX_PER_OPERATOR سقف تیکت باز هر اپراتور و HANDOFF_QUEUE_SIZE سقف پیام‌های در صف هر اپراتور است
+OPERATOR_IDS = [int(operator) for operator in os.environ.get('OPERATOR_IDS', str(ADMIN_ID)).split(',') if operator.strip()]
+TICKETS_PATH = os.environ.get('TICKETS_PATH', USER_STORE_PATH)
+TICKETS = TicketStore(TICKETS_PATH)
+HANDOFF_MAX_PER_OPERATOR = int(os.environ.get('HANDOFF_MAX_PER_OPERATOR', '50'))
+HANDOFF_QUEUE_SIZE = int(os.environ.get('HANDOFF_QUEUE_SIZE', '200'))
+
+# مشترکین اطلاع‌رسانی و ارسال همگانی؛ نرخ کمی زیر سقف ۳۰ پیام در ثانیه تلگرام
+SUBSCRIBERS_PATH = os.environ.get('SUBSCRIBERS_PATH', USER_STORE_PATH)
+SUBSCRIBERS = SubscriberRegistry(SUBSCRIBERS_PATH)
+BROADCAST_RATE = float(os.environ.get('BROADCAST_RATE', '25'))
+BROADCAST_WORKERS = int(os.environ.get('BROADCAST_WORKERS', '8'))
+
+# پیشنهادهای زمان‌دار: پیشنهادی که بیش از PROMOTION_PUSH_GRACE ثانیه از شروعش گذشته
+# (مثلا وقتی ربات خاموش بوده) دیگر خودکار ارسال نمی‌شود؛ بازه بعدی در فایل تازه‌بارگذاری‌شده
+# حداکثر پس از PROMOTION_RESYNC_INTERVAL ثانیه زمان‌بندی می‌شود
+PROMOTION_PUSH_GRACE = float(os.environ.get('PROMOTION_PUSH_GRACE', '3600'))
+PROMOTION_RESYNC_INTERVAL = float(os.environ.get('PROMOTION_RESYNC_INTERVAL', '60'))
 
-# دیتابیس پیشنهادات و تخفیف‌ها
-PROMOTIONS = {
-    'تخفیف ویژه': '🎉 **تخفیف‌های ویژه این هفته:**\n\n• 📱 محصولات الکترونیکی: 20% تخفیف\n• 🏠 لوازم خانگی: 15% تخفیف\n• 👕 پوشاک: 30% تخفیف\n• 🎁 خرید اول: 10% تخفیف\n\n⏰ فرصت محدود!',
-    'عضویت ویژه': '👑 **برنامه وفاداری و اعضا ویژه:**\n\n• 💰 کسب امتیاز در هر خرید\n• 🎁 هدیه تولد برای اعضا\n• 🔥 پیشنهادات اختصاصی\n• ⚡ دسترسی زودتر به محصولات جدید\n\nبرای عضویت رایگان: /membership',
-    'شارژ کیف پول': '👛 **شارژ کیف پول و جایزه:**\n\n• 💵 شارژ 100 هزار تومان → 105 هزار تومان\n• 💰 شارژ 500 هزار تومان → 525 هزار تومان\n• 🎁 شارژ 1 میلیون تومان → 1.1 میلیون تومان\n\nشارژ کیف پول همیشه سود دارد!'
+# سقف ارسال پیام: سراسری (بین کارگرها تقسیم می‌شود) و برای هر چت
+OUTBOUND_GLOBAL_RATE = float(os.environ.get('OUTBOUND_GLOBAL_RATE', '30'))
+OUTBOUND_CHAT_RATE = float(os.environ.get('OUTBOUND_CHAT_RATE', '1'))
+
+# محدودیت ورودی هر کاربر و بازه نادیده گرفتن فشردن تکراری یک دکمه
+INBOUND_RATE = float(os.environ.get('INBOUND_RATE', '2'))
+INBOUND_BURST = int(os.environ.get('INBOUND_BURST', '8'))
+DUPLICATE_TAP_WINDOW = float(os.environ.get('DUPLICATE_TAP_WINDOW', '1'))
+
+# ذخیره آپدیت‌های ورودی برای بازپخش آفلاین (python -m benchmarks.replay)
+RECORD_UPDATES_PATH = os.environ.get('RECORD_UPDATES_PATH', '')
+RECORD_FLUSH_INTERVAL = float(os.environ.get('RECORD_FLUSH_INTERVAL', '1'))
+RECORDER = UpdateRecorder(RECORD_UPDATES_PATH) if RECORD_UPDATES_PATH else None
+
+# اتصال به Bot API: pool جداگانه برای ارسال‌ها و long polling؛ BOT_API_HTTP2=1 نیازمند httpx[http2]
+# هزینه CPU هر درخواست در pool خود httpx با تعداد اتصال‌ها بالا می‌رود؛ ۳۲ اتصال چند برابر سقف ارسال تلگرام است
+BOT_API_POOL_SIZE = int(os.environ.get('BOT_API_POOL_SIZE', '32'))
+BOT_API_POOL_TIMEOUT = float(os.environ.get('BOT_API_POOL_TIMEOUT', '1'))
+BOT_API_CONNECT_TIMEOUT = float(os.environ.get('BOT_API_CONNECT_TIMEOUT', '5'))
+BOT_API_READ_TIMEOUT = float(os.environ.get('BOT_API_READ_TIMEOUT', '5'))
+BOT_API_WRITE_TIMEOUT = float(os.environ.get('BOT_API_WRITE_TIMEOUT', '5'))
+BOT_API_KEEPALIVE_EXPIRY = float(os.environ.get('BOT_API_KEEPALIVE_EXPIRY', '30'))
+BOT_API_HTTP2 = os.environ.get('BOT_API_HTTP2', '0') == '1'
+
+# جستجوی inline (@bot عبارت): نتایج هر صفحه و مدت نگه‌داری پاسخ در کش تلگرام (ثانیه)
+INLINE_PAGE_SIZE = int(os.environ.get('INLINE_PAGE_SIZE', '20'))
+INLINE_CACHE_TIME = int(os.environ.get('INLINE_CACHE_TIME', '300'))
+
+# پورت جداگانه /metrics در حالت polling؛ در حالت وب‌هوک همان پورت عمومی وب‌هوک استفاده می‌شود
+# و /metrics فقط با METRICS_TOKEN (هدر Authorization: Bearer) فعال است
+METRICS_PORT = int(os.environ.get('METRICS_PORT', '0'))
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# سرویس وضعیت سفارش فروشگاه؛ بدون آدرس، شماره سفارش‌ها مثل بقیه پیام‌ها پردازش می‌شوند
+ORDER_API_URL = os.environ.get('ORDER_API_URL', '')
+ORDER_API_TOKEN = os.environ.get('ORDER_API_TOKEN', '')
+ORDER_API_TIMEOUT = float(os.environ.get('ORDER_API_TIMEOUT', '3'))
+ORDER_CACHE_TTL = float(os.environ.get('ORDER_CACHE_TTL', '30'))
+ORDERS = OrderStatusClient(
+    ORDER_API_URL, token=ORDER_API_TOKEN, timeout=ORDER_API_TIMEOUT, cache_ttl=ORDER_CACHE_TTL
+) if ORDER_API_URL else None
+# پس از /track عدد بعدی کاربر تا این مدت (ثانیه) بدون کلمه «سفارش» هم شماره سفارش حساب می‌شود
+ORDER_PROMPT_TTL = float(os.environ.get('ORDER_PROMPT_TTL', '300'))
+ORDER_PROMPT_MAX = 10000
+
+ORDER_STATUS_LABELS = {
+    'pending': '⏳ در انتظار پرداخت',
+    'processing': '🛠 در حال آماده‌سازی',
+    'shipped': '🚚 ارسال شده',
+    'delivered': '✅ تحویل داده شده',
+    'cancelled': '❌ لغو شده',
+    'returned': '↩️ مرجوع شده',
 }
 
-async def start(update: Update, context: CallbackContext) -> None:
-    """Handler برای دستور /start"""
-    user = update.effective_user
-    
-    # ذخیره اطلاعات کاربر
-    context.user_data['first_name'] = user.first_name
-    context.user_data['last_seen'] = datetime.now().isoformat()
-    
-    keyboard = [
-        [InlineKeyboardButton("📦 محصولات", callback_data="cat_products"), 
-         InlineKeyboardButton("🛒 سفارش", callback_data="cat_order")],
-        [InlineKeyboardButton("💳 پرداخت", callback_data="cat_payment"), 
-         InlineKeyboardButton("🚚 ارسال", callback_data="cat_shipping")],
-        [InlineKeyboardButton("↩️ مرجوعی", callback_data="cat_return"),
-         InlineKeyboardButton("🎉 تخفیف‌ها", callback_data="promotions")],
-        [InlineKeyboardButton("📞 پشتیبانی", callback_data="support"),
-         InlineKeyboardButton("🏠 اطلاعات فروشگاه", callback_data="info")],
-        [InlineKeyboardButton("⭐ نظرسنجی", callback_data="survey"),
-         InlineKeyboardButton("🔔 اطلاع‌رسانی", callback_data="notifications")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    welcome_text = f"""
-    🌟 سلام {user.first_name} عزیز! 
+# آستانه‌های امتیاز بازیابی: پاسخ مستقیم یا پیشنهاد چند موضوع
+ANSWER_MIN_SCORE = 0.75
+ANSWER_MIN_MARGIN = 0.25
+SUGGEST_MIN_SCORE = 0.3
+
+# متریک‌های ربات (هر پردازه کارگر متریک‌های خودش را دارد)
+UPDATES = METRICS.counter('bot_updates_total', 'Received updates', ['type'])
+UPDATE_RATE = RateMeter()
+FAQ_HITS = METRICS.counter('bot_faq_hits_total', 'Answered questions', ['topic', 'source'])
+FAQ_MISSES = METRICS.counter('bot_faq_misses_total', 'Unanswered questions', ['outcome'])
+CALLBACK_ROUTES = METRICS.counter('bot_callback_routes_total', 'Inline button presses', ['route'])
+
+# متن‌های ثابت پیام‌ها با نشانه‌گذاری **پررنگ** و [متن](نشانی)؛ در build_views یک بار
+# برای هر نسخه محتوا به HTML رندر می‌شوند. {name} هنگام ارسال با نام کاربر جایگزین می‌شود
+WELCOME_TEXT = """
+    🌟 سلام {name} عزیز! 
     
     به ربات پشتیبانی هوشمند فروشگاه خوش آمدید 🤖
     
@@ -186,12 +192,8 @@ async def start(update: Update, context: CallbackContext) -> None:
     
     لطفا سوال خودتون رو بپرسید یا از منو استفاده کنید:
     """
-    
-    await update.message.reply_text(welcome_text, reply_markup=reply_markup)
 
-async def help_command(update: Update, context: CallbackContext) -> None:
-    """Handler برای دستور /help"""
-    help_text = """
+HELP_TEXT = """
     📋 **راهنمای کامل استفاده از ربات:**
 
     **🎯 روش‌های ارتباط:**
@@ -214,308 +216,13 @@ async def help_command(update: Update, context: CallbackContext) -> None:
     • واتساپ: 09121234567
     """
 
-    keyboard = [
-        [InlineKeyboardButton("🏠 منوی اصلی", callback_data="main_menu"),
-         InlineKeyboardButton("📞 پشتیبانی", callback_data="support")],
-        [InlineKeyboardButton("🎉 تخفیف‌ها", callback_data="promotions"),
-         InlineKeyboardButton("📦 پیگیری سفارش", callback_data="faq_پیگیری سفارش")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    await update.message.reply_text(help_text, reply_markup=reply_markup)
-
-async def promo_command(update: Update, context: CallbackContext) -> None:
-    """Handler برای دستور /promo"""
-    promo_text = PROMOTIONS['تخفیف ویژه']
-    
-    keyboard = [
-        [InlineKeyboardButton("👑 عضویت ویژه", callback_data="membership"),
-         InlineKeyboardButton("👛 شارژ کیف پول", callback_data="wallet")],
-        [InlineKeyboardButton("🎁 همه پیشنهادها", callback_data="promotions"),
-         InlineKeyboardButton("🏠 منوی اصلی", callback_data="main_menu")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    await update.message.reply_text(promo_text, reply_markup=reply_markup)
-
-async def track_command(update: Update, context: CallbackContext) -> None:
-    """Handler برای دستور /track"""
-    track_text = """
+TRACK_TEXT = """
     📦 **پیگیری سفارش:**
     
     لطفا شماره سفارش خود را وارد کنید یا از روش‌های زیر استفاده کنید:
     """
-    
-    keyboard = [
-        [InlineKeyboardButton("🔐 حساب کاربری", callback_data="faq_پیگیری سفارش"),
-         InlineKeyboardButton("📞 تماس با پشتیبانی", callback_data="support")],
-        [InlineKeyboardButton("🛒 مشکلات سفارش", callback_data="faq_تاخیر در ارسال"),
-         InlineKeyboardButton("🏠 منوی اصلی", callback_data="main_menu")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    await update.message.reply_text(track_text, reply_markup=reply_markup)
-
-async def membership_command(update: Update, context: CallbackContext) -> None:
-    """Handler برای دستور /membership"""
-    membership_text = PROMOTIONS['عضویت ویژه']
-    
-    keyboard = [
-        [InlineKeyboardButton("🎉 ثبت نام رایگان", callback_data="register_member"),
-         InlineKeyboardButton("💰 مزایای عضویت", callback_data="benefits")],
-        [InlineKeyboardButton("🏠 منوی اصلی", callback_data="main_menu")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    await update.message.reply_text(membership_text, reply_markup=reply_markup)
-
-async def support_command(update: Update, context: CallbackContext) -> None:
-    """Handler برای دستور /support"""
-    await support_callback(update, context)
-
-async def handle_message(update: Update, context: CallbackContext) -> None:
-    """Handler برای پیام‌های متنی"""
-    user_message = update.message.text.lower()
-    
-    # جستجو در دیتابیس سوالات متداول
-    found_answer = None
-    for category, data in FAQ_DATABASE.items():
-        for keyword in data['keywords']:
-            if keyword in user_message:
-                found_answer = data['answer']
-                break
-        if found_answer:
-            break
-    
-    if found_answer:
-        # اضافه کردن دکمه‌های مرتبط
-        keyboard = [
-            [InlineKeyboardButton("📞 پشتیبانی", callback_data="support"),
-             InlineKeyboardButton("🏠 منوی اصلی", callback_data="main_menu")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await update.message.reply_text(found_answer, reply_markup=reply_markup)
-    else:
-        # اگر سوال تشخیص داده نشد
-        not_found_text = """
-        ❓ **متوجه سوال شما نشدم!**
-        
-        لطفا سوال خود را به صورت واضح‌تر بیان کنید یا از دسته‌بندی‌های زیر استفاده کنید:
-        """
-        
-        keyboard = [
-            [InlineKeyboardButton("📦 محصولات", callback_data="cat_products"),
-             InlineKeyboardButton("🛒 سفارش", callback_data="cat_order")],
-            [InlineKeyboardButton("💳 پرداخت", callback_data="cat_payment"),
-             InlineKeyboardButton("🚚 ارسال", callback_data="cat_shipping")],
-            [InlineKeyboardButton("📞 تماس با اپراتور", callback_data="support"),
-             InlineKeyboardButton("🏠 منوی اصلی", callback_data="main_menu")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await update.message.reply_text(not_found_text, reply_markup=reply_markup)
-
-async def button_handler(update: Update, context: CallbackContext) -> None:
-    """Handler برای دکمه‌های اینلاین"""
-    query = update.callback_query
-    await query.answer()
-    
-    # دسته‌بندی محصولات
-    if query.data == "cat_products":
-        keyboard = [
-            [InlineKeyboardButton("📦 موجودی محصول", callback_data="faq_موجودی محصول"),
-             InlineKeyboardButton("🛡️ گارانتی", callback_data="faq_گارانتی محصولات")],
-            [InlineKeyboardButton("📋 مشخصات محصول", callback_data="faq_مشخصات محصول"),
-             InlineKeyboardButton("✅ اصالت محصول", callback_data="faq_اصالت محصول")],
-            [InlineKeyboardButton("🔧 تست محصول", callback_data="faq_تست محصول")],
-            [InlineKeyboardButton("🔙 بازگشت", callback_data="main_menu"),
-             InlineKeyboardButton("📞 پشتیبانی", callback_data="support")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.edit_message_text(
-            "📦 **دسته‌بندی محصولات**\n\nلطفا موضوع مورد نظر را انتخاب کنید:",
-            reply_markup=reply_markup
-        )
-    
-    # دسته‌بندی سفارش
-    elif query.data == "cat_order":
-        keyboard = [
-            [InlineKeyboardButton("🛒 ثبت سفارش", callback_data="faq_ثبت سفارش"),
-             InlineKeyboardButton("✏️ تغییر سفارش", callback_data="faq_تغییر سفارش")],
-            [InlineKeyboardButton("📦 پیگیری سفارش", callback_data="faq_پیگیری سفارش"),
-             InlineKeyboardButton("⏳ تاخیر در ارسال", callback_data="faq_تاخیر در ارسال")],
-            [InlineKeyboardButton("🎁 سفارش برای دیگران", callback_data="faq_سفارش برای دیگران"),
-             InlineKeyboardButton("📞 سفارش تلفنی", callback_data="faq_سفارش تلفنی")],
-            [InlineKeyboardButton("🔙 بازگشت", callback_data="main_menu"),
-             InlineKeyboardButton("📞 پشتیبانی", callback_data="support")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.edit_message_text(
-            "🛒 **دسته‌بندی سفارش**\n\nلطفا موضوع مورد نظر را انتخاب کنید:",
-            reply_markup=reply_markup
-        )
-    
-    # دسته‌بندی پرداخت
-    elif query.data == "cat_payment":
-        keyboard = [
-            [InlineKeyboardButton("💳 روش پرداخت", callback_data="faq_روش پرداخت"),
-             InlineKeyboardButton("🔒 امنیت پرداخت", callback_data="faq_امنیت پرداخت")],
-            [InlineKeyboardButton("❌ پرداخت ناموفق", callback_data="faq_پرداخت ناموفق"),
-             InlineKeyboardButton("📅 پرداخت قسطی", callback_data="faq_پرداخت قسطی")],
-            [InlineKeyboardButton("🧾 رسید پرداخت", callback_data="faq_رسید پرداخت")],
-            [InlineKeyboardButton("🔙 بازگشت", callback_data="main_menu"),
-             InlineKeyboardButton("📞 پشتیبانی", callback_data="support")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.edit_message_text(
-            "💳 **دسته‌بندی پرداخت**\n\nلطفا موضوع مورد نظر را انتخاب کنید:",
-            reply_markup=reply_markup
-        )
-    
-    # دسته‌بندی ارسال
-    elif query.data == "cat_shipping":
-        keyboard = [
-            [InlineKeyboardButton("⏱️ زمان تحویل", callback_data="faq_زمان تحویل"),
-             InlineKeyboardButton("💰 هزینه ارسال", callback_data="faq_هزینه ارسال")],
-            [InlineKeyboardButton("🏠 تغییر آدرس", callback_data="faq_تغییر آدرس"),
-             InlineKeyboardButton("⚡ تحویل فوری", callback_data="faq_تحویل فوری")],
-            [InlineKeyboardButton("🚨 محصول آسیب دیده", callback_data="faq_محصول آسیب دیده")],
-            [InlineKeyboardButton("🔙 بازگشت", callback_data="main_menu"),
-             InlineKeyboardButton("📞 پشتیبانی", callback_data="support")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.edit_message_text(
-            "🚚 **دسته‌بندی ارسال و تحویل**\n\nلطفا موضوع مورد نظر را انتخاب کنید:",
-            reply_markup=reply_markup
-        )
-    
-    # دسته‌بندی مرجوعی
-    elif query.data == "cat_return":
-        keyboard = [
-            [InlineKeyboardButton("↩️ شرایط مرجوعی", callback_data="faq_شرایط مرجوعی"),
-             InlineKeyboardButton("📋 روش مرجوعی", callback_data="faq_روش مرجوعی")],
-            [InlineKeyboardButton("💸 زمان بازگشت وجه", callback_data="faq_زمان بازگشت وجه")],
-            [InlineKeyboardButton("🔙 بازگشت", callback_data="main_menu"),
-             InlineKeyboardButton("📞 پشتیبانی", callback_data="support")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.edit_message_text(
-            "↩️ **دسته‌بندی مرجوعی و بازگشت کالا**\n\nلطفا موضوع مورد نظر را انتخاب کنید:",
-            reply_markup=reply_markup
-        )
-    
-    # نمایش سوالات متداول
-    elif query.data.startswith("faq_"):
-        category = query.data[4:]
-        if category in FAQ_DATABASE:
-            answer = FAQ_DATABASE[category]['answer']
-            
-            keyboard = [
-                [InlineKeyboardButton("🔙 بازگشت", callback_data=get_category_back(category)),
-                 InlineKeyboardButton("📞 پشتیبانی", callback_data="support")],
-                [InlineKeyboardButton("🏠 منوی اصلی", callback_data="main_menu")]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            await query.edit_message_text(answer, reply_markup=reply_markup)
-    
-    # بخش پیشنهادات و تخفیف‌ها
-    elif query.data == "promotions":
-        promo_text = "🎊 **پیشنهادات ویژه و تخفیف‌ها**\n\nلطفا گزینه مورد نظر را انتخاب کنید:"
-        
-        keyboard = [
-            [InlineKeyboardButton("🎉 تخفیف ویژه", callback_data="show_promo"),
-             InlineKeyboardButton("👑 عضویت ویژه", callback_data="membership")],
-            [InlineKeyboardButton("👛 شارژ کیف پول", callback_data="wallet"),
-             InlineKeyboardButton("⭐ نظرسنجی", callback_data="survey")],
-            [InlineKeyboardButton("🔙 بازگشت", callback_data="main_menu")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.edit_message_text(promo_text, reply_markup=reply_markup)
-    
-    elif query.data == "show_promo":
-        await query.edit_message_text(PROMOTIONS['تخفیف ویژه'], reply_markup=InlineKeyboardMarkup([
-            [InlineKeyboardButton("🔙 بازگشت", callback_data="promotions")]
-        ]))
-    
-    elif query.data == "membership":
-        await query.edit_message_text(PROMOTIONS['عضویت ویژه'], reply_markup=InlineKeyboardMarkup([
-            [InlineKeyboardButton("🎉 ثبت نام", callback_data="register_member")],
-            [InlineKeyboardButton("🔙 بازگشت", callback_data="promotions")]
-        ]))
-    
-    elif query.data == "wallet":
-        await query.edit_message_text(PROMOTIONS['شارژ کیف پول'], reply_markup=InlineKeyboardMarkup([
-            [InlineKeyboardButton("💳 شارژ کن", callback_data="charge_wallet")],
-            [InlineKeyboardButton("🔙 بازگشت", callback_data="promotions")]
-        ]))
-    
-    elif query.data in ["register_member", "charge_wallet"]:
-        await query.edit_message_text(
-            "✅ برای تکمیل فرآیند، لطفا با پشتیبانی تماس بگیرید:\n\n📞 021-12345678\n👤 @ghbyhbjvhjguboijbot",
-            reply_markup=InlineKeyboardMarkup([
-                [InlineKeyboardButton("📞 تماس", callback_data="support")],
-                [InlineKeyboardButton("🏠 منوی اصلی", callback_data="main_menu")]
-            ])
-        )
-    
-    elif query.data == "survey":
-        await query.edit_message_text(
-            "⭐ **نظرسنجی رضایت از خدمات**\n\nلطفا میزان رضایت خود را انتخاب کنید:",
-            reply_markup=InlineKeyboardMarkup([
-                [InlineKeyboardButton("😊 عالی", callback_data="survey_excellent"),
-                 InlineKeyboardButton("🙂 خوب", callback_data="survey_good")],
-                [InlineKeyboardButton("😐 متوسط", callback_data="survey_avg"),
-                 InlineKeyboardButton("☹️ ضعیف", callback_data="survey_poor")],
-                [InlineKeyboardButton("🔙 بازگشت", callback_data="main_menu")]
-            ])
-        )
-    
-    elif query.data.startswith("survey_"):
-        rating = query.data[7:]
-        ratings = {
-            'excellent': 'عالی 😊',
-            'good': 'خوب 🙂', 
-            'avg': 'متوسط 😐',
-            'poor': 'ضعیف ☹️'
-        }
-        
-        await query.edit_message_text(
-            f"✅ **با تشکر از شما!**\n\nامتیاز شما: {ratings[rating]}\n\nنظر شما با موفقیت ثبت شد. برای بهبود خدمات از پیشنهادات شما استفاده خواهیم کرد.",
-            reply_markup=InlineKeyboardMarkup([
-                [InlineKeyboardButton("🏠 منوی اصلی", callback_data="main_menu"),
-                 InlineKeyboardButton("📞 پیشنهاد جدید", callback_data="support")]
-            ])
-        )
-    
-    elif query.data == "notifications":
-        await query.edit_message_text(
-            "🔔 **سرویس اطلاع‌رسانی**\n\nبرای دریافت اطلاعیه‌های زیر عضو شوید:\n• 📦 وضعیت سفارش\n• 🎉 تخفیف‌های ویژه\n• 🔔 محصولات جدید\n• ⚡ اطلاع‌رسانی فوری",
-            reply_markup=InlineKeyboardMarkup([
-                [InlineKeyboardButton("✅ فعال کردن", callback_data="enable_notifications")],
-                [InlineKeyboardButton("🔙 بازگشت", callback_data="main_menu")]
-            ])
-        )
-    
-    elif query.data == "enable_notifications":
-        await query.edit_message_text(
-            "✅ **سرویس اطلاع‌رسانی فعال شد!**\n\nاز این پس از آخرین اخبار و تخفیف‌ها مطلع خواهید شد.",
-            reply_markup=InlineKeyboardMarkup([
-                [InlineKeyboardButton("🏠 منوی اصلی", callback_data="main_menu")]
-            ])
-        )
-    
-    elif query.data == "support":
-        await support_callback(query, context)
-    
-    elif query.data == "info":
-        await info_callback(query, context)
-    
-    elif query.data == "main_menu":
-        await start_callback(query, context)
 
-async def support_callback(update, context):
-    """تابع مشترک برای پشتیبانی"""
-    support_text = """
+SUPPORT_TEXT = """
     📞 **تماس با پشتیبانی:**
     
     **روش‌های ارتباط:**
@@ -535,25 +242,10 @@ async def support_callback(update, context):
     • 🔧 مشکلات فنی
     • 💬 مشاوره خرید
     
-    لطفا سوال خود را مستقیما برای ادمین ارسال کنید.
+    برای گفتگو با اپراتور همین‌جا دکمه «💬 گفتگو با اپراتور» را بزنید.
     """
-    
-    keyboard = [
-        [InlineKeyboardButton("🛒 مشکلات سفارش", callback_data="faq_تاخیر در ارسال"),
-         InlineKeyboardButton("💳 مشکلات پرداخت", callback_data="faq_پرداخت ناموفق")],
-        [InlineKeyboardButton("🏠 منوی اصلی", callback_data="main_menu"),
-         InlineKeyboardButton("↩️ درخواست مرجوعی", callback_data="cat_return")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    if hasattr(update, 'message'):
-        await update.message.reply_text(support_text, reply_markup=reply_markup)
-    else:
-        await update.edit_message_text(support_text, reply_markup=reply_markup)
 
-async def info_callback(update, context):
-    """تابع مشترک برای اطلاعات فروشگاه"""
-    info_text = """
+INFO_TEXT = """
     🏪 **اطلاعات کامل فروشگاه:**
     
     **📌 آدرس فروشگاه:**
@@ -581,27 +273,369 @@ async def info_callback(update, context):
     • ♿ مناسب معلولین
     • 🚇 نزدیک ایستگاه مترو
     """
+
+MAIN_MENU_TEXT = """
+    🏠 **منوی اصلی**
     
-    keyboard = [
-        [InlineKeyboardButton("📞 تماس سریع", callback_data="support"),
-         InlineKeyboardButton("🗺️ مسیریابی", url="https://maps.google.com")],
-        [InlineKeyboardButton("🏠 منوی اصلی", callback_data="main_menu")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    سلام {name} عزیز! 
+    لطفا گزینه مورد نظر را انتخاب کنید:
+    """
+
+NOT_FOUND_TEXT = """
+    ❓ **متوجه سوال شما نشدم!**
+    
+    لطفا سوال خود را به صورت واضح‌تر بیان کنید یا از دسته‌بندی‌های زیر استفاده کنید:
+    """
+
+SUGGEST_TEXT = "🔎 **منظورتان کدام مورد است؟**\n\nلطفا یکی از موضوعات زیر را انتخاب کنید:"
+ORDERS_UNAVAILABLE_TEXT = "⚠️ **در حال حاضر امکان استعلام سفارش وجود ندارد.**\n\nلطفا چند دقیقه دیگر دوباره تلاش کنید یا با پشتیبانی تماس بگیرید."
+OPERATORS_BUSY_TEXT = "⏳ همه اپراتورها مشغول گفتگو هستند. لطفا کمی بعد دوباره تلاش کنید یا از سوالات متداول استفاده کنید."
+TICKET_CLOSED_TEXT = "✅ گفتگو با پشتیبانی بسته شد."
+# پیشنهاد دائمی فایل محتوا (بدون ادعای زمانی) که بعد از پیشنهادهای زمان‌دار فعال نمایش داده می‌شود
+STANDING_PROMOTION = 'تخفیف خرید اول'
+NO_PROMOTION_TEXT = "🎉 **در حال حاضر تخفیف ویژه فعالی وجود ندارد.**\n\nبرای باخبر شدن از تخفیف‌های بعدی، اطلاع‌رسانی را از منوی اصلی فعال کنید."
+
+def remember_user(user):
+    """ثبت نام و آخرین فعالیت کاربر؛ در flush بعدی نوشته می‌شود و انقضای نشست را عقب می‌اندازد"""
+    USER_STORE.update(user.id, first_name=user.first_name, last_seen=datetime.now().isoformat())
+
+async def start(update: Update, context: CallbackContext) -> None:
+    """Handler برای دستور /start"""
+    user = update.effective_user
+    
+    # ذخیره اطلاعات کاربر
+    remember_user(user)
+    
+    content = CONTENT.current
+    reply_markup = content.keyboards['main_menu']
+    
+    await update.message.reply_text(
+        with_name(content.texts['welcome'], user), reply_markup=reply_markup, parse_mode=PARSE_MODE
+    )
+
+async def help_command(update: Update, context: CallbackContext) -> None:
+    """Handler برای دستور /help"""
+    content = CONTENT.current
+    await reply_parts(update.message, content.texts['help'], content.keyboards['help'])
+
+async def promo_command(update: Update, context: CallbackContext) -> None:
+    """Handler برای دستور /promo"""
+    content = CONTENT.current
+    await reply_parts(update.message, content.texts['promo'], content.keyboards['promo'])
+
+# کاربرانی که /track زده‌اند و منتظر شماره سفارششان هستیم: شناسه ← مهلت (monotonic)
+# آپدیت‌های هر چت به یک پردازه می‌رسند، پس نگه‌داری در حافظه همین پردازه کافی است
+AWAITING_ORDER = OrderedDict()
+
+def expect_order_number(user_id):
+    """علامت‌گذاری کاربر تا پیام بعدی‌اش شماره سفارش در نظر گرفته شود"""
+    AWAITING_ORDER[user_id] = time.monotonic() + ORDER_PROMPT_TTL
+    AWAITING_ORDER.move_to_end(user_id)
+    while len(AWAITING_ORDER) > ORDER_PROMPT_MAX:
+        AWAITING_ORDER.popitem(last=False)
+
+def awaiting_order_number(user_id):
+    """آیا پیام فعلی کاربر جواب /track است؛ علامت فقط برای یک پیام معتبر است"""
+    deadline = AWAITING_ORDER.pop(user_id, None)
+    return deadline is not None and deadline > time.monotonic()
+
+async def track_command(update: Update, context: CallbackContext) -> None:
+    """Handler برای دستور /track"""
+    content = CONTENT.current
+    expect_order_number(update.effective_user.id)
+    await reply_parts(update.message, content.texts['track'], content.keyboards['track'])
+
+async def membership_command(update: Update, context: CallbackContext) -> None:
+    """Handler برای دستور /membership"""
+    content = CONTENT.current
+    await reply_parts(update.message, content.promotion_texts['عضویت ویژه'], content.keyboards['membership'])
+
+async def support_command(update: Update, context: CallbackContext) -> None:
+    """Handler برای دستور /support"""
+    await support_callback(update, context)
+
+async def handle_message(update: Update, context: CallbackContext) -> None:
+    """Handler برای پیام‌های متنی"""
+    remember_user(update.effective_user)
+    # کاربری که تیکت باز دارد با اپراتور گفتگو می‌کند
+    desk = context.application.bot_data.get('handoff')
+    ticket = desk.ticket_for(update.effective_user.id) if desk else None
+    if ticket:
+        if not desk.submit(ticket, update.message.text):
+            await update.message.reply_text(
+                "⏳ اپراتورها در حال حاضر پیام‌های زیادی دارند؛ پیام شما ارسال نشد. لطفا چند دقیقه دیگر دوباره بفرستید.")
+        return
+    
+    # پیام فقط یک بار یکسان‌سازی می‌شود
+    user_message = normalize_text(update.message.text)
+    # نسخه محتوا یک بار خوانده می‌شود تا بارگذاری مجدد وسط پردازش اثری نداشته باشد
+    content = CONTENT.current
+    
+    # شماره سفارش (با # یا کلمه سفارش/پیگیری/کد یا در جواب /track) مستقیم استعلام می‌شود؛
+    # اگر سفارشی پیدا نشد پیام مثل بقیه پیام‌ها به سوالات متداول می‌رسد
+    order_id = None
+    if ORDERS is not None:
+        expected = awaiting_order_number(update.effective_user.id)
+        order_id = find_order_number(user_message, expected=expected)
+    if order_id and await reply_order_status(update, order_id, content):
+        return
+    
+    # جستجو در دیتابیس سوالات متداول
+    found_answer = None
+    suggestions = []
+    source = 'keyword'
+    category = content.matcher.best_match(user_message)
+    if not category:
+        source = 'ranked'
+        # اگر کلیدواژه‌ای پیدا نشد، از جستجوی رتبه‌بندی‌شده استفاده می‌کنیم
+        results = content.retriever.search(user_message, k=3)
+        if results and results[0][1] >= ANSWER_MIN_SCORE and (
+                len(results) == 1 or results[0][1] - results[1][1] >= ANSWER_MIN_MARGIN):
+            category = results[0][0]
+        else:
+            suggestions = [topic for topic, score in results if score >= SUGGEST_MIN_SCORE]
+    if category:
+        found_answer = content.answers[category]
+        FAQ_HITS.inc(category, source)
+    else:
+        outcome = 'suggestions' if suggestions else 'not_found'
+        FAQ_MISSES.inc(outcome)
+        if MISS_LOG is not None:
+            MISS_LOG.record(user_message, outcome, suggestions)
+    
+    if found_answer:
+        # اضافه کردن دکمه‌های مرتبط
+        reply_markup = content.keyboards['answer']
+        await reply_parts(update.message, found_answer, reply_markup)
+    elif suggestions:
+        # چند موضوع نزدیک به سوال کاربر
+        keyboard = [[InlineKeyboardButton(topic, callback_data=content.callbacks.encode(topic))] for topic in suggestions]
+        keyboard.append([InlineKeyboardButton("📞 پشتیبانی", callback_data="support"),
+                         InlineKeyboardButton("🏠 منوی اصلی", callback_data="main_menu")])
+        reply_markup = InlineKeyboardMarkup(keyboard)
+        
+        await reply_parts(update.message, content.texts['suggest'], reply_markup)
+    elif order_id:
+        # نه سفارشی پیدا شد و نه سوالی؛ کاربر احتمالا شماره را اشتباه وارد کرده است
+        await reply_parts(
+            update.message, render(f"❌ **سفارشی با شماره {order_id} پیدا نشد!**\n\nلطفا شماره سفارش را بررسی کنید."),
+            content.keyboards['track']
+        )
+    else:
+        # اگر سوال تشخیص داده نشد
+        await reply_parts(update.message, content.texts['not_found'], content.keyboards['not_found'])
+
+async def handle_attachment(update: Update, context: CallbackContext) -> None:
+    """Handler برای پیام‌های غیرمتنی؛ فقط در گفتگوی باز با اپراتور (عکس رسید، فایل، پیام صوتی) استفاده می‌شوند"""
+    remember_user(update.effective_user)
+    desk = context.application.bot_data.get('handoff')
+    ticket = desk.ticket_for(update.effective_user.id) if desk else None
+    if ticket and not desk.submit_copy(ticket, update.message):
+        await update.message.reply_text(
+            "⏳ اپراتورها در حال حاضر پیام‌های زیادی دارند؛ پیام شما ارسال نشد. لطفا چند دقیقه دیگر دوباره بفرستید.")
+
+async def inline_query(update: Update, context: CallbackContext) -> None:
+    """Handler برای جستجوی inline سوالات متداول؛ پاسخ فقط از حافظه"""
+    query = update.inline_query
+    results, next_offset = CONTENT.current.inline.page(query.query, query.offset)
+    await query.answer(results, cache_time=INLINE_CACHE_TIME, next_offset=next_offset)
+
+async def reply_order_status(update: Update, order_id: str, content) -> bool:
+    """پاسخ وضعیت یک سفارش از سرویس فروشگاه؛ False یعنی سفارشی نبود و پاسخی فرستاده نشد"""
+    try:
+        order = await ORDERS.get(order_id)
+    except OrderServiceUnavailable:
+        await reply_parts(update.message, content.texts['orders_unavailable'], content.keyboards['support'])
+        return True
+    
+    if not order:
+        return False
+    
+    status = order.get('status', '')
+    # مقادیر سرویس سفارش مثل نام تیکت‌ها پس از رندر و escape‌شده درج می‌شوند تا
+    # ** یا [..](..) یا تگ HTML در آن‌ها نشانه‌گذاری حساب نشود
+    lines = [f"• وضعیت: {html.escape(str(ORDER_STATUS_LABELS.get(status, status)))}"]
+    for field, label in (('updated_at', 'آخرین به‌روزرسانی'), ('tracking_code', 'کد رهگیری پستی'),
+                         ('eta', 'زمان تقریبی تحویل')):
+        if order.get(field):
+            lines.append(f"• {label}: {html.escape(str(order[field]))}")
+    header = render(f"📦 **وضعیت سفارش {order_id}:**")[0]
+    await reply_parts(update.message, pack([header, '', *lines]), content.keyboards['answer'])
+    return True
+
+# مسیریاب دکمه‌های اینلاین
+CALLBACK_ROUTER = CallbackRouter()
+
+# آخرین متن و کیبورد هر پیام تا ویرایش‌های بی‌تغییر به API نرسند
+RENDERED = MessageRenderCache(int(os.environ.get('RENDER_CACHE_SIZE', '50000')))
+
+async def edit_menu(query, text, reply_markup=None, **kwargs):
+    """ویرایش پیام دکمه فقط اگر متن یا کیبورد آن تغییر کرده باشد؛ text باید رندرشده (HTML) باشد"""
+    kwargs.setdefault('parse_mode', PARSE_MODE)
+    if query.inline_message_id:
+        key = query.inline_message_id
+    else:
+        key = (query.message.chat_id, query.message.message_id)
+    if not RENDERED.changed(key, text, reply_markup):
+        # به callback قبلا در button_handler پاسخ داده شده است
+        EDITS_SKIPPED.inc('cached')
+        return
+    try:
+        await query.edit_message_text(text, reply_markup=reply_markup, **kwargs)
+    except BadRequest as exc:
+        if 'message is not modified' in exc.message.lower():
+            EDITS_SKIPPED.inc('not_modified')
+            return
+        RENDERED.forget(key)
+        raise
+    except Exception:
+        RENDERED.forget(key)
+        raise
+
+async def reply_parts(message, parts, reply_markup=None, **kwargs):
+    """ارسال متن رندرشده (یک یا چند بخش) در پاسخ به پیام؛ کیبورد زیر بخش آخر"""
+    for part in parts[:-1]:
+        await message.reply_text(part, parse_mode=PARSE_MODE, **kwargs)
+    await message.reply_text(parts[-1], reply_markup=reply_markup, parse_mode=PARSE_MODE, **kwargs)
+
+async def show_menu(query, content, key):
+    """نمایش منوی از پیش رندرشده؛ ادامه متن‌های بلند در پیام‌های جداگانه می‌آید"""
+    text, reply_markup = content.menus[key]
+    await edit_menu(query, text, reply_markup)
+    for part in content.overflow.get(key, ()):
+        await query.message.reply_text(part, parse_mode=PARSE_MODE)
+
+def with_name(parts, user):
+    """جایگزینی {name} در متن رندرشده تک‌بخشی با نام escape‌شده کاربر"""
+    return parts[0].replace('{name}', html.escape(user.first_name))
+
+async def button_handler(update: Update, context: CallbackContext) -> None:
+    """Handler برای دکمه‌های اینلاین"""
+    query = update.callback_query
+    await query.answer()
+    remember_user(query.from_user)
+    
+    route, handler = CALLBACK_ROUTER.match(query.data)
+    CALLBACK_ROUTES.inc(route or 'unknown')
+    if handler:
+        await handler(query, context, CONTENT.current)
+    
+@CALLBACK_ROUTER.route(
+    "cat_products", "cat_order", "cat_payment", "cat_shipping", "cat_return",
+    "promotions", "show_promo", "membership", "wallet", "register_member", "charge_wallet",
+    "survey", "notifications"
+)
+async def menu_callback(query, context, content):
+    """نمایش منوهای ثابت از پیش ساخته‌شده"""
+    await show_menu(query, content, query.data)
+    
+@CALLBACK_ROUTER.prefix(TOPIC_PREFIX)
+@CALLBACK_ROUTER.prefix(LEGACY_TOPIC_PREFIX)
+async def faq_callback(query, context, content):
+    """نمایش پاسخ سوالات متداول؛ دکمه‌های قدیمی faq_<عنوان> هم پذیرفته می‌شوند"""
+    data = content.callbacks.canonical(query.data)
+    if data in content.menus:
+        await show_menu(query, content, data)
+    
+@CALLBACK_ROUTER.prefix("survey_")
+async def survey_callback(query, context, content):
+    """ثبت امتیاز نظرسنجی"""
+    if query.data in content.menus:
+        SURVEY_STORE.record(query.from_user.id, query.data[len("survey_"):])
+        await show_menu(query, content, query.data)
+    
+@CALLBACK_ROUTER.route("enable_notifications")
+async def enable_notifications_callback(query, context, content):
+    """عضویت در اطلاع‌رسانی"""
+    SUBSCRIBERS.add(query.message.chat_id if query.message else query.from_user.id)
+    await show_menu(query, content, "enable_notifications")
+    
+@CALLBACK_ROUTER.route("support")
+async def support_route(query, context, content):
+    await support_callback(query, context)
+    
+@CALLBACK_ROUTER.route("ticket_open")
+async def ticket_open_route(query, context, content):
+    """باز کردن تیکت و گفتگو با اپراتور"""
+    ticket, created = await context.application.bot_data['handoff'].open(query.from_user)
+    if ticket is None:
+        await edit_menu(query, content.texts['operators_busy'][0], content.keyboards['support'])
+        return
+    text = f"""
+    💬 **گفتگو با پشتیبانی (تیکت #{ticket['id']})**
+    
+    {'سوال خود را بنویسید؛ پیام‌های شما برای اپراتور فرستاده می‌شود و پاسخ همین‌جا می‌رسد.' if created else 'گفتگوی شما با اپراتور هنوز باز است؛ پیام خود را بنویسید.'}
+    """
+    await edit_menu(query, render(text)[0], content.keyboards['ticket'])
+    
+@CALLBACK_ROUTER.route("ticket_close")
+async def ticket_close_route(query, context, content):
+    """پایان گفتگو با اپراتور توسط کاربر"""
+    desk = context.application.bot_data['handoff']
+    ticket = desk.ticket_for(query.from_user.id)
+    if ticket:
+        await desk.close(ticket, notify_user=False)
+    await edit_menu(query, content.texts['ticket_closed'][0], content.keyboards['main_menu'])
+    
+@CALLBACK_ROUTER.route("info")
+async def info_route(query, context, content):
+    await info_callback(query, context)
+    
+@CALLBACK_ROUTER.route("main_menu")
+async def main_menu_route(query, context, content):
+    await start_callback(query, context)
+
+async def support_callback(update, context):
+    """تابع مشترک برای پشتیبانی"""
+    content = CONTENT.current
+    reply_markup = content.keyboards['support']
     
     if hasattr(update, 'message'):
-        await update.message.reply_text(info_text, reply_markup=reply_markup, disable_web_page_preview=True)
+        await reply_parts(update.message, content.texts['support'], reply_markup)
     else:
-        await update.edit_message_text(info_text, reply_markup=reply_markup, disable_web_page_preview=True)
+        await edit_menu(update, content.texts['support'][0], reply_markup)
+
+async def info_callback(update, context):
+    """تابع مشترک برای اطلاعات فروشگاه"""
+    content = CONTENT.current
+    reply_markup = content.keyboards['info']
+    
+    if hasattr(update, 'message'):
+        await reply_parts(update.message, content.texts['info'], reply_markup, disable_web_page_preview=True)
+    else:
+        await edit_menu(update, content.texts['info'][0], reply_markup, disable_web_page_preview=True)
 
 async def start_callback(update, context):
     """تابع مشترک برای منوی اصلی"""
     user = update.effective_user if hasattr(update, 'effective_user') else update.from_user
     
-    keyboard = [
-        [InlineKeyboardButton("📦 محصولات", callback_data="cat_products"), 
+    content = CONTENT.current
+    reply_markup = content.keyboards['main_menu']
+    welcome_text = with_name(content.texts['main_menu'], user)
+    
+    if hasattr(update, 'message'):
+        await update.message.reply_text(welcome_text, reply_markup=reply_markup, parse_mode=PARSE_MODE)
+    else:
+        await edit_menu(update, welcome_text, reply_markup)
+
+# امتیازهای نظرسنجی: کلید callback ← عنوان نمایشی
+SURVEY_RATINGS = {
+    'excellent': 'عالی 😊',
+    'good': 'خوب 🙂',
+    'avg': 'متوسط 😐',
+    'poor': 'ضعیف ☹️'
+}
+
+def build_views(content):
+    """ساخت کیبوردها و منوهای ثابت؛ برای هر نسخه محتوا یک بار اجرا می‌شود"""
+    keyboards = content.keyboards
+    menus = content.menus
+    topic = content.callbacks.encode
+
+    keyboards['main_menu'] = InlineKeyboardMarkup([
+        [InlineKeyboardButton("📦 محصولات", callback_data="cat_products"),
          InlineKeyboardButton("🛒 سفارش", callback_data="cat_order")],
-        [InlineKeyboardButton("💳 پرداخت", callback_data="cat_payment"), 
+        [InlineKeyboardButton("💳 پرداخت", callback_data="cat_payment"),
          InlineKeyboardButton("🚚 ارسال", callback_data="cat_shipping")],
         [InlineKeyboardButton("↩️ مرجوعی", callback_data="cat_return"),
          InlineKeyboardButton("🎉 تخفیف‌ها", callback_data="promotions")],
@@ -609,35 +643,307 @@ async def start_callback(update, context):
          InlineKeyboardButton("🏠 اطلاعات فروشگاه", callback_data="info")],
         [InlineKeyboardButton("⭐ نظرسنجی", callback_data="survey"),
          InlineKeyboardButton("🔔 اطلاع‌رسانی", callback_data="notifications")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    welcome_text = f"""
-    🏠 **منوی اصلی**
-    
-    سلام {user.first_name} عزیز! 
-    لطفا گزینه مورد نظر را انتخاب کنید:
+    ])
+    keyboards['help'] = InlineKeyboardMarkup([
+        [InlineKeyboardButton("🏠 منوی اصلی", callback_data="main_menu"),
+         InlineKeyboardButton("📞 پشتیبانی", callback_data="support")],
+        [InlineKeyboardButton("🎉 تخفیف‌ها", callback_data="promotions"),
+         InlineKeyboardButton("📦 پیگیری سفارش", callback_data=topic("پیگیری سفارش"))]
+    ])
+    keyboards['promo'] = InlineKeyboardMarkup([
+        [InlineKeyboardButton("👑 عضویت ویژه", callback_data="membership"),
+         InlineKeyboardButton("👛 شارژ کیف پول", callback_data="wallet")],
+        [InlineKeyboardButton("🎁 همه پیشنهادها", callback_data="promotions"),
+         InlineKeyboardButton("🏠 منوی اصلی", callback_data="main_menu")]
+    ])
+    keyboards['track'] = InlineKeyboardMarkup([
+        [InlineKeyboardButton("🔐 حساب کاربری", callback_data=topic("پیگیری سفارش")),
+         InlineKeyboardButton("📞 تماس با پشتیبانی", callback_data="support")],
+        [InlineKeyboardButton("🛒 مشکلات سفارش", callback_data=topic("تاخیر در ارسال")),
+         InlineKeyboardButton("🏠 منوی اصلی", callback_data="main_menu")]
+    ])
+    keyboards['membership'] = InlineKeyboardMarkup([
+        [InlineKeyboardButton("🎉 ثبت نام رایگان", callback_data="register_member"),
+         InlineKeyboardButton("💰 مزایای عضویت", callback_data="benefits")],
+        [InlineKeyboardButton("🏠 منوی اصلی", callback_data="main_menu")]
+    ])
+    keyboards['answer'] = InlineKeyboardMarkup([
+        [InlineKeyboardButton("📞 پشتیبانی", callback_data="support"),
+         InlineKeyboardButton("🏠 منوی اصلی", callback_data="main_menu")]
+    ])
+    keyboards['not_found'] = InlineKeyboardMarkup([
+        [InlineKeyboardButton("📦 محصولات", callback_data="cat_products"),
+         InlineKeyboardButton("🛒 سفارش", callback_data="cat_order")],
+        [InlineKeyboardButton("💳 پرداخت", callback_data="cat_payment"),
+         InlineKeyboardButton("🚚 ارسال", callback_data="cat_shipping")],
+        [InlineKeyboardButton("📞 تماس با اپراتور", callback_data="support"),
+         InlineKeyboardButton("🏠 منوی اصلی", callback_data="main_menu")]
+    ])
+    keyboards['support'] = InlineKeyboardMarkup([
+        [InlineKeyboardButton("💬 گفتگو با اپراتور", callback_data="ticket_open")],
+        [InlineKeyboardButton("🛒 مشکلات سفارش", callback_data=topic("تاخیر در ارسال")),
+         InlineKeyboardButton("💳 مشکلات پرداخت", callback_data=topic("پرداخت ناموفق"))],
+        [InlineKeyboardButton("🏠 منوی اصلی", callback_data="main_menu"),
+         InlineKeyboardButton("↩️ درخواست مرجوعی", callback_data="cat_return")]
+    ])
+    keyboards['ticket'] = InlineKeyboardMarkup([
+        [InlineKeyboardButton("✅ پایان گفتگو", callback_data="ticket_close")]
+    ])
+    keyboards['info'] = InlineKeyboardMarkup([
+        [InlineKeyboardButton("📞 تماس سریع", callback_data="support"),
+         InlineKeyboardButton("🗺️ مسیریابی", url="https://maps.google.com")],
+        [InlineKeyboardButton("🏠 منوی اصلی", callback_data="main_menu")]
+    ])
+
+    # دسته‌بندی محصولات
+    menus['cat_products'] = (
+        "📦 **دسته‌بندی محصولات**\n\nلطفا موضوع مورد نظر را انتخاب کنید:",
+        InlineKeyboardMarkup([
+            [InlineKeyboardButton("📦 موجودی محصول", callback_data=topic("موجودی محصول")),
+             InlineKeyboardButton("🛡️ گارانتی", callback_data=topic("گارانتی محصولات"))],
+            [InlineKeyboardButton("📋 مشخصات محصول", callback_data=topic("مشخصات محصول")),
+             InlineKeyboardButton("✅ اصالت محصول", callback_data=topic("اصالت محصول"))],
+            [InlineKeyboardButton("🔧 تست محصول", callback_data=topic("تست محصول"))],
+            [InlineKeyboardButton("🔙 بازگشت", callback_data="main_menu"),
+             InlineKeyboardButton("📞 پشتیبانی", callback_data="support")]
+        ])
+    )
+
+    # دسته‌بندی سفارش
+    menus['cat_order'] = (
+        "🛒 **دسته‌بندی سفارش**\n\nلطفا موضوع مورد نظر را انتخاب کنید:",
+        InlineKeyboardMarkup([
+            [InlineKeyboardButton("🛒 ثبت سفارش", callback_data=topic("ثبت سفارش")),
+             InlineKeyboardButton("✏️ تغییر سفارش", callback_data=topic("تغییر سفارش"))],
+            [InlineKeyboardButton("📦 پیگیری سفارش", callback_data=topic("پیگیری سفارش")),
+             InlineKeyboardButton("⏳ تاخیر در ارسال", callback_data=topic("تاخیر در ارسال"))],
+            [InlineKeyboardButton("🎁 سفارش برای دیگران", callback_data=topic("سفارش برای دیگران")),
+             InlineKeyboardButton("📞 سفارش تلفنی", callback_data=topic("سفارش تلفنی"))],
+            [InlineKeyboardButton("🔙 بازگشت", callback_data="main_menu"),
+             InlineKeyboardButton("📞 پشتیبانی", callback_data="support")]
+        ])
+    )
+
+    # دسته‌بندی پرداخت
+    menus['cat_payment'] = (
+        "💳 **دسته‌بندی پرداخت**\n\nلطفا موضوع مورد نظر را انتخاب کنید:",
+        InlineKeyboardMarkup([
+            [InlineKeyboardButton("💳 روش پرداخت", callback_data=topic("روش پرداخت")),
+             InlineKeyboardButton("🔒 امنیت پرداخت", callback_data=topic("امنیت پرداخت"))],
+            [InlineKeyboardButton("❌ پرداخت ناموفق", callback_data=topic("پرداخت ناموفق")),
+             InlineKeyboardButton("📅 پرداخت قسطی", callback_data=topic("پرداخت قسطی"))],
+            [InlineKeyboardButton("🧾 رسید پرداخت", callback_data=topic("رسید پرداخت"))],
+            [InlineKeyboardButton("🔙 بازگشت", callback_data="main_menu"),
+             InlineKeyboardButton("📞 پشتیبانی", callback_data="support")]
+        ])
+    )
+
+    # دسته‌بندی ارسال
+    menus['cat_shipping'] = (
+        "🚚 **دسته‌بندی ارسال و تحویل**\n\nلطفا موضوع مورد نظر را انتخاب کنید:",
+        InlineKeyboardMarkup([
+            [InlineKeyboardButton("⏱️ زمان تحویل", callback_data=topic("زمان تحویل")),
+             InlineKeyboardButton("💰 هزینه ارسال", callback_data=topic("هزینه ارسال"))],
+            [InlineKeyboardButton("🏠 تغییر آدرس", callback_data=topic("تغییر آدرس")),
+             InlineKeyboardButton("⚡ تحویل فوری", callback_data=topic("تحویل فوری"))],
+            [InlineKeyboardButton("🚨 محصول آسیب دیده", callback_data=topic("محصول آسیب دیده"))],
+            [InlineKeyboardButton("🔙 بازگشت", callback_data="main_menu"),
+             InlineKeyboardButton("📞 پشتیبانی", callback_data="support")]
+        ])
+    )
+
+    # دسته‌بندی مرجوعی
+    menus['cat_return'] = (
+        "↩️ **دسته‌بندی مرجوعی و بازگشت کالا**\n\nلطفا موضوع مورد نظر را انتخاب کنید:",
+        InlineKeyboardMarkup([
+            [InlineKeyboardButton("↩️ شرایط مرجوعی", callback_data=topic("شرایط مرجوعی")),
+             InlineKeyboardButton("📋 روش مرجوعی", callback_data=topic("روش مرجوعی"))],
+            [InlineKeyboardButton("💸 زمان بازگشت وجه", callback_data=topic("زمان بازگشت وجه"))],
+            [InlineKeyboardButton("🔙 بازگشت", callback_data="main_menu"),
+             InlineKeyboardButton("📞 پشتیبانی", callback_data="support")]
+        ])
+    )
+
+    # پاسخ سوالات متداول
+    for category, data in content.faq.items():
+        parent = content.callbacks.parent(category)
+        if parent not in menus and parent != "main_menu":
+            logger.warning("منوی والد %s برای موضوع %s وجود ندارد", parent, category)
+            parent = "main_menu"
+        menus[topic(category)] = (data['answer'], InlineKeyboardMarkup([
+            [InlineKeyboardButton("🔙 بازگشت", callback_data=parent),
+             InlineKeyboardButton("📞 پشتیبانی", callback_data="support")],
+            [InlineKeyboardButton("🏠 منوی اصلی", callback_data="main_menu")]
+        ]))
+
+    # بخش پیشنهادات و تخفیف‌ها (منوی پیشنهادهای فعال در build_promotion_views)
+    menus['membership'] = (content.promotions['عضویت ویژه'], InlineKeyboardMarkup([
+        [InlineKeyboardButton("🎉 ثبت نام", callback_data="register_member")],
+        [InlineKeyboardButton("🔙 بازگشت", callback_data="promotions")]
+    ]))
+    menus['wallet'] = (content.promotions['شارژ کیف پول'], InlineKeyboardMarkup([
+        [InlineKeyboardButton("💳 شارژ کن", callback_data="charge_wallet")],
+        [InlineKeyboardButton("🔙 بازگشت", callback_data="promotions")]
+    ]))
+    menus['register_member'] = menus['charge_wallet'] = (
+        "✅ برای تکمیل فرآیند، لطفا با پشتیبانی تماس بگیرید:\n\n📞 021-12345678\n👤 @ghbyhbjvhjguboijbot",
+        InlineKeyboardMarkup([
+            [InlineKeyboardButton("📞 تماس", callback_data="support")],
+            [InlineKeyboardButton("🏠 منوی اصلی", callback_data="main_menu")]
+        ])
+    )
+
+    # نظرسنجی
+    menus['survey'] = (
+        "⭐ **نظرسنجی رضایت از خدمات**\n\nلطفا میزان رضایت خود را انتخاب کنید:",
+        InlineKeyboardMarkup([
+            [InlineKeyboardButton("😊 عالی", callback_data="survey_excellent"),
+             InlineKeyboardButton("🙂 خوب", callback_data="survey_good")],
+            [InlineKeyboardButton("😐 متوسط", callback_data="survey_avg"),
+             InlineKeyboardButton("☹️ ضعیف", callback_data="survey_poor")],
+            [InlineKeyboardButton("🔙 بازگشت", callback_data="main_menu")]
+        ])
+    )
+    survey_done = InlineKeyboardMarkup([
+        [InlineKeyboardButton("🏠 منوی اصلی", callback_data="main_menu"),
+         InlineKeyboardButton("📞 پیشنهاد جدید", callback_data="support")]
+    ])
+    for rating, title in SURVEY_RATINGS.items():
+        menus[f"survey_{rating}"] = (
+            f"✅ **با تشکر از شما!**\n\nامتیاز شما: {title}\n\nنظر شما با موفقیت ثبت شد. برای بهبود خدمات از پیشنهادات شما استفاده خواهیم کرد.",
+            survey_done
+        )
+
+    # اطلاع‌رسانی
+    menus['notifications'] = (
+        "🔔 **سرویس اطلاع‌رسانی**\n\nبرای دریافت اطلاعیه‌های زیر عضو شوید:\n• 📦 وضعیت سفارش\n• 🎉 تخفیف‌های ویژه\n• 🔔 محصولات جدید\n• ⚡ اطلاع‌رسانی فوری",
+        InlineKeyboardMarkup([
+            [InlineKeyboardButton("✅ فعال کردن", callback_data="enable_notifications")],
+            [InlineKeyboardButton("🔙 بازگشت", callback_data="main_menu")]
+        ])
+    )
+    menus['enable_notifications'] = (
+        "✅ **سرویس اطلاع‌رسانی فعال شد!**\n\nاز این پس از آخرین اخبار و تخفیف‌ها مطلع خواهید شد.",
+        InlineKeyboardMarkup([
+            [InlineKeyboardButton("🏠 منوی اصلی", callback_data="main_menu")]
+        ])
+    )
+
+    # رندر یک‌باره همه متن‌ها به HTML تلگرام (حذف تورفتگی، escape و تقسیم متن‌های بلند)
+    for name, text in (
+            ('welcome', WELCOME_TEXT), ('help', HELP_TEXT), ('track', TRACK_TEXT), ('support', SUPPORT_TEXT),
+            ('info', INFO_TEXT), ('main_menu', MAIN_MENU_TEXT), ('not_found', NOT_FOUND_TEXT),
+            ('suggest', SUGGEST_TEXT), ('orders_unavailable', ORDERS_UNAVAILABLE_TEXT),
+            ('operators_busy', OPERATORS_BUSY_TEXT), ('ticket_closed', TICKET_CLOSED_TEXT)):
+        content.texts[name] = render(text)
+    for category, data in content.faq.items():
+        content.answers[category] = render(data['answer'])
+    for title, text in content.promotions.items():
+        content.promotion_texts[title] = render(text)
+    for key, (text, reply_markup) in menus.items():
+        parts = render(text)
+        menus[key] = (parts[0], reply_markup)
+        if len(parts) > 1:
+            content.overflow[key] = parts[1:]
+    build_promotion_views(content)
+
+    # نتایج جستجوی inline
+    content.inline = InlineFAQSearch(content, page_size=INLINE_PAGE_SIZE)
+
+def build_promotion_views(content):
+    """منوها و متن پیشنهادهای فعال؛ هنگام ساخت نسخه و روی copy نسخه با هر باز یا بسته شدن بازه‌ها اجرا می‌شود
+
+    پیشنهادهای زمان‌دار فعال و پس از آن پیشنهاد دائمی STANDING_PROMOTION نمایش داده
+    می‌شوند؛ مهلت هر پیشنهاد به منطقه زمانی نوشته‌شده در فایل محتوا است.
     """
-    
-    if hasattr(update, 'message'):
-        await update.message.reply_text(welcome_text, reply_markup=reply_markup)
-    else:
-        await update.edit_message_text(welcome_text, reply_markup=reply_markup)
-
-def get_category_back(category):
-    """تعیین دسته بازگشت بر اساس موضوع"""
-    if "محصول" in category:
-        return "cat_products"
-    elif "سفارش" in category or "تاخیر" in category:
-        return "cat_order"
-    elif "پرداخت" in category:
-        return "cat_payment"
-    elif "ارسال" in category or "تحویل" in category:
-        return "cat_shipping"
-    elif "مرجوع" in category or "بازگشت" in category:
-        return "cat_return"
+    active = content.schedule.active
+    texts = [
+        content.promotions[window['title']] + (
+            f"\n⏳ مهلت: تا {datetime.fromtimestamp(window['end'], window['tzinfo']):%Y-%m-%d %H:%M}"
+            if window['end'] else "")
+        for window in active
+    ]
+    if STANDING_PROMOTION in content.promotions and STANDING_PROMOTION not in content.timed:
+        texts.append(content.promotions[STANDING_PROMOTION])
+    parts = render("\n\n".join(texts) if texts else NO_PROMOTION_TEXT)
+    label = f"🎉 {active[0]['title']}" if len(active) == 1 else \
+        f"🎉 پیشنهادهای فعال ({len(active)})" if active else "🎉 تخفیف ویژه"
+    promotions_menu = (render("🎊 **پیشنهادات ویژه و تخفیف‌ها**\n\nلطفا گزینه مورد نظر را انتخاب کنید:")[0],
+        InlineKeyboardMarkup([
+            [InlineKeyboardButton(label, callback_data="show_promo"),
+             InlineKeyboardButton("👑 عضویت ویژه", callback_data="membership")],
+            [InlineKeyboardButton("👛 شارژ کیف پول", callback_data="wallet"),
+             InlineKeyboardButton("⭐ نظرسنجی", callback_data="survey")],
+            [InlineKeyboardButton("🔙 بازگشت", callback_data="main_menu")]
+        ]))
+    show_promo = (parts[0], InlineKeyboardMarkup([
+        [InlineKeyboardButton("🔙 بازگشت", callback_data="promotions")]
+    ]))
+    content.texts['promo'] = parts
+    content.menus['promotions'] = promotions_menu
+    content.menus['show_promo'] = show_promo
+    if len(parts) > 1:
+        content.overflow['show_promo'] = parts[1:]
     else:
-        return "main_menu"
+        content.overflow.pop('show_promo', None)
+
+async def refresh_promotions(application, now=None):
+    """انتشار نسخه جدید محتوا با باز و بسته شدن بازه پیشنهادها و ارسال پیشنهادهای تازه به مشترکین
+
+    نسخه فعلی تغییر نمی‌کند: تغییرات روی copy آن اعمال و با CONTENT.replace منتشر
+    می‌شود، پس بارگذاری مجدد هم‌زمان نه از دست می‌رود و نه نسخه نیمه‌ساخته دیده می‌شود.
+    هر پیشنهاد با کلید (عنوان، زمان شروع) فقط یک بار ارسال می‌شود، حتی با چند کارگر یا
+    پس از بارگذاری مجدد محتوا و راه‌اندازی دوباره ربات.
+    """
+    now = time.time() if now is None else now
+
+    def advance(current):
+        next_change = current.schedule.next_change()
+        if next_change is None or next_change > now:
+            return None
+        content = current.copy()
+        opened, closed = content.schedule.advance(now)
+        build_promotion_views(content)
+        logger.info("پیشنهادهای زمان‌دار: باز شد %s، بسته شد %s",
+                    [window['title'] for window in opened], [window['title'] for window in closed])
+        return content
+
+    content = CONTENT.replace(advance)
+
+    broadcaster = application.bot_data.get('broadcaster')
+    if broadcaster is None:
+        return
+    pushed = application.bot_data.setdefault('pushed_promotions', set())
+    for window in content.schedule.active:
+        key = f"promotion:{window['title']}:{window['start']:.0f}"
+        if window['audience'] != 'subscribers' or key in pushed or now - window['start'] > PROMOTION_PUSH_GRACE:
+            continue
+        pushed.add(key)
+        # متن‌های بلندتر از یک پیام فقط تا سقف یک پیام همگانی فرستاده می‌شوند
+        job = await broadcaster.start(
+            content.promotion_texts[window['title']][0], reply_markup=content.keyboards['promo'], key=key)
+        if job is not None:
+            logger.info("ارسال پیشنهاد %s به %d مشترک شروع شد (ارسال %d)", window['title'], job['total'], job['id'])
+
+async def promotion_job(context: CallbackContext) -> None:
+    """کار JobQueue: به‌روزرسانی پیشنهادهای فعال و زمان‌بندی خودش برای تغییر بعدی"""
+    try:
+        await refresh_promotions(context.application)
+    finally:
+        schedule_promotions(context.job_queue)
+
+def schedule_promotions(job_queue, delay=None):
+    """زمان‌بندی promotion_job برای نزدیک‌ترین شروع یا پایان (حداکثر PROMOTION_RESYNC_INTERVAL بعد)"""
+    if delay is None:
+        next_change = CONTENT.current.schedule.next_change()
+        delay = PROMOTION_RESYNC_INTERVAL if next_change is None else \
+            min(max(next_change - time.time(), 0), PROMOTION_RESYNC_INTERVAL)
+    for job in job_queue.get_jobs_by_name('promotions'):
+        job.schedule_removal()
+    job_queue.run_once(promotion_job, delay, name='promotions')
+
+# محتوای فعلی ربات؛ handlerها همیشه از CONTENT.current می‌خوانند
+CONTENT = ContentStore(CONTENT_PATH, view_builder=build_views)
 
 async def admin_stats(update: Update, context: CallbackContext) -> None:
     """دستور برای مشاهده آمار توسط ادمین"""
@@ -645,63 +951,320 @@ async def admin_stats(update: Update, context: CallbackContext) -> None:
         await update.message.reply_text("❌ دسترسی denied!")
         return
     
+    content = CONTENT.current
+    desk = context.application.bot_data.get('handoff')
+    uptime = timedelta(seconds=int(time.time() - METRICS.started))
+    
+    # پرتکرارترین موضوعات پاسخ داده‌شده
+    topic_hits = {}
+    for (topic, source), count in FAQ_HITS.values.items():
+        topic_hits[topic] = topic_hits.get(topic, 0) + count
+    top_topics = sorted(topic_hits.items(), key=lambda item: -item[1])[:5]
+    topics_text = "\n".join(f"    • {topic}: {count:g}" for topic, count in top_topics) or "    • هنوز سوالی پاسخ داده نشده"
+    
+    handlers_text = "\n".join(
+        f"    • {name}: p50={HANDLER_LATENCY.quantile(0.5, name) * 1000:g}ms "
+        f"p99={HANDLER_LATENCY.quantile(0.99, name) * 1000:g}ms ({HANDLER_LATENCY.count(name)})"
+        for (name,) in sorted(HANDLER_LATENCY.series)
+    ) or "    • -"
+    api_text = "\n".join(
+        f"    • {endpoint}: p50={API_LATENCY.quantile(0.5, endpoint) * 1000:g}ms "
+        f"p99={API_LATENCY.quantile(0.99, endpoint) * 1000:g}ms ({API_LATENCY.count(endpoint)})"
+        for (endpoint,) in sorted(API_LATENCY.series)
+    ) or "    • -"
+    
+    survey_totals = SURVEY_STORE.totals()
+    survey_today = SURVEY_STORE.day()
+    survey_text = "\n".join(
+        f"    • {label}: {survey_totals.get(rating, 0)} (امروز: {survey_today.get(rating, 0)})"
+        for rating, label in SURVEY_RATINGS.items()
+    )
+    
     stats_text = f"""
     📊 **آمار کامل ربات:**
     
     • ✅ وضعیت: فعال و آنلاین
-    • 🕒 آخرین فعالیت: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
-    • 🚀 میزبان: Railway
-    • 📝 تعداد سوالات: {len(FAQ_DATABASE)} موضوع
-    • 🎉 تعداد پیشنهادات: {len(PROMOTIONS)} مورد
-    • 🏪 محیط: Production
-    
-    **📈 امکانات ربات:**
-    • دسته‌بندی‌های کامل
-    • سیستم نظرسنجی
-    • پیشنهادات ویژه
-    • پشتیبانی 24/7
-    • اطلاع‌رسانی هوشمند
-    
-    🤖 ربات در حال اجراست و آماده پاسخگویی!
+    • ⏱ مدت اجرا: {uptime}
+    • 📥 آپدیت‌ها: {UPDATES.total():g} (دقیقه اخیر: {UPDATE_RATE.rate() * 60:.0f} در دقیقه)
+    • 📬 صف پردازش: {context.application.update_queue.qsize()}
+    • 📤 صف ارسال: {getattr(context.bot.request, 'queue_depth', 0)} (انتظار p99: {OUTBOUND_WAIT.quantile(0.99, 'interactive') * 1000:g}ms)
+    • 📝 تعداد سوالات: {len(content.faq)} موضوع
+    • 🎉 تعداد پیشنهادات: {len(content.promotions)} مورد (زمان‌دار فعال: {len(content.schedule.active)} از {len(content.schedule)})
+    • 🔔 مشترکین اطلاع‌رسانی: {len(SUBSCRIBERS)}
+    • 🎫 تیکت‌های باز: {len(desk) if desk else 0} (صف اپراتورها: {desk.queue_depth() if desk else 0})
+    • 🔄 نسخه محتوا: {content.version}
+    
+    **🎯 پاسخ‌ها:**
+    • پاسخ داده‌شده: {FAQ_HITS.total():g}
+    • پیشنهاد موضوع: {FAQ_MISSES.values.get(('suggestions',), 0):g}
+    • تشخیص داده‌نشده: {FAQ_MISSES.values.get(('not_found',), 0):g}
+{topics_text}
+    
+    **⭐ نظرسنجی ({sum(survey_totals.values())} رای):**
+{survey_text}
+    
+    **⚡ زمان پاسخ handlerها:**
+{handlers_text}
+    
+    **🌐 Bot API:**
+{api_text}
+    • خطاها: {API_ERRORS.total():g}
     """
     
-    await update.message.reply_text(stats_text)
+    await reply_parts(update.message, render(stats_text))
+
+async def broadcast_command(update: Update, context: CallbackContext) -> None:
+    """ارسال همگانی یک پیشنهاد به همه مشترکین توسط ادمین: /broadcast <عنوان پیشنهاد>"""
+    if update.effective_user.id != ADMIN_ID:
+        await update.message.reply_text("❌ دسترسی denied!")
+        return
+    
+    content = CONTENT.current
+    broadcaster = context.application.bot_data['broadcaster']
+    title = " ".join(context.args)
+    if title not in content.promotions:
+        running = "\n".join(
+            f"• ارسال {job['id']}: {job['sent'] + job['failed'] + job['removed']} از {job['total']}"
+            for job, task in broadcaster.active.values()
+        ) or "• ارسال فعالی وجود ندارد"
+        titles = "\n".join(f"• {title}" for title in content.promotions)
+        await reply_parts(update.message, render(
+            f"📣 **ارسال همگانی**\n\nاستفاده: /broadcast <عنوان پیشنهاد>\n\n"
+            f"تعداد مشترکین: {len(SUBSCRIBERS)}\n\nپیشنهادها:\n{titles}\n\nوضعیت:\n{running}"
+        ))
+        return
+    
+    # متن‌های بلندتر از یک پیام فقط تا سقف یک پیام همگانی فرستاده می‌شوند
+    job = await broadcaster.start(content.promotion_texts[title][0], reply_markup=content.keyboards['promo'])
+    await update.message.reply_text(f"📣 ارسال همگانی {job['id']} برای {job['total']} مشترک شروع شد.")
+
+async def operator_reply(update: Update, context: CallbackContext) -> None:
+    """پاسخ اپراتور با reply روی پیام تیکت به کاربر فرستاده می‌شود"""
+    message = update.message
+    desk = context.application.bot_data['handoff']
+    ticket = await desk.ticket_of(message.chat_id, message.reply_to_message.message_id)
+    if ticket is None:
+        # reply روی پیامی غیر از تیکت‌ها؛ مثل پیام عادی پاسخ داده می‌شود
+        if message.text:
+            await handle_message(update, context)
+        return
+    if ticket['status'] != 'open':
+        await message.reply_text(f"❗️ تیکت #{ticket['id']} بسته شده است.")
+    elif not await desk.reply(ticket, message):
+        await message.reply_text(f"❗️ کاربر تیکت #{ticket['id']} در دسترس نیست؛ تیکت بسته شد.")
+
+async def close_ticket_command(update: Update, context: CallbackContext) -> None:
+    """بستن تیکت توسط اپراتور همان تیکت یا ادمین: reply روی پیام تیکت با /close یا /close <شماره تیکت>"""
+    user_id = update.effective_user.id
+    if user_id not in OPERATOR_IDS and user_id != ADMIN_ID:
+        await update.message.reply_text("❌ دسترسی denied!")
+        return
+    
+    desk = context.application.bot_data['handoff']
+    message = update.message
+    ticket = None
+    if context.args and context.args[0].lstrip('#').isdigit():
+        ticket = await asyncio.to_thread(desk.store.get, int(context.args[0].lstrip('#')))
+    elif message.reply_to_message:
+        ticket = await desk.ticket_of(message.chat_id, message.reply_to_message.message_id)
+    if ticket is None:
+        await message.reply_text("استفاده: روی پیام تیکت reply کنید و /close بفرستید، یا /close <شماره تیکت>")
+    elif ticket['operator_id'] != user_id and user_id != ADMIN_ID:
+        await message.reply_text(f"❌ تیکت #{ticket['id']} به اپراتور دیگری سپرده شده است.")
+    elif not await desk.close(ticket):
+        await message.reply_text(f"❗️ تیکت #{ticket['id']} از قبل بسته بوده است.")
+
+async def tickets_command(update: Update, context: CallbackContext) -> None:
+    """فهرست تیکت‌های باز اپراتور (برای ادمین همه تیکت‌ها)"""
+    user_id = update.effective_user.id
+    if user_id not in OPERATOR_IDS and user_id != ADMIN_ID:
+        await update.message.reply_text("❌ دسترسی denied!")
+        return
+    
+    tickets = await asyncio.to_thread(TICKETS.open_tickets, None if user_id == ADMIN_ID else user_id)
+    # نام‌ها را کاربران انتخاب کرده‌اند: مثل with_name پس از رندر و escape‌شده درج می‌شوند تا
+    # ** یا [..](..) در نام نشانه‌گذاری حساب نشود
+    lines = [
+        f"• #{ticket['id']} {html.escape(ticket['name'])} (اپراتور {ticket['operator_id']}، "
+        f"{timedelta(seconds=int(time.time() - ticket['created_at']))})"
+        for ticket in tickets[:50]
+    ] or ["• تیکت بازی وجود ندارد"]
+    header = render(f"🎫 **تیکت‌های باز ({len(tickets)}):**")[0]
+    await reply_parts(update.message, pack([header, '', *lines]))
 
 async def error_handler(update: Update, context: CallbackContext) -> None:
-    """Handler برای خطاها"""
-    logger.error(f"خطا رخ داد: {context.error}")
+    """Handler برای خطاها؛ traceback کامل و مشخصات آپدیت ثبت می‌شود"""
+    fields = {}
+    if isinstance(update, Update):
+        fields = update_context(update)
+        fields['update'] = update.to_dict()
+    logger.error("خطا رخ داد (آپدیت %s): %s", fields.get('update_id'), context.error,
+                 exc_info=context.error, extra=fields)
 
-def main() -> None:
-    """تابع اصلی برای اجرای ربات"""
-    # ایجاد اپلیکیشن
-    application = Application.builder().token(BOT_TOKEN).build()
+async def count_update(update: Update, context: CallbackContext) -> None:
+    """شمارش همه آپدیت‌های ورودی بر اساس نوع"""
+    if isinstance(update, Update):
+        kind = 'callback_query' if update.callback_query else 'message' if update.message else \
+            'inline_query' if update.inline_query else 'other'
+    else:
+        kind = 'other'
+    UPDATES.inc(kind)
+    UPDATE_RATE.mark()
+
+async def post_init(application: Application) -> None:
+    """شروع کارهای پس‌زمینه: پایش فایل محتوا و flush اطلاعات کاربران"""
+    METRICS.gauge('bot_update_queue_depth', 'Updates waiting in update_queue', application.update_queue.qsize)
+    broadcaster = application.bot_data['broadcaster'] = Broadcaster(
+        application.bot, SUBSCRIBERS, rate=BROADCAST_RATE, workers=BROADCAST_WORKERS, report_to=ADMIN_ID,
+        parse_mode=PARSE_MODE
+    )
+    desk = application.bot_data['handoff'] = HandoffDesk(
+        application.bot, TICKETS, OPERATOR_IDS, max_per_operator=HANDOFF_MAX_PER_OPERATOR, queue_size=HANDOFF_QUEUE_SIZE
+    )
+    await desk.start()
+    application.bot_data['background_tasks'] = [
+        asyncio.create_task(broadcaster.resume_forever()),
+        asyncio.create_task(CONTENT.watch(CONTENT_RELOAD_INTERVAL)),
+        asyncio.create_task(maintain(USER_STORE, USER_FLUSH_INTERVAL, USER_SESSION_TTL)),
+        asyncio.create_task(flush_periodically(SURVEY_STORE, USER_FLUSH_INTERVAL, "ثبت نتایج نظرسنجی")),
+    ]
+    if MISS_LOG is not None:
+        application.bot_data['background_tasks'].append(
+            asyncio.create_task(flush_periodically(MISS_LOG, USER_FLUSH_INTERVAL, "ثبت سوالات بی‌پاسخ"))
+        )
+    if RECORDER is not None:
+        application.bot_data['background_tasks'].append(
+            asyncio.create_task(flush_periodically(RECORDER, RECORD_FLUSH_INTERVAL, "ضبط آپدیت‌ها"))
+        )
+    if METRICS_PORT and BOT_MODE != 'webhook':
+        application.bot_data['background_tasks'].append(
+            asyncio.create_task(serve_metrics(METRICS_PORT, token=METRICS_TOKEN)))
+    # اولین اجرا بلافاصله: پیشنهادهایی که هنگام خاموش بودن ربات باز شده‌اند هم بررسی می‌شوند
+    if application.job_queue is not None:
+        schedule_promotions(application.job_queue, delay=0)
+    else:
+        logger.warning("JobQueue در دسترس نیست (python-telegram-bot[job-queue])؛ "
+                       "پیشنهادهای زمان‌دار فقط هنگام بارگذاری محتوا به‌روز می‌شوند")
+
+async def post_stop(application: Application) -> None:
+    """توقف کارهای پس‌زمینه و نوشتن تغییرات باقی‌مانده"""
+    if 'broadcaster' in application.bot_data:
+        await application.bot_data['broadcaster'].stop()
+    if 'handoff' in application.bot_data:
+        await application.bot_data['handoff'].stop()
+    if ORDERS is not None:
+        await ORDERS.close()
+    tasks = application.bot_data.pop('background_tasks', [])
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+def bot_api_request(pool_size):
+    """لایه HTTP تنظیم‌شده برای Bot API با تنظیمات BOT_API_*"""
+    return TunedHTTPXRequest(
+        pool_size=pool_size, keepalive_expiry=BOT_API_KEEPALIVE_EXPIRY, connect_timeout=BOT_API_CONNECT_TIMEOUT,
+        read_timeout=BOT_API_READ_TIMEOUT, write_timeout=BOT_API_WRITE_TIMEOUT, pool_timeout=BOT_API_POOL_TIMEOUT,
+        http2=BOT_API_HTTP2
+    )
+
+def build_application(request=None, concurrency=None, outbound_limits=True, inbound_limits=True) -> Application:
+    """ساخت اپلیکیشن و ثبت handlerها
+
+    request اختیاری برای جایگزینی لایه HTTP (مثلا API جعلی در تست بار) است.
+    concurrency تعداد آپدیت‌های هم‌زمان است (پیش‌فرض CONCURRENT_UPDATES).
+    outbound_limits=False و inbound_limits=False زمان‌بندی ارسال و محدودیت ورودی کاربران را
+    حذف می‌کنند (برای سنجش سرعت پردازش).
+    """
+    if concurrency is None:
+        concurrency = CONCURRENT_UPDATES
+    builder = Application.builder().token(BOT_TOKEN).post_init(post_init).post_stop(post_stop)
+    # زمان و خطای هر فراخوانی Bot API ثبت می‌شود؛ ارسال پیام‌ها زیر سقف تلگرام زمان‌بندی می‌شود
+    bot_request = InstrumentedRequest(request or bot_api_request(BOT_API_POOL_SIZE))
+    METRICS.gauge('bot_api_in_flight_requests', 'Bot API calls waiting for a connection or a response',
+                  lambda: bot_request.in_flight)
+    if outbound_limits:
+        bot_request = ScheduledRequest(
+            bot_request, global_rate=OUTBOUND_GLOBAL_RATE / max(1, BOT_WORKERS), chat_rate=OUTBOUND_CHAT_RATE
+        )
+    builder = builder.request(bot_request)
+    # long polling یک اتصال جداگانه دارد تا هیچ‌وقت پشت ارسال‌ها در صف pool نماند
+    builder = builder.get_updates_request(InstrumentedRequest(request or bot_api_request(1)))
+    if concurrency > 1:
+        builder = builder.concurrent_updates(ChatOrderedUpdateProcessor(concurrency))
+    application = builder.build()
+    
+    # ضبط و شمارش آپدیت‌ها پیش از همه handlerها، سپس محدودیت ورودی هر کاربر
+    if RECORDER is not None:
+        application.add_handler(TypeHandler(Update, RECORDER), group=-3)
+    application.add_handler(TypeHandler(object, count_update), group=-2)
+    if inbound_limits:
+        throttle = InboundThrottle(
+            rate=INBOUND_RATE, burst=INBOUND_BURST, duplicate_window=DUPLICATE_TAP_WINDOW,
+            exempt={ADMIN_ID, *OPERATOR_IDS}
+        )
+        application.add_handler(TypeHandler(Update, throttle), group=-1)
     
     # اضافه کردن handlers
-    application.add_handler(CommandHandler("start", start))
-    application.add_handler(CommandHandler("help", help_command))
-    application.add_handler(CommandHandler("promo", promo_command))
-    application.add_handler(CommandHandler("track", track_command))
-    application.add_handler(CommandHandler("membership", membership_command))
-    application.add_handler(CommandHandler("support", support_command))
-    application.add_handler(CommandHandler("stats", admin_stats))
+    application.add_handler(CommandHandler("start", instrument(start)))
+    application.add_handler(CommandHandler("help", instrument(help_command)))
+    application.add_handler(CommandHandler("promo", instrument(promo_command)))
+    application.add_handler(CommandHandler("track", instrument(track_command)))
+    application.add_handler(CommandHandler("membership", instrument(membership_command)))
+    application.add_handler(CommandHandler("support", instrument(support_command)))
+    application.add_handler(CommandHandler("stats", instrument(admin_stats)))
+    application.add_handler(CommandHandler("broadcast", instrument(broadcast_command)))
+    application.add_handler(CommandHandler("close", instrument(close_ticket_command)))
+    application.add_handler(CommandHandler("tickets", instrument(tickets_command)))
     
-    application.add_handler(CallbackQueryHandler(button_handler))
-    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
+    application.add_handler(CallbackQueryHandler(instrument(button_handler)))
+    # reply اپراتورها پیش از پیام‌های عادی بررسی می‌شود
+    application.add_handler(MessageHandler(
+        filters.REPLY & filters.User(OPERATOR_IDS) & ~filters.COMMAND, instrument(operator_reply)
+    ))
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, instrument(handle_message)))
+    application.add_handler(MessageHandler(
+        filters.ChatType.PRIVATE & ~filters.TEXT & ~filters.COMMAND & ~filters.StatusUpdate.ALL, instrument(handle_attachment)
+    ))
+    application.add_handler(InlineQueryHandler(instrument(inline_query)))
     
     # اضافه کردن handler خطا
     application.add_error_handler(error_handler)
-    
+    return application
+
+# اپلیکیشن ASGI برای حالت وب‌هوک (gunicorn main:app)
+app = WebhookApp(
+    build_application, secret_token=WEBHOOK_SECRET, path=WEBHOOK_PATH, webhook_url=WEBHOOK_URL,
+    dispatcher=ShardedDispatcher(BOT_WORKERS, build_application) if BOT_WORKERS > 1 else None,
+    metrics=METRICS, metrics_token=METRICS_TOKEN
+)
+
+def main() -> None:
+    """تابع اصلی برای اجرای ربات"""
     # اجرای ربات
-    print("🤖 ربات در حال اجراست...")
-    print(f"✅ توکن: {BOT_TOKEN[:10]}...")
-    print(f"✅ آیدی ادمین: {ADMIN_ID}")
-    print(f"✅ تعداد سوالات: {len(FAQ_DATABASE)}")
-    print(f"✅ تعداد پیشنهادات: {len(PROMOTIONS)}")
-    print("📍 میزبان: Railway")
-    print("🚀 ربات آماده ارائه خدمات!")
+    logger.info("🤖 ربات در حال اجراست...")
+    logger.info("✅ توکن: %s...", BOT_TOKEN[:10])
+    logger.info("✅ آیدی ادمین: %s", ADMIN_ID)
+    logger.info("✅ تعداد سوالات: %d", len(CONTENT.current.faq))
+    logger.info("✅ تعداد پیشنهادات: %d", len(CONTENT.current.promotions))
+    logger.info("📍 میزبان: Railway")
+    logger.info("🚀 ربات آماده ارائه خدمات!")
     
     # اجرای ربات
-    application.run_polling()
+    if BOT_MODE == 'webhook':
+        import uvicorn
+        uvicorn.run(app, host='0.0.0.0', port=PORT)
+    elif BOT_WORKERS > 1:
+        # یک پردازه دریافت و چند پردازه کارگر
+        dispatcher = ShardedDispatcher(BOT_WORKERS, build_application)
+        dispatcher.start()
+        try:
+            asyncio.run(poll_into(build_application().bot, dispatcher))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            dispatcher.stop()
+    else:
+        build_application().run_polling()
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,88 @@
+from collections import deque
+
+from normalizer import normalize_text
+
+
+class KeywordMatcher:
+    """اتوماتای Aho–Corasick روی همه کلیدواژه‌های FAQ
+
+    یک بار هنگام راه‌اندازی ساخته می‌شود و هر پیام را در یک گذر پیمایش می‌کند،
+    بنابراین هزینه هر پیام به تعداد موضوعات وابسته نیست.
+    """
+
+    def __init__(self, faq_database):
+        self.topics = list(faq_database)
+        self._goto = [{}]
+        self._fail = [0]
+        # خروجی هر گره: لیست (طول کلیدواژه، اندیس موضوع)
+        self._out = [[]]
+
+        for index, data in enumerate(faq_database.values()):
+            for keyword in data['keywords']:
+                self._add(normalize_text(keyword), index)
+        self._build_links()
+
+    def _add(self, keyword, topic_index):
+        if not keyword:
+            return
+        node = 0
+        for char in keyword:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][char] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = next_node
+        entry = (len(keyword), topic_index)
+        if entry not in self._out[node]:
+            self._out[node].append(entry)
+
+    def _build_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                # خروجی‌های پسوندی را از قبل ادغام می‌کنیم تا هنگام جستجو پیمایش fail لازم نباشد
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def find_all(self, text):
+        """همه تطابق‌ها را به صورت (انتهای تطابق، طول، اندیس موضوع) برمی‌گرداند
+
+        متن باید از قبل با normalize_text یکسان‌سازی شده باشد.
+        """
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        matches = []
+        for position, char in enumerate(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if out[node]:
+                for length, topic_index in out[node]:
+                    matches.append((position + 1, length, topic_index))
+        return matches
+
+    def best_match(self, text):
+        """بهترین موضوع برای متن یا None
+
+        اولویت با طولانی‌ترین کلیدواژه است، سپس تعداد تطابق‌ها و
+        در نهایت ترتیب موضوع در دیتابیس؛ پس نتیجه همیشه قطعی است.
+        """
+        matches = self.find_all(text)
+        if not matches:
+            return None
+
+        scores = {}
+        for _, length, topic_index in matches:
+            longest, hits = scores.get(topic_index, (0, 0))
+            scores[topic_index] = (max(longest, length), hits + 1)
+
+        best = min(scores, key=lambda i: (-scores[i][0], -scores[i][1], i))
+        return self.topics[best]
@@ -0,0 +1,294 @@
+import hmac
+import time
+import asyncio
+import logging
+import functools
+from bisect import bisect_left
+from collections import defaultdict
+
+from telegram.error import TimedOut
+from telegram.request import BaseRequest
+
+from logging_setup import LOG_CONTEXT, update_context
+
+logger = logging.getLogger(__name__)
+# یک خط برای هر اجرای handler؛ پرحجم است و با LOG_SAMPLE نمونه‌برداری می‌شود
+handler_logger = logging.getLogger('bot.handlers')
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names, values, extra=''):
+    pairs = [f'{name}="{str(value)}"'.replace('\n', ' ') for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    """شمارنده افزایشی با برچسب اختیاری"""
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.values = defaultdict(float)
+
+    def inc(self, *label_values, amount=1):
+        self.values[label_values] += amount
+
+    def total(self):
+        return sum(self.values.values())
+
+    def render(self):
+        for label_values, value in self.values.items():
+            yield f'{self.name}{_format_labels(self.labels, label_values)} {value:g}'
+
+
+class Gauge:
+    """مقدار لحظه‌ای؛ یا با set تنظیم می‌شود یا هنگام خواندن از تابع function"""
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, function=None):
+        self.name = name
+        self.documentation = documentation
+        self.function = function
+        self.value = 0.0
+
+    def set(self, value):
+        self.value = value
+
+    def get(self):
+        if self.function is not None:
+            try:
+                return float(self.function())
+            except Exception:
+                return float('nan')
+        return self.value
+
+    def render(self):
+        yield f'{self.name} {self.get():g}'
+
+
+class Histogram:
+    """هیستوگرام با باکت‌های ثابت؛ هر observe فقط یک جستجوی دودویی و دو جمع است"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # برچسب‌ها ← [شمارش هر باکت (آخری +Inf)، مجموع، تعداد]
+        self.series = {}
+
+    def observe(self, value, *label_values):
+        series = self.series.get(label_values)
+        if series is None:
+            series = self.series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def count(self, *label_values):
+        series = self.series.get(label_values)
+        return series[2] if series else 0
+
+    def quantile(self, q, *label_values):
+        """تخمین چندک از روی باکت‌ها (حد بالای باکت)"""
+        series = self.series.get(label_values)
+        if not series or not series[2]:
+            return 0.0
+        target = q * series[2]
+        seen = 0
+        for bound, count in zip(self.buckets + (float('inf'),), series[0]):
+            seen += count
+            if seen >= target:
+                return bound if bound != float('inf') else self.buckets[-1]
+        return self.buckets[-1]
+
+    def render(self):
+        for label_values, (counts, total, count) in self.series.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labels, label_values, f'le="{bound:g}"')
+                yield f'{self.name}_bucket{labels} {cumulative}'
+            labels = _format_labels(self.labels, label_values, 'le="+Inf"')
+            yield f'{self.name}_bucket{labels} {count}'
+            labels = _format_labels(self.labels, label_values)
+            yield f'{self.name}_sum{labels} {total:g}'
+            yield f'{self.name}_count{labels} {count}'
+
+
+class RateMeter:
+    """نرخ رویداد در ثانیه روی یک پنجره لغزان با باکت‌های یک‌ثانیه‌ای"""
+
+    def __init__(self, window=60):
+        self.window = window
+        self._buckets = [0] * window
+        self._seconds = [0] * window
+
+    def mark(self, amount=1):
+        second = int(time.monotonic())
+        index = second % self.window
+        if self._seconds[index] != second:
+            self._seconds[index] = second
+            self._buckets[index] = 0
+        self._buckets[index] += amount
+
+    def rate(self):
+        now = int(time.monotonic())
+        total = sum(count for count, second in zip(self._buckets, self._seconds) if now - second < self.window)
+        return total / self.window
+
+
+class Registry:
+    """مجموعه متریک‌های پردازه و خروجی متنی Prometheus"""
+
+    def __init__(self):
+        self.metrics = {}
+        self.started = time.time()
+
+    def _register(self, metric):
+        if metric.name in self.metrics:
+            return self.metrics[metric.name]
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labels=()):
+        return self._register(Counter(name, documentation, labels))
+
+    def gauge(self, name, documentation, function=None):
+        gauge = self._register(Gauge(name, documentation))
+        if function is not None:
+            gauge.function = function
+        return gauge
+
+    def histogram(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labels, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+METRICS = Registry()
+
+HANDLER_LATENCY = METRICS.histogram('bot_handler_seconds', 'Handler latency', ['handler'])
+HANDLER_ERRORS = METRICS.counter('bot_handler_errors_total', 'Handler exceptions', ['handler'])
+API_LATENCY = METRICS.histogram('bot_api_request_seconds', 'Telegram Bot API call latency', ['endpoint'])
+API_ERRORS = METRICS.counter('bot_api_errors_total', 'Failed Telegram Bot API calls', ['endpoint', 'kind'])
+
+
+def instrument(handler):
+    """پوشاندن یک handler با اندازه‌گیری زمان اجرا، شمارش خطا و زمینه لاگ آپدیت"""
+    name = handler.__name__
+
+    @functools.wraps(handler)
+    async def wrapper(update, context):
+        fields = update_context(update)
+        fields['handler'] = name
+        token = LOG_CONTEXT.set(fields)
+        started = time.perf_counter()
+        try:
+            return await handler(update, context)
+        except Exception:
+            HANDLER_ERRORS.inc(name)
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            HANDLER_LATENCY.observe(elapsed, name)
+            if handler_logger.isEnabledFor(logging.INFO):
+                handler_logger.info("%s اجرا شد", name, extra={'duration_ms': round(elapsed * 1000, 3)})
+            LOG_CONTEXT.reset(token)
+
+    return wrapper
+
+
+class InstrumentedRequest(BaseRequest):
+    """لایه HTTP ربات که زمان و خطای هر متد Bot API را ثبت می‌کند
+
+    in_flight تعداد درخواست‌های در جریان (در انتظار pool یا پاسخ) است. پر بودن
+    pool با خطای PoolTimeout جدا از timeout پاسخ شمرده می‌شود.
+    """
+
+    def __init__(self, inner):
+        self.inner = inner
+        self.in_flight = 0
+
+    @property
+    def read_timeout(self):
+        return self.inner.read_timeout
+
+    async def initialize(self):
+        await self.inner.initialize()
+
+    async def shutdown(self):
+        await self.inner.shutdown()
+
+    async def do_request(self, url, method, request_data=None, read_timeout=BaseRequest.DEFAULT_NONE,
+                         write_timeout=BaseRequest.DEFAULT_NONE, connect_timeout=BaseRequest.DEFAULT_NONE,
+                         pool_timeout=BaseRequest.DEFAULT_NONE):
+        endpoint = url.rsplit('/', 1)[-1]
+        started = time.perf_counter()
+        self.in_flight += 1
+        try:
+            code, payload = await self.inner.do_request(
+                url, method, request_data=request_data, read_timeout=read_timeout,
+                write_timeout=write_timeout, connect_timeout=connect_timeout, pool_timeout=pool_timeout
+            )
+        except Exception as exc:
+            pool_full = isinstance(exc, TimedOut) and str(exc).startswith('Pool timeout')
+            API_ERRORS.inc(endpoint, 'PoolTimeout' if pool_full else type(exc).__name__)
+            raise
+        finally:
+            self.in_flight -= 1
+            API_LATENCY.observe(time.perf_counter() - started, endpoint)
+        if code >= 400:
+            API_ERRORS.inc(endpoint, str(code))
+        return code, payload
+
+
+def authorized(header, token):
+    """بررسی هدر Authorization: Bearer با مقایسه زمان‌ثابت"""
+    return hmac.compare_digest(header, b'Bearer ' + token.encode())
+
+
+async def serve_metrics(port, registry=METRICS, token=''):
+    """سرور HTTP کوچک برای /metrics در حالت polling؛ با token فقط درخواست‌های دارای Authorization: Bearer"""
+
+    async def handle(reader, writer):
+        try:
+            request_line = await reader.readline()
+            header = b''
+            while (line := await reader.readline()) not in (b'\r\n', b'\n', b''):
+                name, _, value = line.partition(b':')
+                if name.strip().lower() == b'authorization':
+                    header = value.strip()
+            path = request_line.split()[1] if len(request_line.split()) > 1 else b'/'
+            if path == b'/metrics' and token and not authorized(header, token):
+                body, status = b'unauthorized\n', b'401 Unauthorized'
+            elif path == b'/metrics':
+                body = registry.render().encode()
+                status = b'200 OK'
+            else:
+                body, status = b'not found\n', b'404 Not Found'
+            writer.write(b'HTTP/1.1 ' + status + b'\r\nContent-Type: text/plain; version=0.0.4\r\n'
+                         b'Content-Length: ' + str(len(body)).encode() + b'\r\nConnection: close\r\n\r\n' + body)
+            await writer.drain()
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, '0.0.0.0', port)
+    logger.info("متریک‌ها روی پورت %d در دسترس است", port)
+    async with server:
+        await server.serve_forever()
@@ -0,0 +1,93 @@
+import os
+import json
+import time
+import glob
+import threading
+
+from metrics import METRICS
+
+MISSES_DROPPED = METRICS.counter('bot_miss_log_dropped_total', 'Unanswered questions not logged (buffer full)')
+
+
+class MissLog:
+    """ثبت سوالات بی‌پاسخ در فایل‌های JSONL فقط‌افزودنی با چرخش بر اساس حجم
+
+    record فقط یک tuple به بافر حافظه اضافه می‌کند؛ flush (با periodic.flush_periodically
+    در thread جداگانه) بافر را در یک write به انتهای فایل می‌نویسد. وقتی فایل از max_bytes بزرگ‌تر
+    شود به path.1 منتقل می‌شود (path.1 ← path.2 و ...) و فقط backups فایل قدیمی
+    نگه داشته می‌شود. اگر flush عقب بماند بیش از max_pending رکورد نگه داشته
+    نمی‌شود. بافر با _lock محافظت می‌شود، چون record روی event loop و flush در thread
+    دیگری اجرا می‌شوند. فقط متن یکسان‌سازی‌شده ذخیره می‌شود، نه شناسه کاربر.
+    """
+
+    def __init__(self, path, max_bytes=64 * 2 ** 20, backups=10, max_pending=100000):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.max_pending = max_pending
+        # _lock فقط از بافر محافظت می‌کند و هنگام نوشتن فایل گرفته نمی‌شود
+        self._lock = threading.Lock()
+        self._pending = []
+
+    def record(self, text, outcome, topics=(), when=None):
+        entry = (when or time.time(), outcome, text, tuple(topics))
+        with self._lock:
+            full = len(self._pending) >= self.max_pending
+            if not full:
+                self._pending.append(entry)
+        if full:
+            MISSES_DROPPED.inc()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self):
+        """نوشتن بافر در فایل؛ خروجی تعداد رکوردهای نوشته‌شده"""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return 0
+        lines = []
+        for when, outcome, text, topics in pending:
+            record = {'t': round(when, 3), 'outcome': outcome, 'text': text}
+            if topics:
+                record['topics'] = list(topics)
+            lines.append(json.dumps(record, ensure_ascii=False))
+        with open(self.path, 'a', encoding='utf-8') as file:
+            file.write('\n'.join(lines) + '\n')
+            size = file.tell()
+        if size >= self.max_bytes:
+            self._rotate()
+        return len(pending)
+
+    def _rotate(self):
+        for index in range(self.backups - 1, 0, -1):
+            if os.path.exists(f'{self.path}.{index}'):
+                os.replace(f'{self.path}.{index}', f'{self.path}.{index + 1}')
+        if self.backups:
+            os.replace(self.path, f'{self.path}.1')
+        else:
+            os.remove(self.path)
+
+    def files(self):
+        """فایل‌های موجود از قدیمی‌ترین به جدیدترین"""
+        return log_files(self.path)
+
+
+def log_files(path):
+    """فایل اصلی و فایل‌های چرخیده یک مسیر، از قدیمی‌ترین به جدیدترین"""
+    rotated = [name for name in glob.glob(glob.escape(path) + '.*') if name.rsplit('.', 1)[-1].isdigit()]
+    rotated.sort(key=lambda name: int(name.rsplit('.', 1)[-1]), reverse=True)
+    return rotated + ([path] if os.path.exists(path) else [])
+
+
+def read_misses(paths):
+    """خواندن رکوردهای ثبت‌شده از چند فایل؛ خط‌های ناقص (مثلا هنگام نوشتن) نادیده گرفته می‌شوند"""
+    for path in paths:
+        with open(path, encoding='utf-8') as file:
+            for line in file:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
@@ -0,0 +1,38 @@
+import re
+from functools import lru_cache
+
+# نویسه‌های عربی ← معادل فارسی
+_CHAR_MAP = {
+    'ي': 'ی', 'ى': 'ی', 'ئ': 'ی',
+    'ك': 'ک',
+    'ة': 'ه', 'ۀ': 'ه',
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ؤ': 'و',
+}
+
+# ارقام فارسی و عربی ← لاتین
+_DIGITS = {ord(c): str(i) for i, c in enumerate('۰۱۲۳۴۵۶۷۸۹')}
+_DIGITS.update({ord(c): str(i) for i, c in enumerate('٠١٢٣٤٥٦٧٨٩')})
+
+# اعراب، تنوین و کشیده حذف می‌شوند
+_REMOVED = dict.fromkeys(list(range(0x064B, 0x0660)) + [0x0670, 0x0640])
+
+# نیم‌فاصله و نویسه‌های کنترلی جهت ← فاصله
+_SPACES = dict.fromkeys([0x200C, 0x200D, 0x200E, 0x200F, 0x00A0], ' ')
+
+TRANSLATION_TABLE = str.maketrans({**_CHAR_MAP, **_DIGITS, **_REMOVED, **_SPACES})
+
+_REPEATED = re.compile(r'([^\W\d_])\1{2,}')
+_WHITESPACE = re.compile(r'\s+')
+
+
+@lru_cache(maxsize=4096)
+def normalize_text(text):
+    """یکسان‌سازی متن فارسی برای جستجو
+
+    حروف عربی، ارقام، نیم‌فاصله و اعراب با یک جدول translate یکسان می‌شوند،
+    حروف تکراری کشیده (سلاااام) کوتاه و فاصله‌ها فشرده می‌شوند.
+    """
+    text = text.lower().translate(TRANSLATION_TABLE)
+    text = _REPEATED.sub(r'\1', text)
+    return _WHITESPACE.sub(' ', text).strip()
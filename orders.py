@@ -0,0 +1,175 @@
+import re
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+
+import httpx
+
+from metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+ORDER_LOOKUPS = METRICS.counter('bot_order_lookups_total', 'Order status lookups', ['outcome'])
+ORDER_BACKEND_LATENCY = METRICS.histogram('bot_order_backend_seconds', 'Order backend request latency')
+
+# شماره سفارش: ۶ تا ۱۰ رقم که با صفر شروع نمی‌شود (تلفن‌ها با صفر شروع می‌شوند)
+# متن ورودی یکسان‌سازی‌شده است، پس ارقام فارسی و عربی از قبل لاتین شده‌اند
+ORDER_NUMBER = re.compile(r'(?<![\d-])(#?)([1-9]\d{5,9})(?![\d-])')
+# کلمه‌هایی که نشان می‌دهند عدد پیام شماره سفارش است (نه مثلا قیمت)؛ فقط کلمه کامل با
+# پسوندهای جمع و ضمیر (سفارشم، کدها) حساب می‌شود تا مثلا «کدام» نشانه سفارش نباشد
+ORDER_CONTEXT = re.compile(r'\b(?:سفارش|پیگیری|کد)(?:ها|های|ات|ی|م|ت|ش|مان|تان|شان)?\b')
+
+
+def find_order_number(text, expected=False):
+    """اولین شماره سفارش در متن یکسان‌سازی‌شده یا None
+
+    عدد فقط با نشانه شماره سفارش حساب می‌شود: پیشوند #، یکی از کلمه‌های ORDER_CONTEXT
+    در پیام یا expected (کاربر در جواب /track شماره فرستاده است).
+    """
+    match = ORDER_NUMBER.search(text)
+    if match is None:
+        return None
+    if match.group(1) or expected or ORDER_CONTEXT.search(text):
+        return match.group(2)
+    return None
+
+
+class OrderServiceUnavailable(Exception):
+    """سرویس سفارش در دسترس نیست (خطا، timeout یا مدار باز)"""
+
+
+class CircuitBreaker:
+    """قطع‌کننده مدار: پس از threshold خطای پشت‌سرهم تا reset_timeout ثانیه
+    درخواستی فرستاده نمی‌شود، سپس یک درخواست آزمایشی اجازه دارد"""
+
+    def __init__(self, threshold=5, reset_timeout=30.0):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        # زمان شروع درخواست آزمایشی؛ اگر آن درخواست هیچ‌وقت تمام نشود، پس از reset_timeout دوباره مجاز است
+        self._probe_started = None
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def allow(self):
+        state = self.state
+        if state == 'closed':
+            return True
+        now = time.monotonic()
+        if state == 'half-open' and (self._probe_started is None or now - self._probe_started >= self.reset_timeout):
+            self._probe_started = now
+            return True
+        return False
+
+    def success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._probe_started = None
+
+    def failure(self):
+        self.failures += 1
+        self._probe_started = None
+        if self.opened_at is not None or self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+
+
+class OrderStatusClient:
+    """کلاینت ناهمگام وضعیت سفارش فروشگاه
+
+    • یک httpx.AsyncClient با اتصال‌های keep-alive محدود برای همه درخواست‌ها؛
+    • کش کوتاه‌مدت (cache_ttl ثانیه) برای نتیجه‌ها، از جمله «سفارش پیدا نشد»؛
+    • درخواست‌های هم‌زمان برای یک سفارش فقط یک درخواست به سرور می‌فرستند؛
+    • timeout برای هر درخواست و قطع‌کننده مدار تا سرور از کار افتاده را زیر بار نبریم.
+
+    قرارداد سرور: GET {base_url}/orders/{order_id} ← 200 با JSON سفارش یا 404.
+    """
+
+    def __init__(self, base_url, token='', timeout=3.0, cache_ttl=30.0, cache_size=10000, max_connections=20,
+                 breaker=None):
+        self.base_url = base_url.rstrip('/')
+        self.token = token
+        self.timeout = timeout
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+        self.max_connections = max_connections
+        self.breaker = breaker or CircuitBreaker()
+        # شماره سفارش ← (زمان انقضا، نتیجه)
+        self._cache = OrderedDict()
+        self._inflight = {}
+        self._client = None
+
+    async def get(self, order_id):
+        """اطلاعات سفارش یا None اگر سفارشی با این شماره نباشد"""
+        cached = self._cache.get(order_id)
+        if cached is not None:
+            if cached[0] > time.monotonic():
+                ORDER_LOOKUPS.inc('cached')
+                return cached[1]
+            del self._cache[order_id]
+
+        task = self._inflight.get(order_id)
+        if task is None:
+            task = self._inflight[order_id] = asyncio.create_task(self._fetch(order_id))
+            task.add_done_callback(lambda done: self._finished(order_id, done))
+        else:
+            ORDER_LOOKUPS.inc('coalesced')
+        # لغو یک منتظر نباید درخواست مشترک بقیه را لغو کند
+        return await asyncio.shield(task)
+
+    def _finished(self, order_id, task):
+        self._inflight.pop(order_id, None)
+        # خطا اگر همه منتظرها لغو شده باشند هم خوانده می‌شود تا هشدار asyncio ندهد
+        if not task.cancelled():
+            task.exception()
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _fetch(self, order_id):
+        if not self.breaker.allow():
+            ORDER_LOOKUPS.inc('rejected')
+            raise OrderServiceUnavailable('circuit open')
+
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections),
+                headers={'Authorization': f'Bearer {self.token}'} if self.token else None,
+            )
+
+        started = time.perf_counter()
+        try:
+            response = await self._client.get(f'/orders/{order_id}')
+            if response.status_code == 404:
+                result = None
+            else:
+                response.raise_for_status()
+                result = response.json()
+                if not isinstance(result, dict):
+                    raise ValueError(f'unexpected order payload: {type(result).__name__}')
+        except (httpx.HTTPError, ValueError) as exc:
+            self.breaker.failure()
+            ORDER_LOOKUPS.inc('error')
+            logger.warning("استعلام سفارش %s ناموفق بود: %r", order_id, exc)
+            raise OrderServiceUnavailable(str(exc)) from exc
+        finally:
+            ORDER_BACKEND_LATENCY.observe(time.perf_counter() - started)
+
+        self.breaker.success()
+        ORDER_LOOKUPS.inc('found' if result else 'not_found')
+        self._cache[order_id] = (time.monotonic() + self.cache_ttl, result)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return result
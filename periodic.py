@@ -0,0 +1,37 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+async def flush_periodically(store, interval=5.0, description='flush بافر', after=None):
+    """flush دوره‌ای بافر یک ذخیره‌ساز در thread جداگانه
+
+    store.flush هر interval ثانیه اجرا می‌شود، یا زودتر وقتی ذخیره‌ساز با صدا زدن
+    store.wakeup خبر دهد که دسته‌اش پر شده است؛ پس نوشتن در دیسک هیچ‌وقت روی event
+    loop انجام نمی‌شود. after (اختیاری) پس از هر flush در همان thread اجرا می‌شود.
+    هنگام توقف یک flush نهایی انجام می‌شود.
+    """
+    loop = asyncio.get_running_loop()
+    full = asyncio.Event()
+    store.wakeup = lambda: loop.call_soon_threadsafe(full.set)
+
+    def step():
+        store.flush()
+        if after is not None:
+            after()
+
+    try:
+        while True:
+            try:
+                await asyncio.wait_for(full.wait(), interval)
+            except asyncio.TimeoutError:
+                pass
+            full.clear()
+            try:
+                await asyncio.to_thread(step)
+            except Exception:
+                logger.exception("%s ناموفق بود", description)
+    finally:
+        store.wakeup = None
+        store.flush()
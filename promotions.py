@@ -0,0 +1,89 @@
+import heapq
+import time
+from datetime import datetime
+
+# مخاطب ارسال خودکار هنگام باز شدن بازه پیشنهاد
+AUDIENCES = ('subscribers', 'none')
+DEFAULT_AUDIENCE = 'subscribers'
+
+
+def parse_time(value):
+    """زمان ISO 8601 (مثلا 2026-10-17T00:00:00+03:30) ← datetime؛ زمان بدون منطقه زمانی، ساعت محلی سرور است"""
+    return datetime.fromisoformat(value)
+
+
+def parse_window(title, entry):
+    """پیشنهاد زمان‌دار فایل محتوا ← دیکشنری title، start، end (یا None)، audience و tzinfo
+
+    start و end به timestamp تبدیل می‌شوند؛ tzinfo منطقه زمانی نوشته‌شده در فایل
+    (یا None برای ساعت محلی سرور) است تا مهلت به همان ساعت به کاربر نمایش داده شود.
+    """
+    try:
+        start = parse_time(entry['start'])
+        end = parse_time(entry['end']) if entry.get('end') else None
+        start_at, end_at = start.timestamp(), end.timestamp() if end else None
+    except (KeyError, TypeError, ValueError):
+        raise ValueError(f"بازه زمانی نامعتبر برای پیشنهاد: {title}") from None
+    audience = entry.get('audience', DEFAULT_AUDIENCE)
+    if (end_at is not None and end_at <= start_at) or audience not in AUDIENCES:
+        raise ValueError(f"بازه زمانی یا مخاطب نامعتبر برای پیشنهاد: {title}")
+    return {'title': title, 'start': start_at, 'end': end_at, 'audience': audience,
+            'tzinfo': (end or start).tzinfo}
+
+
+class PromotionSchedule:
+    """ایندکس بازه‌ای پیشنهادهای زمان‌دار روی دو heap
+
+    upcoming پیشنهادهای شروع‌نشده را بر اساس زمان شروع و ending پیشنهادهای فعال را
+    بر اساس زمان پایان نگه می‌دارد؛ advance فقط سر heapها را بررسی می‌کند، پس هر باز
+    یا بسته شدن O(log n) است و زمان تغییر بعدی (next_change) بدون پیمایش معلوم است.
+    active تاپل پیشنهادهای فعال به ترتیب شروع است و فقط هنگام تغییر دوباره ساخته
+    می‌شود؛ درخواست‌ها هیچ‌وقت تاریخ‌ها را بررسی نمی‌کنند. زمان now در فراخوانی‌های
+    پیاپی advance نباید عقب برود.
+    """
+
+    def __init__(self, windows, now=None):
+        self._upcoming = [(window['start'], seq, window) for seq, window in enumerate(windows)]
+        heapq.heapify(self._upcoming)
+        self._ending = []
+        self._active = {}
+        self.active = ()
+        self.advance(time.time() if now is None else now)
+
+    def advance(self, now):
+        """اعمال شروع‌ها و پایان‌های تا زمان now؛ خروجی (بازشده‌ها، بسته‌شده‌ها)"""
+        opened, closed = [], []
+        while self._upcoming and self._upcoming[0][0] <= now:
+            _, seq, window = heapq.heappop(self._upcoming)
+            if window['end'] is not None and window['end'] <= now:
+                # بازه‌ای که کامل در گذشته است هیچ‌وقت فعال نمی‌شود
+                continue
+            if window['end'] is not None:
+                heapq.heappush(self._ending, (window['end'], seq, window))
+            self._active[seq] = window
+            opened.append(window)
+        while self._ending and self._ending[0][0] <= now:
+            _, seq, window = heapq.heappop(self._ending)
+            del self._active[seq]
+            closed.append(window)
+        if opened or closed:
+            # پیشنهادها به ترتیب شروع از heap بیرون می‌آیند، پس ترتیب دیکشنری همان ترتیب شروع است
+            self.active = tuple(self._active.values())
+        return opened, closed
+
+    def copy(self):
+        """نسخه مستقل برای ساخت نسخه جدید محتوا؛ advance روی آن نسخه فعلی را تغییر نمی‌دهد"""
+        clone = object.__new__(PromotionSchedule)
+        clone._upcoming = list(self._upcoming)
+        clone._ending = list(self._ending)
+        clone._active = dict(self._active)
+        clone.active = self.active
+        return clone
+
+    def next_change(self):
+        """زمان نزدیک‌ترین شروع یا پایان بعدی یا None"""
+        times = [heap[0][0] for heap in (self._upcoming, self._ending) if heap]
+        return min(times) if times else None
+
+    def __len__(self):
+        return len(self._upcoming) + len(self._active)
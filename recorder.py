@@ -0,0 +1,86 @@
+import json
+import time
+import logging
+import threading
+
+from telegram import Update
+
+from metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+RECORDS_DROPPED = METRICS.counter('bot_update_records_dropped_total', 'Updates not recorded (buffer full)')
+
+
+class UpdateRecorder:
+    """ذخیره JSON آپدیت‌های ورودی برای بازپخش آفلاین (benchmarks.replay)
+
+    هر خط فایل {"t": زمان دریافت، "update": آپدیت} است. handler فقط دیکشنری آپدیت
+    را به بافر حافظه اضافه می‌کند؛ flush (با periodic.flush_periodically در thread
+    جداگانه) بافر را در یک write به انتهای فایل می‌نویسد، پس دیسک کند event loop را
+    متوقف نمی‌کند. اگر flush عقب بماند بیش از max_pending آپدیت نگه داشته نمی‌شود.
+    آپدیت‌ها شامل اطلاعات کاربران‌اند؛ فایل را مثل داده کاربران نگه دارید.
+    """
+
+    def __init__(self, path, batch_size=500, max_pending=100000):
+        self.path = path
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        # _lock فقط از بافر محافظت می‌کند و هنگام نوشتن فایل گرفته نمی‌شود
+        self._lock = threading.Lock()
+        self._pending = []
+        self._file = None
+        # با flush پس‌زمینه تنظیم می‌شود (periodic.flush_periodically)
+        self.wakeup = None
+
+    async def __call__(self, update, context):
+        if not isinstance(update, Update):
+            return
+        record = (time.time(), update.to_dict())
+        with self._lock:
+            full = len(self._pending) >= self.max_pending
+            if not full:
+                self._pending.append(record)
+            wake = len(self._pending) == self.batch_size
+        if full:
+            RECORDS_DROPPED.inc()
+        elif wake and self.wakeup is not None:
+            self.wakeup()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self):
+        """نوشتن بافر در فایل؛ خروجی تعداد آپدیت‌های نوشته‌شده"""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return 0
+        lines = ''.join(json.dumps({'t': when, 'update': update}, ensure_ascii=False) + '\n'
+                        for when, update in pending)
+        try:
+            if self._file is None:
+                # بدون بافر: هر دسته با یک write سیستمی در حالت append نوشته می‌شود
+                # تا خط‌های پردازه‌های کارگر در هم نروند
+                self._file = open(self.path, 'ab', buffering=0)
+            self._file.write(lines.encode('utf-8'))
+        except OSError:
+            logger.exception("ذخیره %d آپدیت در %s ناموفق بود", len(pending), self.path)
+            return 0
+        return len(pending)
+
+    def close(self):
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def read_recording(path):
+    """خواندن فایل ضبط‌شده؛ خروجی (زمان، دیکشنری آپدیت)"""
+    with open(path, encoding='utf-8') as file:
+        for line in file:
+            if line.strip():
+                record = json.loads(line)
+                yield record['t'], record['update']
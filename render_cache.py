@@ -0,0 +1,36 @@
+from collections import OrderedDict
+
+from metrics import METRICS
+
+EDITS_SKIPPED = METRICS.counter('bot_edits_skipped_total', 'edit_message_text calls skipped as unchanged', ['reason'])
+
+
+class MessageRenderCache:
+    """هش آخرین متن و کیبورد هر پیام ویرایش‌شده، با حذف LRU
+
+    کلید پیام (chat_id، message_id) یا inline_message_id است. changed هش جدید را
+    با هش قبلی مقایسه و در صورت تغییر ذخیره می‌کند؛ کیبوردهای از پیش ساخته‌شده
+    هش‌پذیرند، پس هیچ سریال‌سازی‌ای لازم نیست.
+    """
+
+    def __init__(self, max_size=50000):
+        self.max_size = max_size
+        self._hashes = OrderedDict()
+
+    def changed(self, key, text, reply_markup=None):
+        """True اگر پیام باید ویرایش شود؛ هش جدید همان لحظه ثبت می‌شود"""
+        digest = hash((text, reply_markup))
+        if self._hashes.get(key) == digest:
+            self._hashes.move_to_end(key)
+            return False
+        self._hashes[key] = digest
+        self._hashes.move_to_end(key)
+        if len(self._hashes) > self.max_size:
+            self._hashes.popitem(last=False)
+        return True
+
+    def forget(self, key):
+        self._hashes.pop(key, None)
+
+    def __len__(self):
+        return len(self._hashes)
@@ -0,0 +1,124 @@
+import re
+import html
+import textwrap
+
+from telegram.constants import MessageLimit, ParseMode
+
+# همه متن‌های رندرشده HTML تلگرام‌اند: فقط <، > و & باید escape شوند
+PARSE_MODE = ParseMode.HTML
+MAX_LENGTH = MessageLimit.MAX_TEXT_LENGTH
+
+# نشانه‌گذاری متن‌های منبع: **پررنگ** و [متن](نشانی)؛ پررنگ از یک خط بیشتر نمی‌شود
+_BOLD = re.compile(r'\*\*(.+?)\*\*')
+_LINK = re.compile(r'\[([^\]\n]+)\]\((https?://[^)\s]+)\)')
+_MARKUP = re.compile(f'{_BOLD.pattern}|{_LINK.pattern}')
+_TAG = re.compile(r'<[^>]+>')
+
+
+def dedent(text):
+    """حذف تورفتگی کد منبع، فاصله‌های انتهای خط و خط‌های خالی ابتدا و انتها"""
+    lines = textwrap.dedent(text.strip('\n')).split('\n')
+    return '\n'.join(line.rstrip() for line in lines).strip()
+
+
+def plain(text):
+    """متن قابل نمایش بدون نشانه‌گذاری (مثلا برای توضیح نتایج inline)"""
+    return _LINK.sub(r'\1', _BOLD.sub(r'\1', dedent(text)))
+
+
+def to_html(text):
+    """تبدیل نشانه‌گذاری به HTML تلگرام؛ بقیه متن escape می‌شود"""
+    text = html.escape(text, quote=False)
+    text = _BOLD.sub(r'<b>\1</b>', text)
+    return _LINK.sub(lambda match: f'<a href="{match.group(2).replace(chr(34), "&quot;")}">{match.group(1)}</a>', text)
+
+
+def visible_length(text):
+    """طول متن پس از حذف نشانه‌گذاری، به واحد UTF-16 مثل شمارش تلگرام"""
+    return len(_LINK.sub(r'\1', _BOLD.sub(r'\1', text)).encode('utf-16-le')) // 2
+
+
+def split(text, limit=MAX_LENGTH):
+    """تقسیم متن بلند به بخش‌هایی که هر کدام در یک پیام جا می‌شوند
+
+    اول در مرز پاراگراف‌ها، سپس خط‌ها و در آخر وسط خط (_split_line) بریده می‌شود.
+    """
+    if visible_length(text) <= limit:
+        return [text]
+    for separator in ('\n\n', '\n'):
+        if separator not in text:
+            continue
+        parts, current = [], ''
+        for piece in text.split(separator):
+            candidate = f'{current}{separator}{piece}' if current else piece
+            if visible_length(candidate) <= limit:
+                current = candidate
+                continue
+            if current:
+                parts.append(current)
+            *full, current = split(piece, limit)
+            parts.extend(full)
+        return parts + [current] if current else parts
+    return _split_line(text, limit)
+
+
+def _split_line(text, limit):
+    """برش یک خط بلند بدون شکستن **پررنگ** یا پیوند
+
+    نشانه‌گذاری‌ای که در باقی‌مانده بخش جا نشود کامل به بخش بعد می‌رود؛ اگر از یک
+    بخش هم بلندتر باشد متنش بریده و در هر بخش دوباره پررنگ یا پیوند می‌شود.
+    """
+    # (متن قابل نمایش، پیشوند، پسوند)
+    pieces, position = [], 0
+    for match in _MARKUP.finditer(text):
+        if match.start() > position:
+            pieces.append((text[position:match.start()], '', ''))
+        if match.group(1) is not None:
+            pieces.append((match.group(1), '**', '**'))
+        else:
+            pieces.append((match.group(2), '[', f']({match.group(3)})'))
+        position = match.end()
+    if position < len(text):
+        pieces.append((text[position:], '', ''))
+
+    parts, current, units = [], '', 0
+    for visible, prefix, suffix in pieces:
+        width = len(visible.encode('utf-16-le')) // 2
+        if prefix and current and units + width > limit >= width:
+            parts.append(current)
+            current, units = '', 0
+        chunk = ''
+        for char in visible:
+            char_width = 2 if ord(char) > 0xFFFF else 1
+            if units + char_width > limit:
+                if chunk:
+                    current += f'{prefix}{chunk}{suffix}'
+                parts.append(current)
+                current, units, chunk = '', 0, ''
+            chunk += char
+            units += char_width
+        if chunk:
+            current += f'{prefix}{chunk}{suffix}'
+    return parts + [current]
+
+
+def pack(lines, limit=MAX_LENGTH):
+    """خط‌های HTML آماده (مثلا با مقادیر escape‌شده کاربر) ← تاپل بخش‌ها؛ فقط در مرز خط‌ها بریده می‌شود"""
+    parts, current = [], None
+    for line in lines:
+        candidate = line if current is None else f'{current}\n{line}'
+        if current is not None and _html_length(candidate) > limit:
+            parts.append(current)
+            candidate = line
+        current = candidate
+    return tuple(parts + [current or ''])
+
+
+def _html_length(text):
+    """طول نمایش متن HTML تلگرام به واحد UTF-16"""
+    return len(html.unescape(_TAG.sub('', text)).encode('utf-16-le')) // 2
+
+
+def render(text, limit=MAX_LENGTH):
+    """متن منبع ← تاپل بخش‌های HTML آماده ارسال (با PARSE_MODE)"""
+    return tuple(to_html(part) for part in split(dedent(text), limit))
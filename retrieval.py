@@ -0,0 +1,94 @@
+import re
+
+import numpy as np
+
+from normalizer import normalize_text
+
+_TOKEN = re.compile(r'\w+')
+
+
+def _features(text, ngram):
+    """توکن‌ها و n-gramهای حرفی یک متن یکسان‌سازی‌شده"""
+    features = []
+    for token in _TOKEN.findall(text):
+        features.append('w:' + token)
+        padded = f' {token} '
+        if len(padded) > ngram:
+            features.extend('g:' + padded[i:i + ngram] for i in range(len(padded) - ngram + 1))
+    return features
+
+
+class FAQRetriever:
+    """موتور بازیابی رتبه‌بندی‌شده FAQ با ایندکس معکوس و امتیاز BM25
+
+    هر موضوع از عنوان و کلیدواژه‌ها (با وزن بیشتر) و متن پاسخ ساخته می‌شود.
+    ایندکس به شکل CSR در آرایه‌های NumPy نگه داشته می‌شود: برای هر ترم
+    یک بازه از شناسه موضوع‌ها و وزن‌های BM25 از پیش محاسبه‌شده.
+    """
+
+    def __init__(self, faq_database, ngram=3, keyword_boost=3, k1=1.5, b=0.75):
+        self.topics = list(faq_database)
+        self.ngram = ngram
+
+        vocabulary = {}
+        postings = []
+        lengths = np.zeros(len(self.topics), dtype=np.float32)
+
+        for doc_id, (topic, data) in enumerate(faq_database.items()):
+            counts = {}
+            keyword_text = normalize_text(' '.join([topic, *data['keywords']]))
+            for feature in _features(keyword_text, ngram):
+                counts[feature] = counts.get(feature, 0) + keyword_boost
+            for feature in _features(normalize_text(data['answer']), ngram):
+                counts[feature] = counts.get(feature, 0) + 1
+            lengths[doc_id] = sum(counts.values())
+            for feature, tf in counts.items():
+                term_id = vocabulary.setdefault(feature, len(vocabulary))
+                postings.append((term_id, doc_id, tf))
+
+        self.vocabulary = vocabulary
+        n_docs = max(len(self.topics), 1)
+        postings.sort()
+        terms = np.fromiter((p[0] for p in postings), dtype=np.int32, count=len(postings))
+        self._doc_ids = np.fromiter((p[1] for p in postings), dtype=np.int32, count=len(postings))
+        tf = np.fromiter((p[2] for p in postings), dtype=np.float32, count=len(postings))
+
+        df = np.bincount(terms, minlength=len(vocabulary))
+        self._indptr = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        np.cumsum(df, out=self._indptr[1:])
+
+        idf = np.log1p((n_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+        avg_length = float(lengths.mean()) if len(lengths) else 1.0
+        norm = k1 * (1 - b + b * lengths[self._doc_ids] / avg_length)
+        self._weights = (idf[terms] * tf * (k1 + 1) / (tf + norm)).astype(np.float32)
+
+        # بیشترین وزن هر ترم برای نرمال‌سازی امتیاز به بازه صفر تا یک
+        self._term_max = np.zeros(len(vocabulary), dtype=np.float32)
+        np.maximum.at(self._term_max, terms, self._weights)
+        # ترم‌های ناشناخته پرسش هم در مخرج حساب می‌شوند تا پرسش‌های بی‌ربط امتیاز بالا نگیرند
+        self._unknown_weight = float(np.median(self._term_max)) if len(vocabulary) else 1.0
+
+    @property
+    def nbytes(self):
+        """حجم آرایه‌های ایندکس به بایت (بدون دیکشنری واژگان)"""
+        return sum(a.nbytes for a in (self._indptr, self._doc_ids, self._weights, self._term_max))
+
+    def search(self, text, k=3):
+        """k موضوع برتر را به صورت لیست (موضوع، امتیاز نرمال‌شده) برمی‌گرداند"""
+        features = set(_features(normalize_text(text), self.ngram))
+        term_ids = {self.vocabulary[f] for f in features if f in self.vocabulary}
+        if not term_ids:
+            return []
+        unknown = len(features) - len(term_ids)
+
+        term_ids = np.fromiter(term_ids, dtype=np.int64, count=len(term_ids))
+        starts, ends = self._indptr[term_ids], self._indptr[term_ids + 1]
+        positions = np.concatenate([np.arange(s, e) for s, e in zip(starts, ends)])
+        scores = np.bincount(self._doc_ids[positions], weights=self._weights[positions],
+                             minlength=len(self.topics))
+        scores /= float(self._term_max[term_ids].sum()) + unknown * self._unknown_weight
+
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.lexsort((top, -scores[top]))]
+        return [(self.topics[i], float(scores[i])) for i in top if scores[i] > 0]
@@ -0,0 +1,41 @@
+class CallbackRouter:
+    """مسیریاب callback_data با جدول مسیرهای دقیق و پیشوندی
+
+    مسیرهای دقیق در یک دیکشنری نگه داشته می‌شوند و مسیرهای پیشوندی
+    (مثل q1_ و survey_) با بخش قبل از اولین «_» پیدا می‌شوند؛
+    بنابراین یافتن handler همیشه O(1) است.
+    """
+
+    def __init__(self):
+        self._routes = {}
+        self._prefixes = {}
+
+    def route(self, *names):
+        """ثبت handler برای یک یا چند callback_data دقیق"""
+        def decorator(func):
+            for name in names:
+                self._routes[name] = func
+            return func
+        return decorator
+
+    def prefix(self, prefix):
+        """ثبت handler برای همه callback_dataهایی که با prefix شروع می‌شوند"""
+        if not prefix.endswith('_') or prefix.count('_') != 1:
+            raise ValueError("پیشوند باید دقیقا به یک «_» ختم شود")
+
+        def decorator(func):
+            self._prefixes[prefix] = func
+            return func
+        return decorator
+
+    def match(self, data):
+        """جفت (نام مسیر، handler)؛ نام مسیر برای پیشوندها خود پیشوند است"""
+        handler = self._routes.get(data)
+        if handler is not None:
+            return data, handler
+        head, sep, _ = data.partition('_')
+        if sep:
+            handler = self._prefixes.get(head + sep)
+            if handler is not None:
+                return head + sep, handler
+        return None, None
@@ -0,0 +1,144 @@
+import time
+import sqlite3
+import threading
+from datetime import datetime
+
+
+class SurveyStore:
+    """ثبت ماندگار امتیازهای نظرسنجی با نوشتن دسته‌ای و آمار تجمعی
+
+    هر امتیاز یک رویداد فقط‌افزودنی (کاربر، زمان، امتیاز) است. رویدادها ابتدا در
+    بافر حافظه جمع می‌شوند و با flush دوره‌ای در thread جداگانه در یک تراکنش نوشته
+    می‌شوند (پر شدن دسته فقط با wakeup خبر داده می‌شود)؛ اگر نوشتن ناموفق باشد دسته
+    به بافر برمی‌گردد. در همان تراکنش جدول survey_daily (شمارش هر امتیاز در هر روز) هم
+    به‌روز می‌شود، پس آمار بدون پیمایش رویدادها خوانده می‌شود.
+
+    مجموع‌ها پس از هر flush از survey_daily بازخوانی می‌شوند تا در حالت چند کارگری
+    رای‌های بقیه پردازه‌ها هم دیده شوند؛ flush بدون رای محلی هم با PRAGMA data_version
+    تغییر پایگاه داده توسط پردازه‌های دیگر را تشخیص می‌دهد و فقط در آن صورت بازخوانی
+    می‌کند. totals و today از حافظه خوانده می‌شوند.
+    روزها با منطقه زمانی timezone (روز کاری فروشگاه) جدا می‌شوند؛ None یعنی ساعت سرور.
+    مسیر خالی یعنی پایگاه داده درون‌حافظه‌ای.
+    """
+
+    def __init__(self, path='', batch_size=500, timezone=None):
+        self.path = path or ':memory:'
+        self.batch_size = batch_size
+        self.timezone = timezone
+        # _lock از بافر و آمار حافظه محافظت می‌کند و هنگام کار با SQLite گرفته نمی‌شود؛
+        # _db_lock دسترسی threadها به اتصال را ترتیب می‌دهد
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        # با flush پس‌زمینه تنظیم می‌شود (periodic.flush_periodically)
+        self.wakeup = None
+        # رویدادهای نوشته‌نشده: (کاربر، زمان، امتیاز)
+        self._pending = []
+        # مجموع هر امتیاز و شمارش روزانه (روز ← امتیاز ← تعداد) شامل بافر
+        self._totals = {}
+        self._daily = {}
+        # data_version پایگاه داده در آخرین بازخوانی مجموع‌ها
+        self._version = None
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        if self.path != ':memory:':
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS survey_events ('
+            'user_id INTEGER NOT NULL, created_at REAL NOT NULL, rating TEXT NOT NULL)'
+        )
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS survey_daily ('
+            'day TEXT NOT NULL, rating TEXT NOT NULL, count INTEGER NOT NULL, PRIMARY KEY (day, rating))'
+        )
+        self._conn.commit()
+        self._load_aggregates()
+
+    def record(self, user_id, rating, when=None):
+        """ثبت یک امتیاز؛ نوشتن در دیسک به flush بعدی موکول می‌شود"""
+        when = time.time() if when is None else when
+        day = self._day(when)
+        with self._lock:
+            self._pending.append((user_id, when, rating))
+            self._totals[rating] = self._totals.get(rating, 0) + 1
+            counts = self._daily.setdefault(day, {})
+            counts[rating] = counts.get(rating, 0) + 1
+            full = len(self._pending) == self.batch_size
+        if full:
+            if self.wakeup is not None:
+                self.wakeup()
+            else:
+                # بدون flush پس‌زمینه (مثلا در اسکریپت‌ها) بافر همین‌جا نوشته می‌شود
+                self.flush()
+
+    def totals(self):
+        """تعداد کل هر امتیاز"""
+        with self._lock:
+            return dict(self._totals)
+
+    def day(self, when=None):
+        """تعداد هر امتیاز در یک روز (پیش‌فرض امروز)"""
+        day = self._day(time.time() if when is None else when)
+        with self._lock:
+            return dict(self._daily.get(day, {}))
+
+    def flush(self):
+        """نوشتن رویدادهای بافر در یک تراکنش و بازخوانی مجموع‌ها در صورت تغییر پایگاه داده؛ خروجی تعداد رویدادهای نوشته‌شده"""
+        with self._db_lock:
+            return self._flush_locked()
+
+    def __len__(self):
+        with self._lock:
+            return sum(self._totals.values())
+
+    def close(self):
+        with self._db_lock:
+            self._flush_locked()
+            self._conn.close()
+
+    def _day(self, when):
+        return datetime.fromtimestamp(when, self.timezone).strftime('%Y-%m-%d')
+
+    def _flush_locked(self):
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            # data_version فقط با commit اتصال‌های دیگر (کارگرهای دیگر) تغییر می‌کند
+            if self._conn.execute('PRAGMA data_version').fetchone()[0] != self._version:
+                self._load_aggregates()
+            return 0
+        daily = {}
+        for user_id, when, rating in pending:
+            key = (self._day(when), rating)
+            daily[key] = daily.get(key, 0) + 1
+        try:
+            with self._conn:
+                self._conn.executemany(
+                    'INSERT INTO survey_events (user_id, created_at, rating) VALUES (?, ?, ?)', pending)
+                self._conn.executemany(
+                    'INSERT INTO survey_daily (day, rating, count) VALUES (?, ?, ?) '
+                    'ON CONFLICT(day, rating) DO UPDATE SET count = survey_daily.count + excluded.count',
+                    [(day, rating, count) for (day, rating), count in daily.items()]
+                )
+        except Exception:
+            # دسته به ابتدای بافر برمی‌گردد تا در flush بعدی نوشته شود؛ آمار حافظه دست نمی‌خورد
+            with self._lock:
+                self._pending[:0] = pending
+            raise
+        self._load_aggregates()
+        return len(pending)
+
+    def _load_aggregates(self):
+        # جدول روزانه کوچک است (روزها × امتیازها)؛ رویدادها پیمایش نمی‌شوند
+        self._version = self._conn.execute('PRAGMA data_version').fetchone()[0]
+        rows = self._conn.execute('SELECT day, rating, count FROM survey_daily').fetchall()
+        totals, daily = {}, {}
+        for day, rating, count in rows:
+            totals[rating] = totals.get(rating, 0) + count
+            daily.setdefault(day, {})[rating] = count
+        with self._lock:
+            # رای‌هایی که هنگام نوشتن به بافر رسیده‌اند هنوز در جدول نیستند
+            for user_id, when, rating in self._pending:
+                totals[rating] = totals.get(rating, 0) + 1
+                counts = daily.setdefault(self._day(when), {})
+                counts[rating] = counts.get(rating, 0) + 1
+            self._totals, self._daily = totals, daily
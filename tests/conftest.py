@@ -0,0 +1,18 @@
+"""تنظیمات مشترک تست‌ها
+
+مسیرهای داده ربات پیش از import شدن main به یک پوشه موقت اشاره می‌کنند تا تست‌ها
+در مخزن فایل نسازند. اجرا از ریشه مخزن:
+    python -m pytest -q
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_DATA = tempfile.mkdtemp(prefix='bot-tests-')
+os.environ.setdefault('USER_STORE_PATH', os.path.join(_DATA, 'users.db'))
+os.environ.setdefault('MISS_LOG_PATH', '')
+os.environ.setdefault('RECORD_UPDATES_PATH', '')
+os.environ.setdefault('ORDER_API_URL', '')
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
@@ -0,0 +1,95 @@
+"""فاصله‌گذاری RatePacer و ارسال همگانی با RetryAfter و کاربران بلاک‌کننده"""
+import asyncio
+import time
+
+from telegram import Bot
+
+from benchmarks.fake_api import FakeBotAPI
+from broadcast import Broadcaster, RatePacer, SubscriberRegistry
+
+SLACK = 0.02
+
+
+def test_pacer_spaces_waits_at_rate():
+    pacer = RatePacer(100)
+
+    async def run():
+        times = []
+        for _ in range(20):
+            await pacer.wait()
+            times.append(time.monotonic())
+        return times
+
+    times = asyncio.run(run())
+    assert times[-1] - times[0] >= 19 / 100 - SLACK
+
+
+def test_pacer_spaces_concurrent_waiters():
+    pacer = RatePacer(50)
+    times = []
+
+    async def waiter():
+        await pacer.wait()
+        times.append(time.monotonic())
+
+    async def run():
+        await asyncio.gather(*(waiter() for _ in range(10)))
+
+    asyncio.run(run())
+    times.sort()
+    assert all(later - earlier >= 1 / 50 - SLACK for earlier, later in zip(times, times[1:]))
+
+
+def test_pacer_pause_delays_next_send():
+    pacer = RatePacer(1000)
+
+    async def run():
+        await pacer.wait()
+        pacer.pause(0.2)
+        started = time.monotonic()
+        await pacer.wait()
+        return time.monotonic() - started
+
+    assert asyncio.run(run()) >= 0.2 - SLACK
+
+
+def test_broadcast_delivers_once_through_retry_after_and_drops_blocked():
+    subscribers = [1000 + index for index in range(40)]
+    blocked, limited = {1005, 1017}, set()
+
+    def fail(method, params):
+        if method != 'sendMessage':
+            return None
+        chat_id = params['chat_id']
+        if chat_id in blocked:
+            return 403, 'Forbidden: bot was blocked by the user', None
+        if chat_id == 1010 and chat_id not in limited:
+            limited.add(chat_id)
+            return 429, 'Too Many Requests: retry after 1', {'retry_after': 1}
+        return None
+
+    api = FakeBotAPI(fail=fail)
+    registry = SubscriberRegistry()
+    for chat_id in subscribers:
+        registry.add(chat_id)
+
+    async def run():
+        bot = Bot('1:test', request=api, get_updates_request=FakeBotAPI())
+        await bot.initialize()
+        broadcaster = Broadcaster(bot, registry, rate=500, workers=4, page_size=16)
+        started = time.monotonic()
+        job = await broadcaster.start('📣 test', key='test-once')
+        assert await broadcaster.start('📣 test', key='test-once') is None
+        while broadcaster.active:
+            await asyncio.sleep(0.01)
+        elapsed = time.monotonic() - started
+        await bot.shutdown()
+        return job, elapsed
+
+    job, elapsed = asyncio.run(asyncio.wait_for(run(), 30))
+    sent = [params['chat_id'] for method, params, _ in api.calls if method == 'sendMessage']
+    assert sorted(sent) == sorted(set(subscribers) - blocked)
+    assert (job['sent'], job['removed'], job['failed']) == (38, 2, 0)
+    assert all(chat_id not in registry for chat_id in blocked) and len(registry) == 38
+    # RetryAfter همه ارسال‌ها را متوقف می‌کند
+    assert elapsed >= 1 - SLACK
@@ -0,0 +1,161 @@
+"""بارگذاری مجدد محتوا هم‌زمان با handle_message و انتشار نسخه‌ها با replace"""
+import asyncio
+import json
+import threading
+from collections import Counter
+
+import pytest
+from telegram import Update
+
+import main
+from benchmarks.bench_reload import write_version
+from benchmarks.canned_updates import message_update
+from benchmarks.fake_api import FakeBotAPI
+from content_store import DEFAULT_CONTENT_PATH, ContentStore
+from normalizer import normalize_text
+
+FIRST, SECOND = 'پیگیری سفارش', 'هزینه ارسال'
+
+
+@pytest.fixture
+def content():
+    with open(DEFAULT_CONTENT_PATH, encoding='utf-8') as f:
+        return json.load(f)
+
+
+@pytest.fixture
+def path(tmp_path, content):
+    path = str(tmp_path / 'content.json')
+    write_version(path, content, 'A', (FIRST, SECOND))
+    return path
+
+
+def test_reload_under_concurrent_handle_message(path, content, monkeypatch):
+    # در نسخه B کلیدواژه‌های دو موضوع جابه‌جا شده‌اند؛ پاسخ هر پیام باید کامل از یک نسخه باشد
+    keyword = content['faq'][FIRST]['keywords'][0]
+    expected = {}
+    for tag in ('A', 'B'):
+        write_version(path, content, tag, (FIRST, SECOND))
+        expected[tag] = ContentStore(path, view_builder=main.build_views).current.matcher.best_match(
+            normalize_text(keyword))
+    assert expected['A'] != expected['B']
+    valid = {f"[{tag}:{topic}]" for tag, topic in expected.items()}
+    mixed = {f"[A:{expected['B']}]", f"[B:{expected['A']}]"}
+
+    write_version(path, content, 'A', (FIRST, SECOND))
+    store = ContentStore(path, view_builder=main.build_views)
+    monkeypatch.setattr(main, 'CONTENT', store)
+    messages = 600
+
+    async def run():
+        api = FakeBotAPI(latency=0.001, jitter=0.001)
+        application = main.build_application(
+            request=api, concurrency=16, outbound_limits=False, inbound_limits=False)
+        await application.initialize()
+        await application.start()
+        done = asyncio.Event()
+
+        async def reloader():
+            tags = iter(('B', 'A') * 10 ** 6)
+            while not done.is_set():
+                write_version(path, content, next(tags), (FIRST, SECOND))
+                await asyncio.to_thread(store.reload)
+                await asyncio.sleep(0.005)
+
+        reloading = asyncio.create_task(reloader())
+        for update_id in range(1, messages + 1):
+            await application.update_queue.put(
+                Update.de_json(message_update(update_id, 100000 + update_id % 50, keyword), application.bot))
+            if update_id % 16 == 0:
+                await asyncio.sleep(0)
+        while api.count('sendMessage') < messages:
+            await asyncio.sleep(0.01)
+        done.set()
+        await reloading
+        await application.stop()
+        await application.shutdown()
+        return api
+
+    api = asyncio.run(asyncio.wait_for(run(), 60))
+    seen = Counter(next((label for label in valid | mixed if label in params['text']), 'other')
+                   for method, params, _ in api.calls if method == 'sendMessage')
+    assert not any(seen[label] for label in mixed), seen
+    assert seen['other'] == 0, seen
+    assert all(seen[label] for label in valid), seen
+
+
+def test_failed_reload_keeps_current_snapshot(path):
+    store = ContentStore(path, view_builder=main.build_views)
+    current = store.current
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('{"faq": ')
+    with pytest.raises(ValueError):
+        store.reload()
+    assert store.current is current
+
+
+def test_replace_publishes_copy_without_touching_current(path):
+    store = ContentStore(path, view_builder=main.build_views)
+    current = store.current
+
+    def update(snapshot):
+        snapshot = snapshot.copy()
+        snapshot.menus['marker'] = ('x', None)
+        return snapshot
+
+    published = store.replace(update)
+    assert published is store.current and published is not current
+    assert 'marker' in published.menus and 'marker' not in current.menus
+    assert store.replace(lambda snapshot: None) is published
+
+
+def test_reload_waits_for_replace_and_is_not_lost(path, content):
+    # reload هم‌زمان با replace نباید بین خواندن و انتشار نسخه فعلی انجام شود و نه از دست برود
+    store = ContentStore(path, view_builder=main.build_views)
+    write_version(path, content, 'B', (FIRST, SECOND))
+    reloading = threading.Thread(target=store.reload)
+
+    def update(snapshot):
+        assert snapshot is store.current
+        reloading.start()
+        reloading.join(0.2)
+        assert reloading.is_alive(), 'reload باید تا پایان replace منتظر بماند'
+        assert store.current is snapshot
+        return snapshot.copy()
+
+    replaced = store.replace(update)
+    reloading.join(10)
+    assert store.current is not replaced
+    assert store.current.version == replaced.version + 1
+    assert store.current.answers[FIRST][0].startswith(f'[B:{FIRST}]')
+
+
+def test_replace_and_reload_race(path, content):
+    store = ContentStore(path, view_builder=main.build_views)
+    errors = []
+    stop = threading.Event()
+
+    def reloader():
+        tags = iter(('B', 'A') * 10 ** 6)
+        while not stop.is_set():
+            write_version(path, content, next(tags), (FIRST, SECOND))
+            store.reload()
+
+    def update(snapshot):
+        # زیر قفل: نسخه ورودی همیشه نسخه منتشرشده فعلی است
+        if snapshot is not store.current:
+            errors.append(snapshot.version)
+        return snapshot.copy()
+
+    thread = threading.Thread(target=reloader)
+    thread.start()
+    try:
+        for _ in range(300):
+            store.replace(update)
+    finally:
+        stop.set()
+        thread.join(10)
+    assert not errors
+    write_version(path, content, 'A', (FIRST, SECOND))
+    store.reload()
+    assert store.current.answers[FIRST][0].startswith(f'[A:{FIRST}]')
@@ -0,0 +1,136 @@
+"""لایه زمان‌بندی ارسال: سقف سراسری و هر چت، اولویت پاسخ‌ها و ارسال دوباره پس از 429"""
+import asyncio
+
+from telegram import Bot
+
+from benchmarks.fake_api import FakeBotAPI
+from flood_control import BULK, INTERACTIVE, OUTBOUND_PRIORITY, ScheduledRequest
+
+# زمان‌ها با time.perf_counter در API جعلی ثبت می‌شوند؛ کمی فاصله برای دقت ساعت و event loop
+SLACK = 0.02
+
+
+def run(api, scenario, **limits):
+    """اجرای scenario(bot) روی یک Bot با ScheduledRequest روی API جعلی"""
+
+    async def main():
+        bot = Bot('1:test', request=ScheduledRequest(api, **limits), get_updates_request=FakeBotAPI())
+        await bot.initialize()
+        try:
+            return await asyncio.wait_for(scenario(bot), 30)
+        finally:
+            await bot.shutdown()
+
+    return asyncio.run(main())
+
+
+def send_times(api, chat_id=None):
+    return [at for method, params, at in api.calls
+            if method == 'sendMessage' and chat_id in (None, params['chat_id'])]
+
+
+def test_chat_limit_allows_burst_then_paces():
+    api = FakeBotAPI()
+    rate, burst, count = 20.0, 3, 9
+
+    async def scenario(bot):
+        await asyncio.gather(*(bot.send_message(42, f'm{index}') for index in range(count)))
+
+    run(api, scenario, global_rate=1000, chat_rate=rate, burst=burst)
+    times = send_times(api, 42)
+    assert len(times) == count
+    for index in range(burst, count):
+        assert times[index] - times[0] >= (index - burst + 1) / rate - SLACK
+
+
+def test_waiting_chat_does_not_block_other_chats():
+    api = FakeBotAPI()
+
+    async def scenario(bot):
+        busy = [asyncio.create_task(bot.send_message(1, f'm{index}')) for index in range(6)]
+        await asyncio.sleep(0)
+        await bot.send_message(2, 'other')
+        await asyncio.gather(*busy)
+
+    run(api, scenario, global_rate=1000, chat_rate=5, burst=1)
+    assert send_times(api, 2)[0] < send_times(api, 1)[2]
+
+
+def test_global_limit_paces_all_chats():
+    api = FakeBotAPI()
+    rate, count = 50.0, 30
+
+    async def scenario(bot):
+        await asyncio.gather(*(bot.send_message(1000 + index, 'x') for index in range(count)))
+
+    run(api, scenario, global_rate=rate, chat_rate=1, burst=3)
+    times = sorted(send_times(api))
+    # ظرفیت سطل سراسری rate / 10 است
+    assert times[-1] - times[0] >= (count - rate / 10) / rate - SLACK
+
+
+def test_interactive_replies_go_before_bulk():
+    api = FakeBotAPI()
+
+    async def send(bot, chat_id, priority):
+        OUTBOUND_PRIORITY.set(priority)
+        await bot.send_message(chat_id, 'x')
+
+    async def scenario(bot):
+        bulk = [asyncio.create_task(send(bot, 1000 + index, BULK)) for index in range(20)]
+        await asyncio.sleep(0.05)
+        await asyncio.gather(*(send(bot, index, INTERACTIVE) for index in range(3)))
+        await asyncio.gather(*bulk)
+
+    run(api, scenario, global_rate=20, chat_rate=1, burst=3)
+    order = [params['chat_id'] for method, params, _ in api.calls if method == 'sendMessage']
+    assert len(order) == 23
+    # پاسخ‌ها حداکثر پشت ارسال‌های همگانی‌ای که پیش از رسیدنشان توکن گرفته‌اند می‌مانند
+    assert max(order.index(chat_id) for chat_id in range(3)) < 6
+
+
+def test_retry_after_requeues_instead_of_failing():
+    limited = set()
+
+    def fail(method, params):
+        if method == 'sendMessage' and params['chat_id'] not in limited:
+            limited.add(params['chat_id'])
+            return 429, 'Too Many Requests: retry after 1', {'retry_after': 1}
+        return None
+
+    api = FakeBotAPI(fail=fail)
+
+    async def scenario(bot):
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        message = await bot.send_message(7, 'x')
+        return message, loop.time() - started
+
+    message, elapsed = run(api, scenario, global_rate=1000, chat_rate=10, burst=3)
+    assert message.text == 'x'
+    assert api.count('sendMessage') == 1
+    assert elapsed >= 1 - SLACK
+
+
+def test_other_methods_skip_the_queue():
+    api = FakeBotAPI()
+
+    async def scenario(bot):
+        sends = [asyncio.create_task(bot.send_message(1, f'm{index}')) for index in range(4)]
+        await asyncio.sleep(0)
+        await bot.answer_callback_query('1')
+        await asyncio.gather(*sends)
+
+    run(api, scenario, global_rate=1000, chat_rate=5, burst=1)
+    answered = next(at for method, _, at in api.calls if method == 'answerCallbackQuery')
+    assert answered < send_times(api, 1)[1]
+
+
+def test_chat_buckets_are_capped():
+    request = ScheduledRequest(FakeBotAPI(), max_chats=100)
+    for chat_id in range(10000):
+        request._bucket(chat_id)
+    request._bucket(9950)
+    assert len(request._chats) == 100
+    assert next(reversed(request._chats)) == 9950
+    assert 0 not in request._chats
@@ -0,0 +1,138 @@
+"""تشخیص شماره سفارش، کلاینت وضعیت سفارش در برابر سرور جعلی و مسیر کامل پیام"""
+import asyncio
+
+import pytest
+from telegram import Update
+
+import main
+from benchmarks.canned_updates import message_update
+from benchmarks.fake_api import FakeBotAPI
+from benchmarks.order_stub import OrderStub
+from normalizer import normalize_text
+from orders import CircuitBreaker, OrderServiceUnavailable, OrderStatusClient, find_order_number
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('سلام، سفارش #۱۲۳۴۵۶۸ من کجاست؟', '1234568'),
+    ('#1234568', '1234568'),
+    ('پیگیری ۱۲۳۴۵۶۸', '1234568'),
+    ('کد ١٢٣٤٥٦٨', '1234568'),
+    ('سفارشم 1234568 نرسیده', '1234568'),
+    ('سفارش‌های من: 1234568', '1234568'),
+    ('قیمت ۵۰۰۰۰۰ تومان', None),
+    ('کدام مدل 1234568 تومان است؟', None),
+    ('۱۲۳۴۵۶۸', None),
+    ('09121234567 سفارش', None),
+    ('سفارش 12345', None),
+    ('سفارش 1234-5678', None),
+])
+def test_find_order_number(text, expected):
+    assert find_order_number(normalize_text(text)) == expected
+
+
+def test_find_order_number_expected_after_track():
+    assert find_order_number(normalize_text('۱۲۳۴۵۶۸'), expected=True) == '1234568'
+    assert find_order_number(normalize_text('0912123456'), expected=True) is None
+
+
+def with_stub(scenario, stub_class=OrderStub, **stub_options):
+    async def run():
+        stub = await stub_class(**stub_options).start()
+        try:
+            return await asyncio.wait_for(scenario(stub), 30)
+        finally:
+            await stub.stop()
+
+    return asyncio.run(run())
+
+
+def test_concurrent_lookups_are_coalesced_and_cached():
+    async def scenario(stub):
+        client = OrderStatusClient(stub.url, cache_ttl=30)
+        results = await asyncio.gather(*(client.get('1234568') for _ in range(50)))
+        again = await client.get('1234568')
+        missing = [await client.get('1234569'), await client.get('1234569')]
+        await client.close()
+        return results, again, missing, stub.requests
+
+    results, again, missing, requests = with_stub(scenario, latency=0.05)
+    assert all(result == results[0] for result in results) and results[0]['id'] == '1234568'
+    assert again == results[0]
+    # شماره‌های بخش‌پذیر بر ۷ در سرور جعلی وجود ندارند؛ «پیدا نشد» هم کش می‌شود
+    assert missing == [None, None]
+    assert requests == 2
+
+
+def test_breaker_opens_on_errors_and_recovers():
+    async def scenario(stub):
+        breaker = CircuitBreaker(threshold=3, reset_timeout=0.2)
+        client = OrderStatusClient(stub.url, cache_ttl=0, breaker=breaker)
+        for index in range(10):
+            with pytest.raises(OrderServiceUnavailable):
+                await client.get(str(2000000 + index))
+        failed_requests, state = stub.requests, breaker.state
+        stub.mode = 'ok'
+        await asyncio.sleep(0.25)
+        order = await client.get('2000001')
+        await client.close()
+        return failed_requests, state, order, breaker.state
+
+    failed_requests, state, order, recovered = with_stub(scenario, mode='error')
+    assert failed_requests == 3 and state == 'open'
+    assert order['id'] == '2000001' and recovered == 'closed'
+
+
+def test_hanging_backend_times_out():
+    async def scenario(stub):
+        client = OrderStatusClient(stub.url, timeout=0.2)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        with pytest.raises(OrderServiceUnavailable):
+            await client.get('3000001')
+        elapsed = loop.time() - started
+        await client.close()
+        return elapsed
+
+    assert with_stub(scenario, mode='hang') < 1
+
+
+class MarkupStub(OrderStub):
+    """سرور جعلی که در مقادیر سفارش نشانه‌گذاری و HTML برمی‌گرداند"""
+
+    def order(self, order_id):
+        order = super().order(order_id)
+        if order:
+            order.update(status='<b>در راه</b>', tracking_code='**PK1** [x](https://example.com)', eta='<i>فردا</i>')
+        return order
+
+
+def test_message_path(monkeypatch):
+    api = FakeBotAPI()
+
+    async def scenario(stub):
+        monkeypatch.setattr(main, 'ORDERS', OrderStatusClient(stub.url))
+        application = main.build_application(request=api, outbound_limits=False, inbound_limits=False)
+        await application.initialize()
+        replies = []
+        steps = ['سفارش #۱۲۳۴۵۶۸ کجاست؟', 'کدام مدل 1234568 تومان است؟', '/track', '۱۲۳۴۵۷۰', '1234571',
+                 '#۷۰۰۰۰۰۷']
+        for update_id, text in enumerate(steps, 1):
+            requests = stub.requests
+            await application.process_update(Update.de_json(message_update(update_id, 42, text), application.bot))
+            replies.append((stub.requests > requests, api.calls[-1][1]['text']))
+        await application.shutdown()
+        await main.ORDERS.close()
+        return replies
+
+    replies = with_stub(scenario, stub_class=MarkupStub)
+    order, which, track, expected, unexpected, missing = replies
+    assert order[0] and 'وضعیت سفارش 1234568' in order[1]
+    # مقادیر سرویس سفارش escape می‌شوند و نشانه‌گذاری حساب نمی‌شوند
+    assert '&lt;b&gt;در راه&lt;/b&gt;' in order[1] and '**PK1** [x](https://example.com)' in order[1]
+    assert '&lt;i&gt;فردا&lt;/i&gt;' in order[1] and '<a ' not in order[1]
+    assert not which[0]
+    assert not track[0] and 'پیگیری سفارش' in track[1]
+    assert expected[0] and 'وضعیت سفارش 1234570' in expected[1]
+    assert not unexpected[0]
+    # مضرب ۷ در سرور جعلی ناموجود است؛ بدون سوال مرتبط پیام «پیدا نشد» فرستاده می‌شود
+    assert missing[0] and 'سفارشی با شماره 7000007 پیدا نشد' in missing[1]
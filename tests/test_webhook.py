@@ -0,0 +1,107 @@
+"""اپلیکیشن ASGI وب‌هوک: بررسی توکن مخفی، ACK فوری، /healthz و /metrics"""
+import asyncio
+import json
+
+import main
+from benchmarks.canned_updates import callback_update, message_update
+from benchmarks.fake_api import FakeBotAPI
+from metrics import METRICS
+from webhook import MAX_BODY_SIZE, WebhookApp
+
+SECRET = 'test-secret'
+
+
+async def request(app, method, path, body=b'', headers=()):
+    """یک درخواست HTTP درون‌فرایندی؛ خروجی (کد وضعیت، بدنه)"""
+    received = False
+    response = {}
+
+    async def receive():
+        nonlocal received
+        if received:
+            return {'type': 'http.disconnect'}
+        received = True
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            response['status'] = message['status']
+        else:
+            response['body'] = message.get('body', b'')
+
+    await app({'type': 'http', 'method': method, 'path': path, 'headers': list(headers)}, receive, send)
+    return response['status'], response['body']
+
+
+def post(app, payload, secret=SECRET):
+    body = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+    return request(app, 'POST', '/webhook', body, [(b'x-telegram-bot-api-secret-token', secret.encode())])
+
+
+def webhook_app(api, **kwargs):
+    return WebhookApp(
+        lambda: main.build_application(request=api, outbound_limits=False, inbound_limits=False),
+        secret_token=SECRET, path='/webhook', metrics=METRICS, **kwargs
+    )
+
+
+def test_updates_are_acked_and_processed():
+    api = FakeBotAPI(latency=0.001)
+    app = webhook_app(api)
+
+    async def run():
+        status, _ = await request(app, 'GET', '/healthz')
+        assert status == 503
+        await app.startup()
+        status, body = await request(app, 'GET', '/healthz')
+        assert status == 200 and json.loads(body)['status'] == 'ok'
+        updates = [message_update(1, 7, '/start'), callback_update(2, 8, 'main_menu'),
+                   message_update(3, 9, 'هزینه ارسال چقدره')]
+        for payload in updates:
+            assert (await post(app, payload))[0] == 200
+        for _ in range(500):
+            if api.count('sendMessage') >= 2 and api.count('answerCallbackQuery') >= 1:
+                break
+            await asyncio.sleep(0.01)
+        await app.shutdown()
+
+    asyncio.run(asyncio.wait_for(run(), 30))
+    chats = {params['chat_id'] for method, params, _ in api.calls if method == 'sendMessage'}
+    assert {7, 9} <= chats
+    assert api.count('answerCallbackQuery') == 1
+
+
+def test_rejects_bad_requests():
+    api = FakeBotAPI()
+    app = webhook_app(api)
+
+    async def run():
+        assert (await post(app, message_update(1, 7, '/start')))[0] == 503
+        await app.startup()
+        results = {
+            'secret': (await post(app, message_update(1, 7, '/start'), secret='wrong'))[0],
+            'json': (await post(app, b'not json'))[0],
+            'update_id': (await post(app, {'message': {}}))[0],
+            'size': (await post(app, b'x' * (MAX_BODY_SIZE + 1)))[0],
+            'method': (await request(app, 'GET', '/webhook'))[0],
+            'path': (await request(app, 'POST', '/other'))[0],
+        }
+        await asyncio.sleep(0.05)
+        await app.shutdown()
+        return results
+
+    results = asyncio.run(asyncio.wait_for(run(), 30))
+    assert results == {'secret': 403, 'json': 400, 'update_id': 400, 'size': 413, 'method': 405, 'path': 404}
+    assert api.count('sendMessage') == 0
+
+
+def test_metrics_require_token():
+    async def run(app, headers=()):
+        return (await request(app, 'GET', '/metrics', headers=headers))[0]
+
+    disabled = webhook_app(FakeBotAPI())
+    assert asyncio.run(run(disabled)) == 404
+    app = webhook_app(FakeBotAPI(), metrics_token='metrics-token')
+    assert asyncio.run(run(app)) == 401
+    assert asyncio.run(run(app, [(b'authorization', b'Bearer wrong')])) == 401
+    assert asyncio.run(run(app, [(b'authorization', b'Bearer metrics-token')])) == 200
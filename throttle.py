@@ -0,0 +1,99 @@
+import time
+from collections import OrderedDict
+
+from telegram import Update
+from telegram.error import TelegramError
+from telegram.ext import ApplicationHandlerStop
+
+from metrics import METRICS
+
+INBOUND_DROPPED = METRICS.counter('bot_inbound_dropped_total', 'Updates dropped before dispatch', ['reason'])
+
+SLOW_DOWN_TEXT = "⏳ لطفا کمی آهسته‌تر! درخواست‌های قبلی شما در حال پردازش است."
+
+
+class InboundThrottle:
+    """محدودیت ورودی هر کاربر پیش از رسیدن آپدیت به handlerها
+
+    به‌عنوان TypeHandler در یک گروه منفی ثبت می‌شود و با ApplicationHandlerStop
+    آپدیت را پیش از handlerهای اصلی متوقف می‌کند:
+    • فشردن دوباره همان دکمه روی همان پیام در کمتر از duplicate_window ثانیه
+      فقط پاسخ خالی به callback می‌گیرد و دوباره پردازش نمی‌شود؛
+    • هر کاربر یک سطل توکن (rate در ثانیه، ظرفیت burst) دارد و پس از خالی شدن
+      آپدیت‌هایش دور ریخته می‌شوند؛ هر notice_interval ثانیه یک بار پیام «آهسته‌تر»
+      می‌گیرد.
+    وضعیت فقط برای کاربران فعال نگه داشته می‌شود؛ کاربرانی که idle_ttl ثانیه
+    آپدیتی نفرستاده‌اند به ترتیب آخرین فعالیت از ابتدای OrderedDict حذف می‌شوند.
+    """
+
+    def __init__(self, rate=2.0, burst=8, duplicate_window=1.0, notice_interval=10.0, idle_ttl=60.0, exempt=()):
+        self.rate = rate
+        self.burst = burst
+        self.duplicate_window = duplicate_window
+        self.notice_interval = notice_interval
+        self.idle_ttl = max(idle_ttl, burst / rate, duplicate_window)
+        self.exempt = set(exempt)
+        # کاربر ← [توکن‌ها، آخرین فعالیت، آخرین دکمه (پیام، داده)، زمان آن، زمان آخرین هشدار]
+        self._users = OrderedDict()
+        METRICS.gauge('bot_inbound_tracked_users', 'Users with inbound throttle state', lambda: len(self._users))
+
+    def __len__(self):
+        return len(self._users)
+
+    async def __call__(self, update, context):
+        # پرسش‌های inline با هر کلید تایپ‌شده می‌رسند و از حافظه پاسخ داده می‌شوند
+        if not isinstance(update, Update) or update.effective_user is None or update.inline_query is not None:
+            return
+        user_id = update.effective_user.id
+        if user_id in self.exempt:
+            return
+
+        now = time.monotonic()
+        self._evict(now)
+        state = self._users.get(user_id)
+        if state is None:
+            state = self._users[user_id] = [float(self.burst), now, None, 0.0, 0.0]
+        else:
+            self._users.move_to_end(user_id)
+            state[0] = min(self.burst, state[0] + (now - state[1]) * self.rate)
+            state[1] = now
+
+        query = update.callback_query
+        if query is not None:
+            tap = (query.inline_message_id or (query.message.message_id if query.message else None), query.data)
+            if tap == state[2] and now - state[3] < self.duplicate_window:
+                INBOUND_DROPPED.inc('duplicate')
+                await _answer(query)
+                raise ApplicationHandlerStop
+            state[2], state[3] = tap, now
+
+        if state[0] < 1:
+            INBOUND_DROPPED.inc('rate')
+            notify = now - state[4] >= self.notice_interval
+            if notify:
+                state[4] = now
+            if query is not None:
+                await _answer(query, SLOW_DOWN_TEXT if notify else None)
+            elif notify and update.effective_message is not None:
+                try:
+                    await update.effective_message.reply_text(SLOW_DOWN_TEXT)
+                except TelegramError:
+                    pass
+            raise ApplicationHandlerStop
+        state[0] -= 1
+
+    def _evict(self, now):
+        cutoff = now - self.idle_ttl
+        while self._users:
+            user_id, state = next(iter(self._users.items()))
+            if state[1] >= cutoff:
+                break
+            del self._users[user_id]
+
+
+async def _answer(query, text=None):
+    # بستن حالت «در حال بارگذاری» دکمه؛ خطا (مثلا query منقضی) اهمیتی ندارد
+    try:
+        await query.answer(text)
+    except TelegramError:
+        pass
@@ -0,0 +1,75 @@
+import time
+import socket
+import asyncio
+
+import httpx
+from telegram.error import TimedOut
+from telegram.request import BaseRequest, HTTPXRequest
+
+from metrics import METRICS
+
+POOL_WAIT = METRICS.histogram('bot_api_pool_wait_seconds', 'Time Bot API calls waited for a free connection')
+
+POOL_TIMEOUT_MESSAGE = (
+    "Pool timeout: All connections in the connection pool are occupied. Request was *not* sent to Telegram. "
+    "Consider adjusting the connection pool size or the pool timeout."
+)
+
+
+class TunedHTTPXRequest(HTTPXRequest):
+    """HTTPXRequest با تنظیم کامل pool، keep-alive، timeoutها و HTTP/2
+
+    HTTPXRequest اصلی با socket_options یک transport جداگانه می‌سازد که
+    محدودیت‌های pool و HTTP/2 را نادیده می‌گیرد؛ اینجا transport با همه تنظیمات
+    یک‌جا ساخته می‌شود. TCP keepalive اتصال‌های بیکار را از بسته شدن بی‌صدا توسط
+    NAT یا load balancer حفظ می‌کند. HTTP/2 به بسته httpx[http2] نیاز دارد.
+
+    صف انتظار اتصال یک Semaphore جلوی httpx است: pool خود httpcore با آزاد شدن
+    هر اتصال همه درخواست‌های منتظر را دوباره بررسی می‌کند (هزینه درجه دو) و
+    pool_timeout آن با هر بار آزاد شدن از نو شروع می‌شود. اینجا pool_timeout کل
+    زمان انتظار است و همان خطای TimedOut «Pool timeout» را می‌دهد.
+    """
+
+    def __init__(self, pool_size=256, keepalive_expiry=30.0, connect_timeout=5.0, read_timeout=5.0,
+                 write_timeout=5.0, pool_timeout=1.0, http2=False, tcp_keepalive=True):
+        self._limits = httpx.Limits(
+            max_connections=pool_size, max_keepalive_connections=pool_size, keepalive_expiry=keepalive_expiry
+        )
+        self._http2 = http2
+        self._socket_options = [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)] if tcp_keepalive else None
+        # با HTTP/2 همه درخواست‌ها روی چند اتصال multiplex می‌شوند؛ سقف هم‌زمانی همان pool_size است
+        self._slots = asyncio.Semaphore(pool_size)
+        super().__init__(
+            connection_pool_size=pool_size, connect_timeout=connect_timeout, read_timeout=read_timeout,
+            write_timeout=write_timeout, pool_timeout=pool_timeout, http_version='2' if http2 else '1.1'
+        )
+
+    def _build_client(self):
+        transport = httpx.AsyncHTTPTransport(
+            http1=not self._http2, http2=self._http2, limits=self._limits, socket_options=self._socket_options
+        )
+        return httpx.AsyncClient(**dict(self._client_kwargs, limits=self._limits, transport=transport))
+
+    async def do_request(self, url, method, request_data=None, read_timeout=BaseRequest.DEFAULT_NONE,
+                         write_timeout=BaseRequest.DEFAULT_NONE, connect_timeout=BaseRequest.DEFAULT_NONE,
+                         pool_timeout=BaseRequest.DEFAULT_NONE):
+        if pool_timeout is BaseRequest.DEFAULT_NONE:
+            pool_timeout = self._client.timeout.pool
+        if self._slots.locked():
+            started = time.perf_counter()
+            try:
+                await asyncio.wait_for(self._slots.acquire(), pool_timeout)
+            except asyncio.TimeoutError:
+                raise TimedOut(POOL_TIMEOUT_MESSAGE) from None
+            finally:
+                POOL_WAIT.observe(time.perf_counter() - started)
+        else:
+            await self._slots.acquire()
+            POOL_WAIT.observe(0.0)
+        try:
+            return await super().do_request(
+                url, method, request_data=request_data, read_timeout=read_timeout, write_timeout=write_timeout,
+                connect_timeout=connect_timeout, pool_timeout=pool_timeout
+            )
+        finally:
+            self._slots.release()
@@ -0,0 +1,195 @@
+import json
+import time
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from periodic import flush_periodically
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryUserStore:
+    """ذخیره‌ساز درون‌حافظه‌ای اطلاعات کاربر (برای تست و اجرای تک‌پردازه‌ای)"""
+
+    def __init__(self):
+        self._users = {}
+        self._updated = {}
+        self.wakeup = None
+
+    def get(self, user_id):
+        """اطلاعات کاربر یا دیکشنری خالی"""
+        return dict(self._users.get(user_id, {}))
+
+    def update(self, user_id, **fields):
+        """ادغام فیلدهای جدید با اطلاعات فعلی کاربر"""
+        self._users.setdefault(user_id, {}).update(fields)
+        self._updated[user_id] = time.time()
+
+    def flush(self):
+        pass
+
+    def expire(self, ttl):
+        """حذف کاربرانی که بیش از ttl ثانیه فعالیتی نداشته‌اند"""
+        cutoff = time.time() - ttl
+        stale = [user_id for user_id, updated in self._updated.items() if updated < cutoff]
+        for user_id in stale:
+            del self._users[user_id]
+            del self._updated[user_id]
+        return len(stale)
+
+    def __len__(self):
+        return len(self._users)
+
+    def close(self):
+        pass
+
+
+class SQLiteUserStore:
+    """ذخیره‌ساز مشترک اطلاعات کاربر روی SQLite با کش LRU و نوشتن دسته‌ای
+
+    تغییرات ابتدا در حافظه جمع می‌شوند و با flush دوره‌ای در thread جداگانه
+    با یک تراکنش در فایل نوشته می‌شوند؛ پر شدن دسته فقط با wakeup به flush
+    پس‌زمینه خبر داده می‌شود. ادغام فیلدها در خود SQLite با json_patch انجام
+    می‌شود، پس نوشتن نیازی به خواندن قبلی ندارد. کش LRU (حداکثر cache_size کاربر)
+    جلوی پایگاه داده فقط کاربران پرتکرار را نگه می‌دارد، پس حافظه به اندازه کش و
+    تغییرات نوشته‌نشده است، نه تعداد کل کاربران. updated_at هر ردیف زمان آخرین flush
+    شامل کاربر است و انقضای نشست‌ها بر اساس آن انجام می‌شود.
+
+    در حالت چند کارگری هر کاربر فقط به یک پردازه می‌رسد، پس کش محلی هر پردازه معتبر است.
+    """
+
+    def __init__(self, path, cache_size=10000, batch_size=500):
+        self.path = path
+        self.cache_size = cache_size
+        self.batch_size = batch_size
+        # _lock از بافر و کش محافظت می‌کند و هیچ‌وقت هنگام کار با SQLite گرفته نمی‌شود؛
+        # _db_lock دسترسی threadها به اتصال را ترتیب می‌دهد (ترتیب گرفتن: _db_lock سپس _lock)
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        # کش LRU: شناسه کاربر ← اطلاعات کامل (شامل تغییرات نوشته‌نشده)
+        self._cache = OrderedDict()
+        # تغییرات نوشته‌نشده: شناسه کاربر ← فیلدهای جدید
+        self._pending = {}
+        # با flush پس‌زمینه تنظیم می‌شود (periodic.flush_periodically)
+        self.wakeup = None
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS users ('
+            'user_id INTEGER PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS users_updated_at ON users (updated_at)')
+        self._conn.commit()
+
+    def get(self, user_id):
+        """اطلاعات کاربر (شامل تغییرات نوشته‌نشده) یا دیکشنری خالی"""
+        with self._lock:
+            data = self._cache.get(user_id)
+            if data is not None:
+                self._cache.move_to_end(user_id)
+                return dict(data)
+        # _db_lock تا ادغام بافر نگه داشته می‌شود تا flush بین خواندن و ادغام انجام نشود
+        with self._db_lock:
+            row = self._conn.execute('SELECT data FROM users WHERE user_id = ?', (user_id,)).fetchone()
+            data = json.loads(row[0]) if row else {}
+            with self._lock:
+                data.update(self._pending.get(user_id, {}))
+                self._remember(user_id, data)
+        return dict(data)
+
+    def update(self, user_id, **fields):
+        """ادغام فیلدهای جدید؛ نوشتن در دیسک با flush بعدی"""
+        with self._lock:
+            self._pending.setdefault(user_id, {}).update(fields)
+            cached = self._cache.get(user_id)
+            if cached is not None:
+                cached.update(fields)
+                self._cache.move_to_end(user_id)
+            full = len(self._pending) == self.batch_size
+        if full:
+            if self.wakeup is not None:
+                self.wakeup()
+            else:
+                # بدون flush پس‌زمینه (مثلا در اسکریپت‌ها) بافر همین‌جا نوشته می‌شود
+                self.flush()
+
+    def flush(self):
+        """نوشتن همه تغییرات معلق در یک تراکنش؛ خروجی تعداد کاربران نوشته‌شده"""
+        with self._db_lock:
+            return self._flush_locked()
+
+    def expire(self, ttl):
+        """حذف کاربرانی که بیش از ttl ثانیه فعالیتی نداشته‌اند"""
+        cutoff = time.time() - ttl
+        with self._db_lock:
+            self._flush_locked()
+            with self._conn:
+                stale = [row[0] for row in self._conn.execute(
+                    'DELETE FROM users WHERE updated_at < ? RETURNING user_id', (cutoff,))]
+            with self._lock:
+                for user_id in stale:
+                    self._cache.pop(user_id, None)
+        return len(stale)
+
+    def __len__(self):
+        with self._db_lock:
+            self._flush_locked()
+            return self._conn.execute('SELECT COUNT(*) FROM users').fetchone()[0]
+
+    def close(self):
+        with self._db_lock:
+            self._flush_locked()
+            self._conn.close()
+
+    def _remember(self, user_id, data):
+        self._cache[user_id] = data
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _flush_locked(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        now = time.time()
+        try:
+            with self._conn:
+                self._conn.executemany(
+                    'INSERT INTO users (user_id, data, updated_at) VALUES (?, ?, ?) '
+                    'ON CONFLICT(user_id) DO UPDATE SET '
+                    'data = json_patch(users.data, excluded.data), updated_at = excluded.updated_at',
+                    [(user_id, json.dumps(fields, ensure_ascii=False), now) for user_id, fields in pending.items()]
+                )
+        except Exception:
+            # دسته برمی‌گردد تا در flush بعدی نوشته شود؛ تغییرات تازه‌تر روی آن ادغام می‌شوند
+            with self._lock:
+                for user_id, fields in self._pending.items():
+                    pending.setdefault(user_id, {}).update(fields)
+                self._pending = pending
+            raise
+        return len(pending)
+
+
+def open_user_store(path, cache_size=10000):
+    """ساخت ذخیره‌ساز بر اساس تنظیمات؛ مسیر خالی یعنی حافظه"""
+    if not path:
+        return MemoryUserStore()
+    return SQLiteUserStore(path, cache_size=cache_size)
+
+
+async def maintain(store, flush_interval=5.0, ttl=None, expire_interval=3600.0):
+    """flush دوره‌ای تغییرات و حذف نشست‌های منقضی در پس‌زمینه"""
+    last_expire = time.monotonic()
+
+    def expire():
+        nonlocal last_expire
+        if ttl and time.monotonic() - last_expire >= expire_interval:
+            last_expire = time.monotonic()
+            removed = store.expire(ttl)
+            if removed:
+                logger.info("%d کاربر غیرفعال حذف شد", removed)
+
+    await flush_periodically(store, flush_interval, "نگهداری ذخیره‌ساز کاربران", after=expire)
@@ -0,0 +1,191 @@
+import hmac
+import asyncio
+import json
+import logging
+
+from telegram import Update
+
+from metrics import authorized
+
+logger = logging.getLogger(__name__)
+
+MAX_BODY_SIZE = 1024 * 1024
+
+
+class WebhookApp:
+    """اپلیکیشن ASGI برای دریافت آپدیت‌های تلگرام از طریق وب‌هوک
+
+    آپدیت پس از بررسی توکن مخفی فقط در update_queue گذاشته می‌شود و
+    بلافاصله پاسخ 200 برمی‌گردد؛ پردازش به صورت ناهمگام در Application انجام می‌شود.
+    Application در رویداد lifespan ساخته و راه‌اندازی می‌شود.
+
+    اگر dispatcher داده شود (حالت چند کارگری)، آپدیت خام به پردازه کارگر
+    مربوط به همان چت فرستاده می‌شود و Application محلی فقط برای ثبت وب‌هوک است.
+
+    /metrics روی همان پورت عمومی وب‌هوک است، پس فقط با metrics_token (هدر
+    Authorization: Bearer) پاسخ داده می‌شود؛ بدون توکن این مسیر غیرفعال است.
+    """
+
+    def __init__(self, application_factory, secret_token='', path='/webhook', webhook_url='', dispatcher=None,
+                 metrics=None, metrics_token=''):
+        self.application_factory = application_factory
+        self.metrics = metrics
+        self.metrics_token = metrics_token
+        self.secret_token = secret_token
+        self.path = path
+        self.webhook_url = webhook_url
+        self.dispatcher = dispatcher
+        self.application = None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self._http(scope, receive, send)
+
+    async def startup(self):
+        """ساخت و اجرای Application و ثبت وب‌هوک در تلگرام"""
+        application = self.application_factory()
+        await application.initialize()
+        if self.dispatcher:
+            self.dispatcher.start()
+        else:
+            if application.post_init:
+                await application.post_init(application)
+            await application.start()
+        self.application = application
+
+        if not self.secret_token:
+            logger.warning("WEBHOOK_SECRET تنظیم نشده است؛ درخواست‌های وب‌هوک بدون بررسی پذیرفته می‌شوند")
+        if self.metrics is not None and not self.metrics_token:
+            logger.warning("METRICS_TOKEN تنظیم نشده است؛ /metrics روی پورت وب‌هوک غیرفعال است")
+        if self.webhook_url:
+            await application.bot.set_webhook(
+                self.webhook_url + self.path,
+                secret_token=self.secret_token or None,
+                allowed_updates=Update.ALL_TYPES
+            )
+            logger.info("وب‌هوک ثبت شد: %s", self.webhook_url + self.path)
+
+    async def shutdown(self):
+        """توقف Application؛ آپدیت‌های باقی‌مانده در صف پردازش می‌شوند"""
+        application, self.application = self.application, None
+        if application is None:
+            return
+        if self.dispatcher:
+            await asyncio.to_thread(self.dispatcher.stop)
+        else:
+            await application.stop()
+            if application.post_stop:
+                await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    await self.startup()
+                except Exception as exc:
+                    logger.exception("راه‌اندازی وب‌هوک ناموفق بود")
+                    await send({'type': 'lifespan.startup.failed', 'message': str(exc)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _http(self, scope, receive, send):
+        path, method = scope['path'], scope['method']
+
+        if path == '/healthz' and method == 'GET':
+            running = self.application is not None and (self.dispatcher or self.application.running)
+            body = {'status': 'ok' if running else 'starting'}
+            if running and self.dispatcher:
+                body['worker_queues'] = self.dispatcher.queue_sizes()
+            elif running:
+                body['update_queue'] = self.application.update_queue.qsize()
+            await _respond(send, 200 if running else 503, body)
+            return
+
+        if path == '/metrics' and method == 'GET' and self.metrics is not None and self.metrics_token:
+            if not authorized(dict(scope['headers']).get(b'authorization', b''), self.metrics_token):
+                await _respond(send, 401, {'error': 'unauthorized'})
+                return
+            await _respond_text(send, 200, self.metrics.render())
+            return
+
+        if path != self.path:
+            await _respond(send, 404, {'error': 'not found'})
+            return
+        if method != 'POST':
+            await _respond(send, 405, {'error': 'method not allowed'})
+            return
+        if self.application is None:
+            await _respond(send, 503, {'error': 'not ready'})
+            return
+
+        if self.secret_token:
+            received = dict(scope['headers']).get(b'x-telegram-bot-api-secret-token', b'')
+            if not hmac.compare_digest(received, self.secret_token.encode()):
+                await _respond(send, 403, {'error': 'forbidden'})
+                return
+
+        body = await _read_body(receive)
+        if body is None:
+            await _respond(send, 413, {'error': 'payload too large'})
+            return
+
+        try:
+            data = json.loads(body)
+            if not isinstance(data, dict) or 'update_id' not in data:
+                raise ValueError("update_id missing")
+            update = None if self.dispatcher else Update.de_json(data, self.application.bot)
+        except Exception:
+            logger.warning("آپدیت نامعتبر از وب‌هوک دریافت شد")
+            await _respond(send, 400, {'error': 'bad request'})
+            return
+
+        # فقط در صف قرار می‌گیرد؛ پاسخ بدون انتظار برای پردازش ارسال می‌شود
+        if self.dispatcher:
+            self.dispatcher.dispatch(data)
+        else:
+            self.application.update_queue.put_nowait(update)
+        await _respond(send, 200, None)
+
+
+async def _read_body(receive):
+    chunks = []
+    size = 0
+    while True:
+        message = await receive()
+        chunk = message.get('body', b'')
+        size += len(chunk)
+        if size > MAX_BODY_SIZE:
+            return None
+        chunks.append(chunk)
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+
+async def _respond(send, status, payload):
+    body = json.dumps(payload).encode() if payload is not None else b''
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def _respond_text(send, status, text):
+    body = text.encode()
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'text/plain; version=0.0.4'), (b'content-length', str(len(body)).encode())],
+    })
+    await send({'type': 'http.response.body', 'body': body})